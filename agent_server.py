@@ -1,15 +1,42 @@
-from fastapi import FastAPI, HTTPException
+# First, so the startup report can time every import below
+from multi_tool_agent.startup import startup_report
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 import asyncio
+import contextlib
+import inspect
+import json
 from pathlib import Path
 import logging
 import os
 import sys
-from multi_tool_agent.agent import root_agent, Runner, InMemorySessionService
-from typing import Dict, Optional
+import time
+import uuid
+from google.adk import __version__ as adk_version
+from google.adk.agents.invocation_context import new_invocation_context_id
+from google.adk.agents.run_config import RunConfig, StreamingMode
+from google.adk.events import Event
+from google.adk.runners import Runner
+from google.genai import types
+from multi_tool_agent.agent import ROOT_AGENT_NAME, build_agents
+from multi_tool_agent import owm_client
+from multi_tool_agent.geocache import geocode_cache
+from multi_tool_agent.forecast_cache import forecast_cache
+from multi_tool_agent.refresher import hot_cities, refresh_scheduler
+from multi_tool_agent.intent_router import INTENT_ROUTER_ENABLED, build_router, local_answer
+from multi_tool_agent.sqlite_sessions import SESSION_BACKEND, build_session_service
+from multi_tool_agent.session_limits import SESSION_SWEEP_INTERVAL_SECONDS, SessionSweeper
+from multi_tool_agent.admission import Overloaded, admission
+from multi_tool_agent.upstream_scheduler import owm_scheduler, upstream_priority
+from multi_tool_agent import upstream_guard
+from multi_tool_agent import metrics
+from multi_tool_agent import tracing
+from typing import Dict, List, Optional, Tuple
+
+startup_report.lap("imports")
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -52,13 +79,63 @@ templates_dir.mkdir(exist_ok=True)
 # Mount the templates directory
 app.mount("/templates", StaticFiles(directory="templates"), name="templates")
 
-# Initialize session service and runner
-session_service = InMemorySessionService()
-runner = Runner(
-    agent=root_agent,
-    app_name="multi_tool_agent",
-    session_service=session_service
-)
+# Initialize session service (SESSION_BACKEND selects memory or sqlite); runners come with the agents, see build_runners
+session_service, session_mappings = build_session_service()
+
+class PinnedRunner(Runner):
+    """Runner that always starts a turn at its own agent.
+
+    ADK normally resumes with whichever sub-agent answered last; when the
+    intent router is on it has already picked the agent for this turn.
+    ADK has no public hook for that choice, so this overrides the private
+    Runner._find_agent_to_run; check_compatible() refuses to start on an
+    ADK release where that hook changed rather than silently losing the pin.
+    """
+
+    def _find_agent_to_run(self, session, root_agent):
+        return root_agent
+
+    @staticmethod
+    def check_compatible():
+        hook = getattr(Runner, "_find_agent_to_run", None)
+        try:
+            parameters = list(inspect.signature(hook).parameters) if hook else []
+            called = "self._find_agent_to_run(" in inspect.getsource(Runner.run_async)
+        except (OSError, TypeError, ValueError):
+            called = False
+        if parameters != ["self", "session", "root_agent"] or not called:
+            raise RuntimeError(
+                f"google-adk {adk_version} no longer picks the agent to run through "
+                "Runner._find_agent_to_run(session, root_agent), which INTENT_ROUTER_ENABLED relies on; "
+                "disable the intent router or update PinnedRunner"
+            )
+
+# Optional local intent routing (see multi_tool_agent/intent_router.py)
+intent_router = build_router() if INTENT_ROUTER_ENABLED else None
+if intent_router is not None:
+    PinnedRunner.check_compatible()
+
+# Built with the agent team by the warm-up, or by the first turn when it comes first
+_runners: Dict[str, Runner] = {}
+
+def build_runners() -> Dict[str, Runner]:
+    """Runners by entry agent: "" for the default runner, plus pinned ones per agent the intent router targets"""
+    if not _runners:
+        agents = build_agents()
+        runners = {"": Runner(
+            agent=agents[ROOT_AGENT_NAME],
+            app_name="multi_tool_agent",
+            session_service=session_service
+        )}
+        if intent_router is not None:
+            for agent_name in (ROOT_AGENT_NAME, "time_agent", "forecast_agent"):
+                runners[agent_name] = PinnedRunner(
+                    agent=agents[agent_name],
+                    app_name="multi_tool_agent",
+                    session_service=session_service
+                )
+        _runners.update(runners)
+    return _runners
 
 class ChatMessage(BaseModel):
     message: str
@@ -78,14 +155,51 @@ class SessionResponse(BaseModel):
     session_name: str
     message: str
 
-# Store session mappings (name -> id)
-session_mappings: Dict[str, str] = {"default": "s_00001"}
+# Store session mappings (name -> id), persisted with the sessions when using sqlite
+session_mappings.setdefault("default", "s_00001")
+
+def forget_sessions(session_ids: List[str]):
+    """Drop the names and preferred cities of sessions removed by idle or max-sessions eviction"""
+    evicted = set(session_ids)
+    for name in [name for name, session_id in session_mappings.items() if session_id in evicted]:
+        del session_mappings[name]
+    hot_cities.forget_sessions(evicted)
+
+# The default session is never evicted
+session_service.pinned.add("s_00001")
+session_service.on_evict = forget_sessions
+session_sweeper = SessionSweeper(session_service, SESSION_SWEEP_INTERVAL_SECONDS)
 
 def generate_session_id() -> str:
     """Generate a unique session ID"""
-    import uuid
     return f"s_{str(uuid.uuid4())[:8]}"
 
+# Warm-up at startup: build the agents and runners, create the model client and fetch the
+# preferred cities' weather before reporting ready, instead of on the first turn
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true").lower() in ("1", "true", "yes")
+STARTUP_WARMUP_TIMEOUT_SECONDS = float(os.getenv("STARTUP_WARMUP_TIMEOUT_SECONDS", "15"))
+warmup_task: Optional[asyncio.Task] = None
+
+async def warm_up():
+    """Prime what the first turn would otherwise pay for, then mark this worker ready"""
+    try:
+        # Off the event loop so /health keeps answering meanwhile
+        with startup_report.phase("warmup_agents"):
+            runners = await asyncio.to_thread(build_runners)
+        with startup_report.phase("warmup_model_client"):
+            model = runners[""].agent.canonical_model
+            # Gemini creates its API client on first use
+            await asyncio.to_thread(getattr, model, "api_client", None)
+        with startup_report.phase("warmup_upstream"):
+            # Geocodes and fetches the preferred cities, which also opens the pooled OpenWeatherMap connection
+            await asyncio.wait_for(refresh_scheduler.refresh_once(), STARTUP_WARMUP_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        logger.warning(f"Warm-up: upstream prefetch took over {STARTUP_WARMUP_TIMEOUT_SECONDS}s, continuing without it")
+    except Exception as e:
+        logger.warning(f"Warm-up incomplete: {str(e)}")
+    startup_report.mark("ready")
+    startup_report.log()
+
 @app.on_event("startup")
 async def startup_event():
     """Create the default session when the API starts"""
@@ -93,6 +207,10 @@ async def startup_event():
         # Create default session
         create_default_session()
         logger.info("Successfully created initial session")
+
+        # Keep weather data for preferred and popular cities warm
+        refresh_scheduler.start()
+        session_sweeper.start()
         
         # Log environment configuration
         logger.info("Environment configuration:")
@@ -103,6 +221,25 @@ async def startup_event():
     except Exception as e:
         logger.error(f"Failed to create initial session: {str(e)}")
 
+    global warmup_task
+    if STARTUP_WARMUP:
+        warmup_task = asyncio.create_task(warm_up())
+    else:
+        # Agents are then built by the first turn
+        startup_report.mark("ready")
+        startup_report.log()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background work and release pooled upstream connections"""
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    await refresh_scheduler.stop()
+    await session_sweeper.stop()
+    await owm_client.aclose()
+    if hasattr(session_service, "close"):
+        session_service.close()
+
 def create_default_session():
     """Create the default session with initial state"""
     initial_state = {
@@ -111,12 +248,24 @@ def create_default_session():
         "user_preference_language": "English"
     }
     
+    existing = session_service.get_session(
+        app_name="multi_tool_agent",
+        user_id="u_00001",
+        session_id="s_00001"
+    )
+    if existing is not None:
+        # Restored from the session store: keep its history and preferences
+        hot_cities.mark_preferred(existing.state.get("user_preference_city", initial_state["user_preference_city"]),
+                                  "s_00001")
+        return
+
     session_service.create_session(
         app_name="multi_tool_agent",
         user_id="u_00001",
         session_id="s_00001",
         state=initial_state
     )
+    hot_cities.mark_preferred(initial_state["user_preference_city"], "s_00001")
 
 @app.get("/")
 async def read_root():
@@ -131,9 +280,62 @@ async def health_check():
         "environment_configured": all(os.getenv(var) for var in required_env_vars),
         "google_ai_configured": bool(os.getenv('GOOGLE_API_KEY')),
         "weather_api_configured": bool(os.getenv('OPENWEATHERMAP_API_KEY')),
-        "active_sessions": len(session_mappings)
+        "active_sessions": len(session_mappings),
+        "session_store": session_service.stats(),
+        "caches": {
+            "geocode": geocode_cache.stats(),
+            "forecast": forecast_cache.stats(),
+        },
+        "refresher": refresh_scheduler.stats(),
+        "upstream_quota": owm_scheduler.stats(),
+        "upstream_guard": upstream_guard.stats(),
+        "tracing": tracing.tracer.stats(),
+        "intent_router": intent_router.stats() if intent_router else {"enabled": False},
+        "admission": admission.stats(),
+        "startup": startup_report.report()
     }
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 503 until the warm-up has built the agents and primed the caches"""
+    if "ready" not in startup_report.marks:
+        return JSONResponse(status_code=503, content={"status": "warming_up", "startup": startup_report.report()})
+    return {"status": "ready", "startup": startup_report.report()}
+
+def collect_cache_metrics():
+    """Copy the cache counters into the metrics registry before each scrape"""
+    for cache_name, stats in (("geocode", geocode_cache.stats()), ("forecast", forecast_cache.stats())):
+        for result, count in stats.items():
+            if result.endswith("hits") or result in ("misses", "coalesced"):
+                metrics.CACHE_LOOKUPS.labels(cache_name, result).set(count)
+        metrics.CACHE_HIT_RATIO.labels(cache_name).set(stats["hit_ratio"])
+        metrics.CACHE_ENTRIES.labels(cache_name).set(stats["entries"])
+
+metrics.add_collector(collect_cache_metrics)
+
+def collect_admission_metrics():
+    """Copy the admission queue depth and slot usage into the metrics registry"""
+    metrics.CHAT_TURNS_QUEUED.labels().set(admission.queued)
+    metrics.CHAT_TURNS_RUNNING.labels().set(admission.active)
+    metrics.CHAT_TURN_SLOTS.labels().set(admission.max_concurrent)
+
+metrics.add_collector(collect_admission_metrics)
+
+def collect_upstream_metrics():
+    """Copy the OpenWeatherMap quota queues, spare tokens and breaker states into the metrics registry"""
+    for lane, count in owm_scheduler.queued().items():
+        metrics.OWM_REQUESTS_QUEUED.labels(lane).set(count)
+    metrics.OWM_QUOTA_TOKENS.set(owm_scheduler.available())
+    for endpoint, guard in upstream_guard.guards.items():
+        metrics.OWM_CIRCUIT_OPEN.labels(endpoint).set(guard.breaker.state != "closed")
+
+metrics.add_collector(collect_upstream_metrics)
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics for this worker process"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/session/", response_model=SessionResponse)
 async def create_session(session_req: SessionCreate):
     """Create a new chat session with custom preferences"""
@@ -158,6 +360,7 @@ async def create_session(session_req: SessionCreate):
         
         # Store session mapping
         session_mappings[session_req.session_name] = session_id
+        hot_cities.mark_preferred(session_req.preferences.default_city, session_id)
         
         return SessionResponse(
             session_id=session_id,
@@ -168,38 +371,390 @@ async def create_session(session_req: SessionCreate):
         logger.error(f"Failed to create session: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def route_turn(session_id: str, text: str) -> Tuple[Optional[str], Runner]:
+    """Pick how to handle a message: returns (local reply, None) or (None, runner to use)"""
+    runners = build_runners()
+    if intent_router is None:
+        return None, runners[""]
+
+    decision = intent_router.classify(text)
+    logger.info(f"Intent '{decision.intent}' ({decision.confidence:.2f}, {decision.source}) -> {decision.agent_name or 'root'}")
+    if decision.intent in ("greeting", "farewell") and decision.routed:
+        session = session_service.get_session(
+            app_name="multi_tool_agent",
+            user_id="u_00001",
+            session_id=session_id
+        )
+        if session is not None:
+            reply = local_answer(decision.intent, session.state)
+            record_local_turn(session, text, reply, decision.agent_name)
+            return reply, None
+
+    return None, runners.get(decision.agent_name or ROOT_AGENT_NAME, runners[ROOT_AGENT_NAME])
+
+def record_local_turn(session, text: str, reply: str, author: str):
+    """Append a turn answered without the runner to the session history"""
+    invocation_id = new_invocation_context_id()
+    session_service.append_event(session=session, event=Event(
+        invocation_id=invocation_id,
+        author="user",
+        content=types.Content(role='user', parts=[types.Part(text=text)])
+    ))
+    session_service.append_event(session=session, event=Event(
+        invocation_id=invocation_id,
+        author=author,
+        content=types.Content(role='model', parts=[types.Part(text=reply)])
+    ))
+
+class TurnObservation:
+    """Outcome and event count of one turn, filled in while it runs"""
+
+    __slots__ = ("outcome", "events")
+
+    def __init__(self):
+        self.outcome = "ok"
+        self.events = 0
+
+    def record(self, event):
+        self.events += 1
+        tracing.record_event(event)
+
+@contextlib.contextmanager
+def observe_turn(endpoint: str, session_id: str):
+    """Record one chat turn in the metrics and trace: in-flight count, latency, outcome and events"""
+    turn = TurnObservation()
+    in_flight = metrics.CHAT_TURNS_IN_FLIGHT.labels(endpoint)
+    in_flight.inc()
+    started = time.perf_counter()
+    with tracing.tracer.turn("chat_turn", endpoint=endpoint, session_id=session_id) as span:
+        try:
+            yield turn
+        except Exception:
+            turn.outcome = "error"
+            raise
+        except BaseException:
+            # Task cancelled or streaming client gone
+            turn.outcome = "cancelled"
+            raise
+        finally:
+            in_flight.dec()
+            startup_report.mark("first_response")
+            metrics.CHAT_TURN_SECONDS.labels(endpoint, turn.outcome).observe(time.perf_counter() - started)
+            if turn.outcome != "local":
+                metrics.CHAT_TURN_EVENTS.labels(endpoint).observe(turn.events)
+            if span is not None:
+                span.set_attribute("outcome", turn.outcome)
+                span.set_attribute("events", turn.events)
+
 @app.post("/chat/")
 async def chat(message: ChatMessage):
     """Process a chat message through the multi-tool agent"""
     try:
-        # Create message content
-        from google.genai import types
-        content = types.Content(
-            role='user',
-            parts=[types.Part(text=message.message)]
-        )
+        async with admission.admit(message.session_id, "chat"):
+            with observe_turn("chat", message.session_id) as turn:
+                return await run_chat_turn(message, turn)
+    except Overloaded as e:
+        raise overloaded_response(e)
+    except Exception as e:
+        logger.error(f"Error processing message: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # Process message through agent
-        final_response = None
-        async for event in runner.run_async(
-            user_id="u_00001",
-            session_id=message.session_id,
-            new_message=content
-        ):
+def overloaded_response(error: Overloaded) -> HTTPException:
+    """429 or 503 for a turn admission control turned away, with a Retry-After hint"""
+    logger.warning(f"Turn rejected ({error.reason}): {str(error)}")
+    return HTTPException(status_code=error.status_code, detail=str(error),
+                         headers={"Retry-After": str(error.retry_after)})
+
+def overloaded_frame(error: Overloaded) -> dict:
+    """Error payload for streaming clients when admission control turns a turn away"""
+    return {"detail": str(error), "status": error.status_code, "reason": error.reason,
+            "retry_after": error.retry_after}
+
+async def run_chat_turn(message: ChatMessage, turn: TurnObservation) -> dict:
+    """Run one /chat/ turn to completion and return the response body"""
+    # Create message content
+    content = types.Content(
+        role='user',
+        parts=[types.Part(text=message.message)]
+    )
+
+    local_reply, turn_runner = route_turn(message.session_id, message.message)
+    if local_reply:
+        turn.outcome = "local"
+        return {"response": local_reply}
+
+    # Process message through agent. The runner is run to its end rather than left at the final
+    # response: ADK's nested generators would otherwise be finalized later on another task, where
+    # their OpenTelemetry spans cannot detach. aclosing covers cancellation.
+    final_response = None
+    done = False
+    async with contextlib.aclosing(turn_runner.run_async(
+        user_id="u_00001",
+        session_id=message.session_id,
+        new_message=content
+    )) as events:
+        async for event in events:
+            if done:
+                continue
+            turn.record(event)
             if event.is_final_response():
                 if event.content and event.content.parts:
                     final_response = event.content.parts[0].text
-                break
+                done = True
+
+    if final_response:
+        return {"response": final_response}
+    else:
+        return {"response": "I'm sorry, I couldn't process your request."}
+
+# POST /chat/batch: turns running at once per batch, and messages accepted per batch
+CHAT_BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", "8"))
+CHAT_BATCH_MAX_MESSAGES = int(os.getenv("CHAT_BATCH_MAX_MESSAGES", "1000"))
+
+class BatchMessage(BaseModel):
+    session_id: str
+    message: str
+    id: Optional[str] = None  # Echoed back so callers can match results to requests
+
+class ChatBatch(BaseModel):
+    messages: List[BatchMessage]
+    concurrency: Optional[int] = None  # Lower than CHAT_BATCH_CONCURRENCY to go easier on the upstreams
+
+async def run_batch(batch: ChatBatch):
+    """Run a batch of turns, yielding one result dict per message as it completes.
+
+    Messages are grouped by session and each worker takes a whole session,
+    running its messages in request order, so a session never has two turns
+    at once. At most `concurrency` sessions are worked on together; turns
+    also take a global admission slot, waiting for one rather than being
+    rejected since the batch already bounds its own concurrency. Turns
+    asking about the same city share their geocode and forecast lookups
+    through the caches, which coalesce concurrent misses.
+    """
+    lanes: Dict[str, List[Tuple[int, BatchMessage]]] = {}
+    for index, item in enumerate(batch.messages):
+        lanes.setdefault(item.session_id, []).append((index, item))
+    pending: asyncio.Queue = asyncio.Queue()
+    for lane in lanes.values():
+        pending.put_nowait(lane)
+    results: asyncio.Queue = asyncio.Queue()
+
+    async def worker():
+        # Batch turns share the OpenWeatherMap quota below interactive ones
+        with upstream_priority("batch"):
+            while not pending.empty():
+                for index, item in pending.get_nowait():
+                    result = {"index": index, "id": item.id, "session_id": item.session_id}
+                    started = time.perf_counter()
+                    try:
+                        async with admission.admit(item.session_id, "batch", bounded=False):
+                            with observe_turn("batch", item.session_id) as turn:
+                                body = await run_chat_turn(ChatMessage(message=item.message, session_id=item.session_id), turn)
+                        result.update(status="ok", response=body["response"])
+                    except Exception as e:
+                        logger.error(f"Error processing batch message {index}: {str(e)}")
+                        result.update(status="error", detail=str(e))
+                    result["seconds"] = round(time.perf_counter() - started, 3)
+                    await results.put(result)
+
+    concurrency = min(batch.concurrency or CHAT_BATCH_CONCURRENCY, CHAT_BATCH_CONCURRENCY, len(lanes))
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, concurrency))]
+    try:
+        for _ in range(len(batch.messages)):
+            yield await results.get()
+    finally:
+        # Client gone: stop starting turns and abort the ones running
+        for task in workers:
+            task.cancel()
+
+@app.post("/chat/batch")
+async def chat_batch(batch: ChatBatch):
+    """Process many (session_id, message) pairs, streaming results as NDJSON in completion order"""
+    if len(batch.messages) > CHAT_BATCH_MAX_MESSAGES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"A batch holds at most {CHAT_BATCH_MAX_MESSAGES} messages, got {len(batch.messages)}"
+        )
+
+    async def result_lines():
+        started = time.perf_counter()
+        errors = 0
+        async for result in run_batch(batch):
+            errors += result["status"] == "error"
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+        yield json.dumps({
+            "done": True,
+            "count": len(batch.messages),
+            "errors": errors,
+            "seconds": round(time.perf_counter() - started, 3),
+        }) + "\n"
+
+    return StreamingResponse(result_lines(), media_type="application/x-ndjson")
 
-        if final_response:
-            return {"response": final_response}
+def sse_frame(event_name: str, data: dict) -> str:
+    """Format one Server-Sent Events frame"""
+    return f"event: {event_name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def describe_event(event) -> List[tuple]:
+    """Translate a runner event into (event name, payload) pairs for streaming clients"""
+    frames = []
+    for call in event.get_function_calls():
+        if call.name == "transfer_to_agent":
+            frames.append(("progress", {"stage": "delegating", "agent": (call.args or {}).get("agent_name")}))
         else:
-            return {"response": "I'm sorry, I couldn't process your request."}
+            frames.append(("progress", {"stage": "tool_call", "tool": call.name, "agent": event.author}))
+    for response in event.get_function_responses():
+        if response.name != "transfer_to_agent":
+            status = (response.response or {}).get("status")
+            frames.append(("progress", {"stage": "tool_result", "tool": response.name, "status": status}))
+    if event.partial and event.content and event.content.parts:
+        text = "".join(part.text or "" for part in event.content.parts)
+        if text:
+            frames.append(("delta", {"text": text, "agent": event.author}))
+    return frames
 
-    except Exception as e:
-        logger.error(f"Error processing message: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+async def stream_turn(session_id: str, text: str, endpoint: str = "stream"):
+    """Run one chat turn with streaming enabled, yielding (event name, payload) pairs"""
+    content = types.Content(
+        role='user',
+        parts=[types.Part(text=text)]
+    )
+
+    async with admission.admit(session_id, endpoint) as waited:
+        if waited >= 0.5:
+            yield "progress", {"stage": "admitted", "waited": round(waited, 3)}
+        with observe_turn(endpoint, session_id) as turn:
+            local_reply, turn_runner = route_turn(session_id, text)
+            if local_reply:
+                turn.outcome = "local"
+                yield "final", {"response": local_reply}
+                return
+
+            final_response = None
+            done = False
+            # Run to its end and closed on this task, as in run_chat_turn
+            async with contextlib.aclosing(turn_runner.run_async(
+                user_id="u_00001",
+                session_id=session_id,
+                new_message=content,
+                run_config=RunConfig(streaming_mode=StreamingMode.SSE)
+            )) as events:
+                async for event in events:
+                    if done:
+                        continue
+                    turn.record(event)
+                    for frame in describe_event(event):
+                        yield frame
+                    if event.is_final_response():
+                        if event.content and event.content.parts:
+                            final_response = event.content.parts[0].text
+                        done = True
+
+            yield "final", {"response": final_response or "I'm sorry, I couldn't process your request."}
+
+@app.post("/chat/stream")
+async def chat_stream(message: ChatMessage):
+    """Process a chat message and stream progress and partial text as Server-Sent Events"""
+    # Reject with a plain 429 while we still can; once streaming, errors go in-band
+    try:
+        admission.check(message.session_id, "stream")
+    except Overloaded as e:
+        raise overloaded_response(e)
+
+    async def event_stream():
+        # Flush something immediately so the client sees the turn has started
+        yield sse_frame("progress", {"stage": "started", "agent": ROOT_AGENT_NAME})
+        try:
+            async for event_name, data in stream_turn(message.session_id, message.message):
+                yield sse_frame(event_name, data)
+        except Overloaded as e:
+            yield sse_frame("error", overloaded_frame(e))
+        except Exception as e:
+            logger.error(f"Error streaming message: {str(e)}")
+            yield sse_frame("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.websocket("/ws/chat")
+async def chat_websocket(websocket: WebSocket, session_id: str = "s_00001"):
+    """Long-lived chat connection bound to one session.
+
+    Clients send {"type": "message", "message": "..."} or {"type": "cancel"}.
+    The server answers with the same progress/delta/final/error payloads as
+    /chat/stream, tagged with a "type" field, plus "cancelled" when a turn
+    is aborted. One turn runs at a time per connection.
+    """
+    session = session_service.get_session(
+        app_name="multi_tool_agent",
+        user_id="u_00001",
+        session_id=session_id
+    )
+    if session is None:
+        await websocket.close(code=4404, reason=f"Unknown session '{session_id}'")
+        return
+
+    await websocket.accept()
+    await websocket.send_json({"type": "session", "session_id": session_id})
+
+    async def run_turn(text: str):
+        try:
+            await websocket.send_json({"type": "progress", "stage": "started", "agent": ROOT_AGENT_NAME})
+            async for event_name, data in stream_turn(session_id, text, endpoint="ws"):
+                await websocket.send_json(dict(data, type=event_name))
+        except asyncio.CancelledError:
+            # The socket may already be gone if the cancel came from a disconnect
+            with contextlib.suppress(Exception):
+                await websocket.send_json({"type": "cancelled"})
+        except Overloaded as e:
+            await websocket.send_json(dict(overloaded_frame(e), type="error"))
+        except Exception as e:
+            logger.error(f"Error processing websocket message: {str(e)}")
+            await websocket.send_json({"type": "error", "detail": str(e)})
+
+    turn: Optional[asyncio.Task] = None
+    try:
+        while True:
+            try:
+                request = json.loads(await websocket.receive_text())
+                if not isinstance(request, dict):
+                    raise ValueError("not an object")
+            except ValueError:
+                await websocket.send_json({"type": "error", "detail": "Messages must be JSON objects"})
+                continue
+            request_type = request.get("type", "message")
+            if request_type == "cancel":
+                if turn is not None and not turn.done():
+                    turn.cancel()
+            elif request_type == "message":
+                if turn is not None and not turn.done():
+                    await websocket.send_json({"type": "error", "detail": "A turn is already in progress"})
+                    continue
+                turn = asyncio.create_task(run_turn(str(request.get("message", ""))))
+            else:
+                await websocket.send_json({"type": "error", "detail": f"Unknown message type '{request_type}'"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if turn is not None and not turn.done():
+            turn.cancel()
+
+startup_report.lap("app_setup")
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001) 
\ No newline at end of file
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1:
+        # Per-process sessions (memory, or sqlite with its own cache and write queue in each worker)
+        # would go stale or overwrite each other across workers
+        if SESSION_BACKEND != "shared":
+            logger.error("WEB_CONCURRENCY > 1 needs SHARED_STORE_URL and SESSION_BACKEND=shared "
+                         f"(SESSION_BACKEND is '{SESSION_BACKEND}'); refusing to start")
+            sys.exit(1)
+        # Workers import the app themselves, so it must be passed by name
+        uvicorn.run("agent_server:app", host="0.0.0.0", port=8001, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8001) 
\ No newline at end of file
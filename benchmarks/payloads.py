@@ -0,0 +1,71 @@
+"""Recorded OpenWeatherMap payloads and a stand-in ToolContext for the benchmarks.
+
+The fixtures in benchmarks/fixtures/ are forecast and geocoding answers in
+the exact shape OpenWeatherMap returns. Forecast timestamps are shifted
+on load so the first slot is the current one, otherwise the forecast
+tool would see only past days and skip all of them.
+"""
+
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+FORECAST_CITIES = ("paris", "tokyo")
+SLOT_SECONDS = 3 * 3600
+
+
+def _read(name: str):
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_forecast(city: str, now: Optional[float] = None) -> dict:
+    """Loads a recorded forecast payload, rebased so its first slot is the current one.
+
+    Args:
+        city (str): Fixture name, one of FORECAST_CITIES.
+        now (float, optional): Reference time. Defaults to time.time().
+
+    Returns:
+        dict: The forecast payload.
+    """
+    data = _read(f"forecast_{city}.json")
+    slot = int(now if now is not None else time.time()) // SLOT_SECONDS * SLOT_SECONDS
+    shift = slot - data["list"][0]["dt"]
+    for entry in data["list"]:
+        entry["dt"] += shift
+        entry["dt_txt"] = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(entry["dt"]))
+    data["city"]["sunrise"] += shift
+    data["city"]["sunset"] += shift
+    return data
+
+
+def load_geocode() -> Dict[str, List[dict]]:
+    """City name to its recorded geocoding answer."""
+    return _read("geocode.json")
+
+
+class StubToolContext:
+    """The part of ADK's ToolContext the tools use: a mutable session state."""
+
+    def __init__(self, language: str = "English", unit: str = "Celsius", city: str = "Paris"):
+        self.state = {
+            "user_preference_language": language,
+            "user_preference_temperature_unit": unit,
+            "user_preference_city": city,
+        }
+
+
+def prime_caches() -> None:
+    """Loads the fixtures into the geocode and forecast caches so the tools never go upstream."""
+    from multi_tool_agent.forecast_cache import forecast_cache, forecast_key
+    from multi_tool_agent.geocache import geocode_cache, normalize_city
+
+    geocodes = load_geocode()
+    for city in FORECAST_CITIES:
+        data = load_forecast(city)
+        location = geocodes[data["city"]["name"]]
+        geocode_cache.put(normalize_city(data["city"]["name"]), location)
+        forecast_cache.store(forecast_key(location[0]["lat"], location[0]["lon"]), data)
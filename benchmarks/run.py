@@ -0,0 +1,282 @@
+"""Micro-benchmarks for the CPU-bound parts of the agent tools.
+
+Each case runs one hot path on the recorded payloads in benchmarks/fixtures,
+for every language and temperature unit it depends on: daily forecast
+statistics (for one city and for a batch of cities), report formatting,
+timezone resolution, and the tools end to end with a stub ToolContext and
+primed caches (no network). For every case the suite
+reports calls per second (best of several rounds) and, from tracemalloc,
+the peak memory one call allocates and what it leaves behind.
+
+Speed is compared as a ratio to a fixed pure-Python reference workload
+timed next to each case, which cancels out most of the difference between
+machines and between a quiet and a busy host.
+
+    python -m benchmarks.run                 # run everything, compare with the baselines
+    python -m benchmarks.run --check         # same, exit 1 on a regression
+    python -m benchmarks.run --update        # record new baselines
+    python -m benchmarks.run --filter forecast
+
+Baselines live in benchmarks/baselines.json. Re-record them in the same
+commit as a change that is expected to move the numbers.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+# The tools' modules read their settings at import: no disk cache, no shared
+# store, and an upstream that refuses connections in case a cache misses
+for _name, _value in (("OPENWEATHERMAP_API_KEY", "benchmark"), ("GOOGLE_API_KEY", "benchmark"),
+                      ("MODEL_GEMINI_2_0_FLASH", "gemini-2.0-flash"), ("SESSION_BACKEND", "memory"),
+                      ("GEOCODE_CACHE_PATH", ""), ("SHARED_STORE_URL", ""), ("TRACE_EXPORT_PATH", ""),
+                      ("OWM_BASE_URL", "http://127.0.0.1:9")):
+    os.environ.setdefault(_name, _value)
+
+from .payloads import StubToolContext, load_forecast, prime_caches
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+LANGUAGES = ("English", "French", "Arabic")
+UNITS = ("Celsius", "Fahrenheit")
+BATCH_CITIES = 200
+
+# Allowed drift before --check fails
+OPS_TOLERANCE = 0.3
+MEMORY_TOLERANCE = 0.25
+MEMORY_SLACK_BYTES = 1024
+
+
+class Case(NamedTuple):
+    name: str
+    run: Callable[[int], float]  # runs the operation n times, returns elapsed seconds
+
+
+def sync_case(name: str, fn: Callable[[], object]) -> Case:
+    def run(number: int) -> float:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        return time.perf_counter() - started
+    return Case(name, run)
+
+
+def async_case(name: str, loop: asyncio.AbstractEventLoop, fn: Callable[[], object]) -> Case:
+    """A coroutine function timed on one event loop, so loop startup is not measured."""
+    async def repeat(number: int) -> float:
+        started = time.perf_counter()
+        for _ in range(number):
+            await fn()
+        return time.perf_counter() - started
+    return Case(name, lambda number: loop.run_until_complete(repeat(number)))
+
+
+def reference_workload() -> None:
+    """Fixed mix of dict building, string formatting and sorting, the same kind of work the tools do."""
+    rows = [{"hour": i % 24, "temp": f"{i * 1.5:.1f}"} for i in range(40)]
+    sorted(rows, key=lambda row: row["temp"])
+
+
+REFERENCE = sync_case("reference", reference_workload)
+
+
+def build_cases(loop: asyncio.AbstractEventLoop) -> List[Case]:
+    from multi_tool_agent import agent
+    from multi_tool_agent.compact_forecast import CompactForecast
+    from multi_tool_agent.forecasts import (current_weather_report, daily_statistics, daily_statistics_batch,
+                                            format_daily_forecasts, forecast_report)
+    from multi_tool_agent.localization import catalog
+    from multi_tool_agent.timezones import timezone_resolver
+
+    prime_caches()
+    paris_payload = load_forecast("paris")
+    paris = CompactForecast.from_payload(paris_payload)
+    many_cities = [paris, CompactForecast.from_payload(load_forecast("tokyo"))] * (BATCH_CITIES // 2)
+    cases = [
+        sync_case("forecast.compact", lambda: CompactForecast.from_payload(paris_payload)),
+        sync_case("forecast.daily_statistics", lambda: daily_statistics(paris)),
+        sync_case(f"forecast.daily_statistics_batch[{BATCH_CITIES}]", lambda: daily_statistics_batch(many_cities)),
+        sync_case("timezone.resolve[exact]", lambda: timezone_resolver.resolve("Tokyo")),
+        sync_case("timezone.resolve[alias]", lambda: timezone_resolver.resolve("طوكيو")),
+        sync_case("timezone.resolve[fuzzy]", lambda: timezone_resolver.resolve("Tokio")),
+    ]
+    for language in LANGUAGES:
+        messages = catalog(language)
+        moment = datetime.datetime.now(datetime.timezone.utc)
+        cases.append(sync_case(f"time.report[{language}]", lambda messages=messages, moment=moment:
+                               messages.message("time_report", city="Tokyo", time=messages.timestamp(moment))))
+        for unit in UNITS:
+            tag = f"[{language},{unit}]"
+            cases.append(sync_case(f"weather.report{tag}", lambda messages=messages, unit=unit:
+                                   current_weather_report(paris, messages, unit)))
+            cases.append(sync_case(f"forecast.report{tag}", lambda messages=messages, unit=unit: forecast_report(
+                messages, "Paris", format_daily_forecasts(daily_statistics(paris), 5, messages, unit))))
+    for language in LANGUAGES:
+        for unit in UNITS:
+            context = StubToolContext(language, unit, "Paris")
+            tag = f"[{language},{unit}]"
+            cases.append(async_case(f"tool.get_weather_stateful{tag}", loop,
+                                    lambda context=context: agent.get_weather_stateful("Paris", context)))
+            cases.append(async_case(f"tool.get_weather_forecast{tag}", loop,
+                                    lambda context=context: agent.get_weather_forecast("Tokyo", context, 5)))
+        context = StubToolContext(language, "Celsius", "Tokyo")
+        cases.append(async_case(f"tool.get_current_time[{language}]", loop,
+                                lambda context=context: agent.get_current_time("Tokyo", context)))
+    return cases
+
+
+def calibrate(case: Case, min_seconds: float) -> int:
+    """Number of calls that takes at least `min_seconds`."""
+    number = 1
+    while True:
+        elapsed = case.run(number)
+        if elapsed >= min_seconds:
+            return number
+        number = max(number * 2, int(number * min_seconds / max(elapsed, 1e-9) * 1.1))
+
+
+def measure_speed(case: Case, min_seconds: float, repeat: int) -> Tuple[float, float]:
+    """Calls per second of the case and of the reference workload.
+
+    Rounds of the two alternate, so both see the same load on the host, and
+    the fastest round of each counts.
+    """
+    number = calibrate(case, min_seconds)
+    reference_number = calibrate(REFERENCE, min_seconds / 2)
+    best = reference_best = float("inf")
+    for _ in range(repeat):
+        best = min(best, case.run(number))
+        reference_best = min(reference_best, REFERENCE.run(reference_number))
+    return number / best, reference_number / reference_best
+
+
+# Allocations by background threads (HTTP clients of imported libraries)
+# are not the case's doing
+BACKGROUND_TRACE_FILTERS = [tracemalloc.Filter(False, pattern) for pattern in (
+    "*/httpx/*", "*/httpcore/*", "*/ssl.py", "*/socket.py", "*/threading.py")]
+
+
+def _traced_bytes() -> int:
+    snapshot = tracemalloc.take_snapshot().filter_traces(BACKGROUND_TRACE_FILTERS)
+    return sum(stat.size for stat in snapshot.statistics("filename"))
+
+
+def measure_memory(case: Case, calls: int = 20) -> Dict[str, int]:
+    """Peak bytes allocated during one call, and bytes still held per call after `calls` calls.
+
+    The peak is the smallest over several calls, so a one-off resize of
+    some shared dict or buffer is not charged to the case.
+    """
+    case.run(1)  # warm caches and lazily built state first
+    peaks = [0] * calls
+    gc.collect()
+    tracemalloc.start()
+    try:
+        baseline = _traced_bytes()
+        for index in range(calls):
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            case.run(1)
+            peaks[index] = tracemalloc.get_traced_memory()[1] - current
+        gc.collect()
+        retained = _traced_bytes()
+    finally:
+        tracemalloc.stop()
+    return {"peak_bytes": max(0, min(peaks)), "retained_bytes": max(0, retained - baseline) // calls}
+
+
+def compare(result: dict, baseline: Optional[dict], tolerance: float = OPS_TOLERANCE) -> List[str]:
+    """Regressions of one case against its baseline, as readable strings."""
+    if not baseline:
+        return []
+    problems = []
+    if result["relative_speed"] < baseline["relative_speed"] * (1 - tolerance):
+        problems.append(f"relative speed {result['relative_speed']:.4g} vs {baseline['relative_speed']:.4g}")
+    for key in ("peak_bytes", "retained_bytes"):
+        if result[key] > baseline[key] * (1 + MEMORY_TOLERANCE) + MEMORY_SLACK_BYTES:
+            problems.append(f"{key} {result[key]} vs {baseline[key]}")
+    return problems
+
+
+def load_baselines() -> dict:
+    try:
+        with open(BASELINES_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"cases": {}}
+
+
+def environment() -> dict:
+    return {"python": platform.python_version(), "implementation": platform.python_implementation(),
+            "machine": platform.machine(), "system": platform.system()}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this")
+    parser.add_argument("--check", action="store_true", help="exit 1 if a case regressed against its baseline")
+    parser.add_argument("--update", action="store_true", help="write the results to the baselines file")
+    parser.add_argument("--min-time", type=float, default=0.2, help="minimum seconds per timing round")
+    parser.add_argument("--repeat", type=int, default=5, help="timing rounds per case (best one counts)")
+    parser.add_argument("--tolerance", type=float, default=OPS_TOLERANCE,
+                        help="allowed relative slowdown before a case counts as regressed")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    args = parser.parse_args()
+
+    baselines = load_baselines()
+    if baselines.get("environment") and baselines["environment"] != environment():
+        print(f"Note: baselines were recorded on {baselines['environment']}, this is {environment()}")
+
+    loop = asyncio.new_event_loop()
+    results: Dict[str, dict] = {}
+    regressions: Dict[str, List[str]] = {}
+    # The tools print progress lines; keep them out of the report
+    with open(os.devnull, "w") as devnull:
+        with contextlib.redirect_stdout(devnull):
+            cases = [case for case in build_cases(loop) if args.filter in case.name]
+        measure_memory(REFERENCE)  # the first traced run pays for tracemalloc's own tables
+        print(f"{'case':52}{'ops/s':>11}{'µs/op':>9}{'peak B':>9}{'kept B':>8}  vs baseline")
+        for case in cases:
+            with contextlib.redirect_stdout(devnull):
+                ops, reference = measure_speed(case, args.min_time, args.repeat)
+                result = dict(ops_per_sec=round(ops, 1), relative_speed=float(f"{ops / reference:.4g}"),
+                              **measure_memory(case))
+            results[case.name] = result
+            baseline = baselines["cases"].get(case.name)
+            change = f"{100 * (result['relative_speed'] / baseline['relative_speed'] - 1):+.0f}%" if baseline else "new"
+            problems = compare(result, baseline, args.tolerance)
+            if problems:
+                regressions[case.name] = problems
+                change += "  REGRESSION: " + "; ".join(problems)
+            print(f"{case.name:52}{ops:>11.0f}{1e6 / ops:>9.1f}{result['peak_bytes']:>9}"
+                  f"{result['retained_bytes']:>8}  {change}")
+    loop.close()
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"environment": environment(), "cases": results}, f, indent=2, ensure_ascii=False)
+    if args.update:
+        # Merge, so a filtered run only replaces the cases it measured
+        baselines["environment"] = environment()
+        baselines.setdefault("cases", {}).update(results)
+        baselines["cases"] = dict(sorted(baselines["cases"].items()))
+        with open(BASELINES_PATH, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"Baselines written to {BASELINES_PATH}")
+    if regressions:
+        print(f"{len(regressions)} case(s) regressed: {', '.join(regressions)}")
+        return 1 if args.check else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""Conversation mix replayed by the load-test driver.
+
+Each virtual user opens a session with one of the personas (its language,
+unit and default city), then plays conversations picked by weight. Every
+turn carries a kind label so the report can break latency down by what was
+asked. The mix roughly follows production traffic: mostly current weather,
+then forecasts and time questions, with some small talk and a few unknown
+cities.
+"""
+
+from typing import List, NamedTuple, Tuple
+
+
+class Persona(NamedTuple):
+    language: str
+    temperature_unit: str
+    default_city: str
+
+
+class Conversation(NamedTuple):
+    name: str
+    language: str
+    weight: float
+    turns: Tuple[Tuple[str, str], ...]  # (kind, message)
+
+
+PERSONAS: List[Persona] = [
+    Persona("English", "Celsius", "London"),
+    Persona("English", "Fahrenheit", "New York"),
+    Persona("French", "Celsius", "Paris"),
+    Persona("French", "Celsius", "Montreal"),
+    Persona("Arabic", "Celsius", "Tunis"),
+    Persona("Arabic", "Celsius", "Cairo"),
+]
+
+CONVERSATIONS: List[Conversation] = [
+    Conversation("en_weather", "English", 3.0, (
+        ("greeting", "Hello"),
+        ("weather", "What's the weather in Paris?"),
+        ("weather", "And how is the weather in Tokyo?"),
+        ("farewell", "Thanks, bye"),
+    )),
+    Conversation("en_planning", "English", 2.0, (
+        ("forecast", "What's the forecast for Rome for the next 3 days?"),
+        ("time", "What time is it in Rome?"),
+        ("weather", "What's the weather like?"),
+    )),
+    Conversation("en_unknown_city", "English", 0.5, (
+        ("weather", "What's the weather in Nowhereville?"),
+        ("weather", "Weather in London then"),
+    )),
+    Conversation("fr_weather", "French", 2.0, (
+        ("greeting", "Bonjour"),
+        ("weather", "Quel temps fait-il à Lyon ?"),
+        ("forecast", "Prévisions pour Marseille pour les 3 prochains jours"),
+        ("farewell", "Merci, au revoir"),
+    )),
+    Conversation("fr_time", "French", 1.0, (
+        ("time", "Quelle heure est-il à Montréal ?"),
+        ("weather", "Météo à Genève"),
+    )),
+    Conversation("ar_weather", "Arabic", 2.0, (
+        ("greeting", "مرحبا"),
+        ("weather", "ما هي درجة الحرارة في تونس"),
+        ("forecast", "توقعات الطقس في القاهرة"),
+        ("farewell", "مع السلامة"),
+    )),
+    Conversation("ar_time", "Arabic", 1.0, (
+        ("time", "كم الساعة في دبي"),
+        ("weather", "الطقس في الرياض"),
+    )),
+]
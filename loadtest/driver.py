@@ -0,0 +1,270 @@
+"""Load-test driver for agent_server.py.
+
+Virtual users each open a session through POST /session/ and replay the
+multilingual conversations in loadtest/conversations.py through POST
+/chat/ until the test ends. The report gives throughput, latency
+percentiles per endpoint and per kind of message, error counts, and
+event-loop lag.
+
+    # Everything in one process: mock OpenWeatherMap in a background thread,
+    # the fake model, and the server app driven through ASGI. Loop lag is then
+    # measured on the loop that runs the server.
+    python -m loadtest.driver --in-process --users 50 --duration 30
+
+    # Against a running server, started with FAKE_LLM_ENABLED=true and
+    # OWM_BASE_URL pointing at `python -m loadtest.mock_owm`. Loop lag is then
+    # the driver's own and only shows whether the client kept up.
+    python -m loadtest.driver --base-url http://localhost:8001 --users 50 --duration 30
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import math
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+from .conversations import CONVERSATIONS, PERSONAS
+
+LAG_INTERVAL_SECONDS = 0.01
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list (0 for an empty list)."""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, math.ceil(q / 100 * len(values)) - 1))
+    return values[index]
+
+
+def summarize(values: List[float]) -> dict:
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "mean_ms": 1000 * sum(ordered) / len(ordered) if ordered else 0.0,
+        **{f"p{q}_ms": 1000 * percentile(ordered, q) for q in (50, 90, 95, 99)},
+        "max_ms": 1000 * ordered[-1] if ordered else 0.0,
+    }
+
+
+class LoopLagMonitor:
+    """Measures how late a periodic sleep wakes up, i.e. how long the loop was blocked."""
+
+    def __init__(self, interval: float = LAG_INTERVAL_SECONDS):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+
+
+class Results:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Counter = Counter()
+        self.started = time.perf_counter()
+        self.finished = self.started
+
+    def record(self, labels: List[str], seconds: float, error: Optional[str]) -> None:
+        for label in labels:
+            if error is None:
+                self.latencies[label].append(seconds)
+            else:
+                self.errors[label] += 1
+        if error is not None:
+            self.errors["by:" + error] += 1
+
+
+async def timed_post(client: httpx.AsyncClient, results: Results, labels: List[str], path: str,
+                     body: dict) -> Optional[dict]:
+    started = time.perf_counter()
+    error = None
+    data = None
+    try:
+        response = await client.post(path, json=body)
+        if response.status_code != 200:
+            error = f"http_{response.status_code}"
+        else:
+            data = response.json()
+    except httpx.HTTPError as e:
+        error = type(e).__name__
+    results.record(labels, time.perf_counter() - started, error)
+    return data
+
+
+async def virtual_user(client: httpx.AsyncClient, rng: random.Random, deadline: float, results: Results,
+                       think_seconds: float, user_index: int) -> None:
+    persona = rng.choice(PERSONAS)
+    created = await timed_post(client, results, ["session"], "/session/", {
+        "session_name": f"loadtest-{user_index}-{rng.getrandbits(32):08x}",
+        "preferences": persona._asdict(),
+    })
+    if not created:
+        return
+    session_id = created["session_id"]
+    conversations = [c for c in CONVERSATIONS if c.language == persona.language]
+    weights = [c.weight for c in conversations]
+    while time.perf_counter() < deadline:
+        conversation = rng.choices(conversations, weights)[0]
+        for kind, message in conversation.turns:
+            if time.perf_counter() >= deadline:
+                return
+            await timed_post(client, results, ["chat", f"chat:{kind}"], "/chat/",
+                             {"message": message, "session_id": session_id})
+            if think_seconds > 0:
+                await asyncio.sleep(rng.uniform(0, 2 * think_seconds))
+
+
+def start_mock_owm(port: int, latency_ms: float, jitter_ms: float, error_rate: float, calls_per_minute: int = 0):
+    """Runs the mock OpenWeatherMap server on its own thread and event loop."""
+    import uvicorn
+    from .mock_owm import MockSettings, create_app
+
+    app = create_app(MockSettings(latency_ms, jitter_ms, error_rate, seed=0, calls_per_minute=calls_per_minute))
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="mock-owm", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError(f"Mock OpenWeatherMap server failed to start on port {port}")
+        time.sleep(0.01)
+    return server, thread
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    lifespan = contextlib.AsyncExitStack()
+    if args.in_process:
+        os.environ.update(
+            OWM_BASE_URL=f"http://127.0.0.1:{args.mock_port}",
+            FAKE_LLM_ENABLED="true",
+            FAKE_LLM_LATENCY_MS=str(args.llm_latency_ms),
+            # The server's quota scheduler gets the mock's quota (0: both unlimited)
+            OWM_CALLS_PER_MINUTE=str(args.owm_calls_per_minute),
+        )
+        for name, value in (("OPENWEATHERMAP_API_KEY", "loadtest"), ("GOOGLE_API_KEY", "loadtest"),
+                            ("MODEL_GEMINI_2_0_FLASH", "fake-llm"), ("SESSION_BACKEND", "memory"),
+                            ("GEOCODE_CACHE_PATH", "")):
+            os.environ.setdefault(name, value)
+        import agent_server
+        # ASGITransport does not send lifespan events, so run startup/shutdown here
+        await lifespan.enter_async_context(agent_server.app.router.lifespan_context(agent_server.app))
+        transport = httpx.ASGITransport(app=agent_server.app)
+        client = httpx.AsyncClient(transport=transport, base_url="http://agent-server", timeout=args.timeout)
+    else:
+        client = httpx.AsyncClient(
+            base_url=args.base_url,
+            timeout=args.timeout,
+            limits=httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users),
+        )
+
+    results = Results()
+    lag = LoopLagMonitor()
+    lag.start()
+    try:
+        deadline = time.perf_counter() + args.ramp + args.duration
+        users = []
+        for index in range(args.users):
+            users.append(asyncio.create_task(virtual_user(
+                client, random.Random(rng.getrandbits(64)), deadline, results, args.think_ms / 1000, index
+            )))
+            if args.ramp > 0:
+                await asyncio.sleep(args.ramp / args.users)
+        await asyncio.gather(*users)
+        results.finished = time.perf_counter()
+    finally:
+        await lag.stop()
+        await client.aclose()
+        await lifespan.aclose()
+
+    elapsed = results.finished - results.started
+    return {
+        "mode": "in-process" if args.in_process else args.base_url,
+        "users": args.users,
+        "duration_s": elapsed,
+        "llm_latency_ms": args.llm_latency_ms if args.in_process else None,
+        "throughput_rps": {label: len(values) / elapsed for label, values in results.latencies.items()
+                           if ":" not in label},
+        "latency": {label: summarize(values) for label, values in sorted(results.latencies.items())},
+        "errors": dict(results.errors),
+        "loop_lag": dict(summarize(lag.samples), measured_on="server loop" if args.in_process else "driver loop"),
+    }
+
+
+def print_report(report: dict) -> None:
+    print(f"\nLoad test: {report['users']} users for {report['duration_s']:.1f} s ({report['mode']})")
+    print(f"{'':16}{'ok':>8}{'err':>6}{'mean':>9}{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)")
+    for label, stats in report["latency"].items():
+        print(f"{label:16}{stats['count']:>8}{report['errors'].get(label, 0):>6}"
+              + "".join(f"{stats[key]:>9.1f}" for key in ("mean_ms", "p50_ms", "p90_ms", "p95_ms", "p99_ms", "max_ms")))
+    print("Throughput: " + ", ".join(f"{label} {rps:.1f} req/s" for label, rps in report["throughput_rps"].items()))
+    errors = {key[3:]: count for key, count in report["errors"].items() if key.startswith("by:")}
+    if errors:
+        print("Errors: " + ", ".join(f"{kind} x{count}" for kind, count in errors.items()))
+    lag = report["loop_lag"]
+    print(f"Event loop lag ({lag['measured_on']}): p50 {lag['p50_ms']:.1f} ms, p99 {lag['p99_ms']:.1f} ms, "
+          f"max {lag['max_ms']:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--base-url", default="http://localhost:8001", help="server to test (ignored with --in-process)")
+    parser.add_argument("--in-process", action="store_true", help="run the server app, fake model and mock OWM here")
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of steady load after ramp-up")
+    parser.add_argument("--ramp", type=float, default=0.0, help="seconds over which users are started")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="mean pause between a user's messages")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", dest="json_path", help="also write the report to this file")
+    group = parser.add_argument_group("in-process mode")
+    group.add_argument("--llm-latency-ms", type=float, default=300.0, help="delay added to every fake model call")
+    group.add_argument("--mock-port", type=int, default=8090)
+    group.add_argument("--owm-latency-ms", type=float, default=50.0)
+    group.add_argument("--owm-jitter-ms", type=float, default=50.0)
+    group.add_argument("--owm-error-rate", type=float, default=0.0)
+    group.add_argument("--owm-calls-per-minute", type=int, default=0, help="mock OWM quota, answered 429 beyond it")
+    args = parser.parse_args()
+
+    if args.in_process:
+        start_mock_owm(args.mock_port, args.owm_latency_ms, args.owm_jitter_ms, args.owm_error_rate,
+                       args.owm_calls_per_minute)
+        # Tool prints and per-turn logs would dominate the measurement
+        logging.disable(logging.INFO)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            report = asyncio.run(run(args))
+    else:
+        report = asyncio.run(run(args))
+
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0 if not report["errors"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
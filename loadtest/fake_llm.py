@@ -0,0 +1,155 @@
+"""Deterministic stand-in for Gemini, used by the load tests.
+
+Importing this module registers `FakeLlm` with ADK's model registry
+under the name "fake-llm". With FAKE_LLM_ENABLED=true, agent.py imports
+it and every agent talks to the fake instead of Gemini, so the server can
+be driven at full speed without spending model quota. The fake behaves
+like a well-behaved model would:
+
+- it classifies the user's message with the intent router's model
+  (English, French and Arabic),
+- the root agent calls get_weather_stateful (get_weather_multi_city when
+  the message names several cities) or transfers to the sub-agent for the
+  intent, and a sub-agent that receives a message it cannot handle
+  transfers back to its parent (named in the transfer instructions ADK
+  adds to its request),
+- a sub-agent calls its single tool, and once the tool has answered, the
+  tool's report (or error message) becomes the model's reply.
+
+City names are taken from the timezone alias table, so "à Lyon", "in
+Tokyo" and "في تونس" all resolve. FAKE_LLM_LATENCY_MS adds a fixed delay
+to every call to approximate real model latency.
+"""
+
+import asyncio
+import os
+import re
+from typing import AsyncGenerator, List, Optional
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.models.registry import LLMRegistry
+from google.genai import types
+
+from multi_tool_agent.intent_router import build_router
+from multi_tool_agent.timezones import timezone_resolver
+
+FAKE_LLM_LATENCY_MS = float(os.environ.get("FAKE_LLM_LATENCY_MS", "0"))
+
+# The tool each agent owns, and the intent it serves
+INTENT_TOOLS = {
+    "weather": "get_weather_stateful",
+    "forecast": "get_weather_forecast",
+    "time": "get_current_time",
+    "greeting": "say_hello",
+    "farewell": "say_goodbye",
+}
+INTENT_AGENTS = {
+    "forecast": "forecast_agent",
+    "time": "time_agent",
+    "greeting": "greeting_agent",
+    "farewell": "farewell_agent",
+}
+
+_CITY_AFTER = re.compile(r"(?:\bin|\bà|\bfor|\bpour|في)\s+([^\s?؟!.,]+)", re.IGNORECASE)
+_DAYS = re.compile(r"\b([1-5])\b")
+# From the agent-transfer instructions ADK appends to a sub-agent's system instruction
+_PARENT_AGENT = re.compile(r"Your parent agent is (\S+?)\.")
+_STREAM_CHUNK_WORDS = 4
+
+_intents = build_router(threshold=0.0)
+
+
+def extract_city(text: str) -> str:
+    """First known city alias in the text, else the word after "in"/"à"/"في"."""
+    cities = timezone_resolver.find_cities(text)
+    if cities:
+        return cities[0]
+    found = _CITY_AFTER.search(text)
+    return found.group(1) if found else ""
+
+
+def _user_text(llm_request: LlmRequest) -> str:
+    for content in reversed(llm_request.contents):
+        texts = [part.text for part in content.parts or [] if part.text]
+        # Turns by other agents are replayed as user content starting with "For context:"
+        if content.role == "user" and texts and not texts[0].startswith("For context"):
+            return texts[0]
+    return ""
+
+
+def _parent_agent(llm_request: LlmRequest) -> Optional[str]:
+    instruction = llm_request.config.system_instruction if llm_request.config else None
+    found = _PARENT_AGENT.search(instruction) if isinstance(instruction, str) else None
+    return found.group(1) if found else None
+
+
+def _call(name: str, args: dict) -> LlmResponse:
+    return LlmResponse(content=types.Content(
+        role="model", parts=[types.Part(function_call=types.FunctionCall(name=name, args=args))]
+    ))
+
+
+def _text(text: str, partial: Optional[bool] = None) -> LlmResponse:
+    return LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]), partial=partial)
+
+
+class FakeLlm(BaseLlm):
+    """Rule-based model that drives the agent team through its tools."""
+
+    model: str = "fake-llm"
+
+    @classmethod
+    def supported_models(cls) -> List[str]:
+        return [r"fake-llm"]
+
+    def respond(self, llm_request: LlmRequest) -> LlmResponse:
+        """Decides the next step for the agent that sent the request."""
+        tools = set(llm_request.tools_dict)
+        last = llm_request.contents[-1] if llm_request.contents else None
+        responses = [part.function_response for part in (last.parts or []) if part.function_response] if last else []
+        if responses and responses[0].name != "transfer_to_agent":
+            result = responses[0].response or {}
+            return _text(str(result.get("report") or result.get("error_message") or result.get("result") or result))
+
+        text = _user_text(llm_request)
+        intent = _intents.classify(text).intent
+        if "get_weather_multi_city" in tools and intent in ("weather", "forecast"):
+            cities = timezone_resolver.find_cities(text)
+            if len(cities) > 1:
+                days = _DAYS.search(text) if intent == "forecast" else None
+                return _call("get_weather_multi_city", {"cities": cities, "days": int(days.group(1)) if days else 0})
+        own_tool = INTENT_TOOLS.get(intent)
+        if own_tool in tools:
+            if own_tool in ("say_hello", "say_goodbye"):
+                return _call(own_tool, {})
+            args = {"city": extract_city(text)}
+            if own_tool == "get_weather_forecast":
+                days = _DAYS.search(text)
+                args["days"] = int(days.group(1)) if days else 3
+            return _call(own_tool, args)
+
+        if "transfer_to_agent" in tools:
+            if "get_weather_stateful" in tools and intent in INTENT_AGENTS:
+                return _call("transfer_to_agent", {"agent_name": INTENT_AGENTS[intent]})
+            parent = _parent_agent(llm_request)
+            if "get_weather_stateful" not in tools and parent:
+                return _call("transfer_to_agent", {"agent_name": parent})
+        return _text("I can tell you the weather, the forecast for the coming days, or the time in a city.")
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        if FAKE_LLM_LATENCY_MS > 0:
+            await asyncio.sleep(FAKE_LLM_LATENCY_MS / 1000)
+        response = self.respond(llm_request)
+        text = response.content.parts[0].text
+        if stream and text:
+            words = text.split(" ")
+            for start in range(0, len(words), _STREAM_CHUNK_WORDS):
+                yield _text(" ".join(words[start:start + _STREAM_CHUNK_WORDS]) + " ", partial=True)
+        yield response
+
+
+LLMRegistry.register(FakeLlm)
@@ -0,0 +1,163 @@
+"""Local mock of the two OpenWeatherMap endpoints the agent uses.
+
+Serves /geo/1.0/direct and /data/2.5/forecast with deterministic payloads
+in the same shape as the real API. Every city name gets stable made-up
+coordinates, except names starting with "nowhere", which are unknown.
+Latency and errors can be injected to see how the server behaves when
+the upstream is slow or failing, and a per-minute call quota can be
+enforced like a real OWM plan (429 with Retry-After once it is used up).
+It does not import the agent package, so it can run on its own machine.
+
+    python -m loadtest.mock_owm --port 8090 --latency-ms 80 --jitter-ms 40 --error-rate 0.01
+
+Point the server at it with OWM_BASE_URL=http://127.0.0.1:8090.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import zlib
+from typing import Optional
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+CONDITIONS = [
+    (800, "Clear", "clear sky", "01"),
+    (801, "Clouds", "few clouds", "02"),
+    (803, "Clouds", "broken clouds", "04"),
+    (804, "Clouds", "overcast clouds", "04"),
+    (500, "Rain", "light rain", "10"),
+    (501, "Rain", "moderate rain", "10"),
+    (600, "Snow", "light snow", "13"),
+]
+
+
+class MockSettings:
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 500, seed: Optional[int] = None, calls_per_minute: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.calls_per_minute = calls_per_minute
+
+
+def locate(city: str) -> Optional[dict]:
+    """Geocoding result for a city name, or None for unknown cities."""
+    name = city.split(",", 1)[0].strip()
+    if not name or name.lower().startswith("nowhere"):
+        return None
+    seed = zlib.crc32(name.lower().encode())
+    return {"name": name.title(), "lat": round((seed % 12000) / 100 - 60, 4),
+            "lon": round((seed // 12000 % 36000) / 100 - 180, 4), "country": "XX"}
+
+
+def forecast_payload(lat: float, lon: float, now: Optional[float] = None, name: Optional[str] = None) -> dict:
+    """A 5 day / 3 hour forecast that depends only on the coordinates and the current slot."""
+    slot = int(now if now is not None else time.time()) // 10800 * 10800
+    seed = zlib.crc32(f"{lat:.2f},{lon:.2f}".encode())
+    base = 25 - abs(lat) / 3
+    offset = int(round(lon / 15)) * 3600
+    entries = []
+    for i in range(40):
+        dt = slot + i * 10800
+        hour = (dt + offset) // 3600 % 24
+        temp = round(base + 6 * (1 - abs(hour - 14) / 12) + (seed >> (i % 16)) % 3, 2)
+        weather_id, main, description, icon = CONDITIONS[(seed + dt // 86400) % len(CONDITIONS)]
+        entries.append({
+            "dt": dt,
+            "main": {"temp": temp, "feels_like": temp - 1, "temp_min": temp - 1.5, "temp_max": temp + 1.5,
+                     "pressure": 1013, "humidity": 40 + seed % 50},
+            "weather": [{"id": weather_id, "main": main, "description": description,
+                         "icon": icon + ("d" if 6 <= hour < 18 else "n")}],
+            "clouds": {"all": (seed + i * 7) % 100},
+            "wind": {"speed": round(2 + (seed + i) % 8 * 0.7, 2), "deg": (seed + i * 13) % 360},
+            "visibility": 10000,
+            "pop": round(0.6 if main in ("Rain", "Snow") else ((seed + i) % 4) / 10, 2),
+            "sys": {"pod": "d" if 6 <= hour < 18 else "n"},
+            "dt_txt": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(dt)),
+        })
+    return {
+        "cod": "200", "message": 0, "cnt": len(entries), "list": entries,
+        "city": {"id": seed, "name": name or f"Mock {lat:.2f},{lon:.2f}", "coord": {"lat": lat, "lon": lon},
+                 "country": "XX", "population": 0, "timezone": offset, "sunrise": slot, "sunset": slot + 43200},
+    }
+
+
+def create_app(settings: MockSettings) -> FastAPI:
+    app = FastAPI(title="Mock OpenWeatherMap")
+    app.state.requests = {"geocode": 0, "forecast": 0, "errors": 0, "rate_limited": 0}
+    # Forecasts are named after the city that was geocoded to the same coordinates
+    names = {}
+    # Calls counted in the current fixed one-minute window: [window start, count]
+    window = [0.0, 0]
+
+    async def delay_or_fail(endpoint: str) -> Optional[JSONResponse]:
+        app.state.requests[endpoint] += 1
+        if settings.calls_per_minute > 0:
+            now = time.time()
+            if now - window[0] >= 60:
+                window[:] = [now // 60 * 60, 0]
+            window[1] += 1
+            if window[1] > settings.calls_per_minute:
+                app.state.requests["rate_limited"] += 1
+                retry_after = max(1, int(window[0] + 60 - now + 0.999))
+                return JSONResponse({"cod": 429, "message": "Your account is temporary blocked due to exceeding of "
+                                     "requests limitation of your subscription type."},
+                                    status_code=429, headers={"Retry-After": str(retry_after)})
+        delay = settings.latency_ms + settings.random.uniform(0, settings.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        if settings.error_rate > 0 and settings.random.random() < settings.error_rate:
+            app.state.requests["errors"] += 1
+            return JSONResponse({"cod": settings.error_status, "message": "Injected error"},
+                                status_code=settings.error_status)
+        return None
+
+    @app.get("/geo/1.0/direct")
+    async def geocode(q: str, limit: int = 1, appid: str = ""):
+        error = await delay_or_fail("geocode")
+        if error is not None:
+            return error
+        location = locate(q)
+        if location:
+            names[(location["lat"], location["lon"])] = location["name"]
+        return [location][:limit] if location else []
+
+    @app.get("/data/2.5/forecast")
+    async def forecast(lat: float, lon: float, units: str = "metric", appid: str = ""):
+        error = await delay_or_fail("forecast")
+        if error is not None:
+            return error
+        return forecast_payload(lat, lon, name=names.get((lat, lon)))
+
+    @app.get("/stats")
+    async def stats():
+        return app.state.requests
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="fixed delay per request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="extra uniform random delay per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with an error")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP status of injected errors")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--calls-per-minute", type=int, default=0, help="answer 429 beyond this many calls per minute")
+    args = parser.parse_args()
+    settings = MockSettings(args.latency_ms, args.jitter_ms, args.error_rate, args.error_status, args.seed,
+                            args.calls_per_minute)
+    uvicorn.run(create_app(settings), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,10 @@
-from . import agent
+import importlib
 
 
+def __getattr__(name):
+    # ADK's loaders read `multi_tool_agent.agent.root_agent`; importing the agent
+    # module (google.adk and the tools) waits until then, so lightweight modules
+    # such as startup can be imported on their own
+    if name == "agent":
+        return importlib.import_module(".agent", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,220 @@
+"""Admission control for chat turns.
+
+Every turn (POST /chat/, /chat/stream, the WebSocket and /chat/batch)
+goes through `admission.admit()` before it reaches the runner:
+
+- a session's turns run strictly one at a time, in arrival order, so two
+  messages on one session never race on its state (`last_city_checked`,
+  `last_weather_report`, the event history);
+- at most CHAT_MAX_CONCURRENT turns run at once in this worker, and the
+  others wait in FIFO order;
+- at most CHAT_MAX_QUEUED turns may wait in total, and at most
+  CHAT_SESSION_MAX_QUEUED behind one session's running turn. A turn
+  beyond either limit is rejected at once (HTTP 429). A turn that waited
+  longer than CHAT_QUEUE_TIMEOUT_SECONDS gives up (HTTP 503).
+
+Rejections carry a Retry-After estimate from the recent turn duration.
+Queue depth, running turns and wait times are in `stats()` and in the
+metrics, for autoscaling. CHAT_MAX_CONCURRENT=0 removes the global limit,
+but turns of one session are still serialized.
+"""
+
+import asyncio
+import contextlib
+import math
+import os
+import time
+from collections import deque
+from typing import AsyncIterator, Deque, Dict
+
+from .metrics import CHAT_QUEUE_WAIT_SECONDS, CHAT_TURNS_REJECTED
+
+CHAT_MAX_CONCURRENT = int(os.environ.get("CHAT_MAX_CONCURRENT", "32"))
+CHAT_MAX_QUEUED = int(os.environ.get("CHAT_MAX_QUEUED", "64"))
+CHAT_SESSION_MAX_QUEUED = int(os.environ.get("CHAT_SESSION_MAX_QUEUED", "4"))
+CHAT_QUEUE_TIMEOUT_SECONDS = float(os.environ.get("CHAT_QUEUE_TIMEOUT_SECONDS", "30"))
+
+# Weight of the newest turn in the running mean of turn durations
+_TURN_SECONDS_SMOOTHING = 0.1
+_MAX_RETRY_AFTER_SECONDS = 60
+
+
+class Overloaded(Exception):
+    """A turn was not admitted.
+
+    Attributes:
+        status_code (int): 429 when the queue was full, 503 when the wait timed out.
+        reason (str): "queue_full", "session_queue_full" or "queue_timeout".
+        retry_after (int): Suggested seconds before retrying.
+    """
+
+    def __init__(self, status_code: int, reason: str, message: str, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Lane:
+    """One session's FIFO lock and its number of running or waiting turns."""
+
+    __slots__ = ("lock", "turns")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.turns = 0
+
+
+class AdmissionController:
+    """Global concurrency limit with a bounded FIFO wait queue, plus per-session ordering."""
+
+    def __init__(self, max_concurrent: int = 32, max_queued: int = 64, session_max_queued: int = 4,
+                 queue_timeout: float = 30.0):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.session_max_queued = session_max_queued
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.queued = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._lanes: Dict[str, _Lane] = {}
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "session_queue_full": 0, "queue_timeout": 0}
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.turn_seconds = 1.0
+
+    def retry_after(self) -> int:
+        """Seconds until the queue ahead of a new turn has likely drained."""
+        slots = self.max_concurrent if self.max_concurrent > 0 else max(1, self.active)
+        estimate = self.turn_seconds * (self.queued + 1) / slots
+        return max(1, min(_MAX_RETRY_AFTER_SECONDS, math.ceil(estimate)))
+
+    def _reject(self, status_code: int, reason: str, message: str, endpoint: str) -> Overloaded:
+        self.rejected[reason] += 1
+        CHAT_TURNS_REJECTED.labels(endpoint, reason).inc()
+        return Overloaded(status_code, reason, message, self.retry_after())
+
+    def check(self, session_id: str, endpoint: str = "chat") -> None:
+        """Raises Overloaded now if a turn for this session would be rejected.
+
+        Lets streaming endpoints answer 429 before they start their response;
+        `admit` checks again, since the queue may fill in between.
+        """
+        lane = self._lanes.get(session_id)
+        if lane is not None and lane.turns > self.session_max_queued:
+            raise self._reject(429, "session_queue_full",
+                               f"Session '{session_id}' already has {lane.turns} turns pending", endpoint)
+        would_wait = lane is not None or (
+            self.max_concurrent > 0 and (self.active >= self.max_concurrent or bool(self._waiters)))
+        if would_wait and self.queued >= self.max_queued:
+            raise self._reject(429, "queue_full", f"Server busy: {self.queued} turns already waiting", endpoint)
+
+    async def _slot(self) -> None:
+        if self.max_concurrent <= 0 or (self.active < self.max_concurrent and not self._waiters):
+            self.active += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # _release_slot hands its slot over by resolving the future
+            await waiter
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                # Given a slot just as we were cancelled: pass it on
+                self._release_slot()
+            else:
+                with contextlib.suppress(ValueError):
+                    self._waiters.remove(waiter)
+            raise
+
+    def _release_slot(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    async def _acquire(self, lane: _Lane) -> None:
+        await lane.lock.acquire()
+        try:
+            await self._slot()
+        except BaseException:
+            lane.lock.release()
+            raise
+
+    @contextlib.asynccontextmanager
+    async def admit(self, session_id: str, endpoint: str = "chat", bounded: bool = True) -> AsyncIterator[float]:
+        """Waits until the session is free and a slot is available, and holds both for the turn.
+
+        Args:
+            session_id (str): The turn's session.
+            endpoint (str): Label for the metrics ("chat", "stream", "ws", "batch").
+            bounded (bool): False for callers that bound their own concurrency
+                (/chat/batch): never rejected and never timed out.
+
+        Yields:
+            float: Seconds the turn waited.
+
+        Raises:
+            Overloaded: The queue is full (429) or the wait timed out (503).
+        """
+        if bounded:
+            self.check(session_id, endpoint)
+        lane = self._lanes.get(session_id)
+        if lane is None:
+            lane = self._lanes[session_id] = _Lane()
+        lane.turns += 1
+        self.queued += 1
+        waiting = True
+        started = time.perf_counter()
+        try:
+            try:
+                idle = not lane.lock.locked() and (
+                    self.max_concurrent <= 0 or (self.active < self.max_concurrent and not self._waiters))
+                if bounded and self.queue_timeout > 0 and not idle:
+                    await asyncio.wait_for(self._acquire(lane), self.queue_timeout)
+                else:
+                    await self._acquire(lane)
+            except asyncio.TimeoutError:
+                raise self._reject(503, "queue_timeout",
+                                   f"Server busy: no slot within {self.queue_timeout:g}s", endpoint) from None
+            waiting = False
+            self.queued -= 1
+            admitted_at = time.perf_counter()
+            waited = admitted_at - started
+            self.admitted += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+            CHAT_QUEUE_WAIT_SECONDS.labels(endpoint).observe(waited)
+            try:
+                yield waited
+            finally:
+                self._release_slot()
+                lane.lock.release()
+                self.turn_seconds += _TURN_SECONDS_SMOOTHING * (time.perf_counter() - admitted_at - self.turn_seconds)
+        finally:
+            if waiting:
+                self.queued -= 1
+            lane.turns -= 1
+            if lane.turns == 0 and self._lanes.get(session_id) is lane:
+                del self._lanes[session_id]
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+            "active": self.active,
+            "queued": self.queued,
+            "busy_sessions": len(self._lanes),
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "wait_seconds_mean": self.wait_seconds_total / self.admitted if self.admitted else 0.0,
+            "wait_seconds_max": self.wait_seconds_max,
+            "turn_seconds_mean": self.turn_seconds,
+        }
+
+
+admission = AdmissionController(CHAT_MAX_CONCURRENT, CHAT_MAX_QUEUED, CHAT_SESSION_MAX_QUEUED,
+                                CHAT_QUEUE_TIMEOUT_SECONDS)
@@ -1,31 +1,51 @@
 import datetime
-import requests
+import importlib
 import os
+import time
+import threading
 from dotenv import load_dotenv
 import json
-from zoneinfo import ZoneInfo
 
 from google.adk.agents import Agent
 from google.adk.sessions import InMemorySessionService
 from google.adk.runners import Runner
 import asyncio
 from google.genai import types
-from google.adk.models.lite_llm import LiteLlm
 from google.adk.tools.tool_context import ToolContext
 
 from google.adk.agents.callback_context import CallbackContext
 from google.adk.models.llm_request import LlmRequest
 from google.adk.models.llm_response import LlmResponse
-from typing import Optional, Dict, Any
+from google.adk.models.registry import LLMRegistry
+from typing import Optional, Dict, Any, List, Tuple
 from google.adk.tools.base_tool import BaseTool
 
 load_dotenv()
 
+# Imported after load_dotenv() so OWM_* settings from .env are picked up
+from .owm_client import OWMError, OWMUnavailable
+from .geocache import geocode_city, normalize_city
+from .compact_forecast import CompactForecast
+from .forecast_cache import get_forecast_with_age
+from .refresher import hot_cities
+from .timezones import resolve_timezone
+from .localization import catalog
+from .forecasts import city_summary, comparison_report, current_weather_report, data_age_note, forecast_report
+from .forecasts import daily_statistics, daily_statistics_batch, format_daily_forecasts
+from .metrics import LLM_CALL_SECONDS, LLM_CALLS_SKIPPED, TOOL_CALL_SECONDS, TOOL_CALLS
+from .tracing import start_span
+
 
 
 """ TOOLS """
 
-def get_weather_stateful(city: str, tool_context: ToolContext) -> dict:
+def api_error_message(messages, key: str, city: str, error: OWMError) -> str:
+    """Localized message for an OpenWeatherMap error; when OWM is out of quota or down, says when to try again."""
+    if isinstance(error, OWMUnavailable):
+        return messages.message("upstream_busy", city=city, seconds=error.retry_after)
+    return messages.message(key, city=city, error=error.message)
+
+async def get_weather_stateful(city: str, tool_context: ToolContext) -> dict:
     """Retrieves the current weather report for a specified city, using temperature units from session state.
 
     Args:
@@ -38,15 +58,11 @@ def get_weather_stateful(city: str, tool_context: ToolContext) -> dict:
     try:
         print(f"--- Tool: get_weather_stateful called for city='{city}' ---")
         
-        # Get API key from environment variable (more secure)
-        api_key = os.environ.get("OPENWEATHERMAP_API_KEY")
-        
         # Read preferred temperature unit from state
         preferred_unit = tool_context.state.get("user_preference_temperature_unit", "Celsius") # Default to Celsius
         preferred_city = tool_context.state.get("user_preference_city", "Tunis") # Default city preference
         preferred_language = tool_context.state.get("user_preference_language", "English") # Default language preference
-        
-
+        messages = catalog(preferred_language)
         
         # First, get city ID by city name
         # If no city is specified and we're not checking the preferred city, use the preferred city
@@ -56,19 +72,12 @@ def get_weather_stateful(city: str, tool_context: ToolContext) -> dict:
             print(f"--- Tool: Using preferred city: '{city}' (was '{original_city}') ---")
         else:
             print(f"--- Tool: Using specified city: '{city}' ---")
+        hot_cities.record(city)
             
-        geo_url = f"http://api.openweathermap.org/geo/1.0/direct?q={city}&limit=1&appid={api_key}"
-        geo_response = requests.get(geo_url)
-        geo_data = geo_response.json()
+        geo_data = await geocode_city(city)
         
         if not geo_data:
-            if preferred_language == "Arabic":
-                error_msg = f"لم يتم العثور على المدينة '{city}'."
-            elif preferred_language == "French":
-                error_msg = f"Ville '{city}' introuvable."
-            else:  # Default to English
-                error_msg = f"City '{city}' not found."
-                
+            error_msg = messages.message("city_not_found", city=city)
             print(f"--- Tool: {error_msg} ---")
             return {
                 "status": "error",
@@ -79,73 +88,45 @@ def get_weather_stateful(city: str, tool_context: ToolContext) -> dict:
         lat = geo_data[0]["lat"]
         lon = geo_data[0]["lon"]
             
-        # Make API request to OpenWeatherMap forecast endpoint
-        forecast_url = f"http://api.openweathermap.org/data/2.5/forecast?lat={lat}&lon={lon}&appid={api_key}&units=metric"
-        response = requests.get(forecast_url)
-        data = response.json()
+        # Forecast is shared with the other weather tool through the cache; old data if OWM is down
+        data, age = await get_forecast_with_age(lat, lon)
         
-        # Check if API request was successful
-        if response.status_code == 200:
-            # Extract current forecast (first item in the list)
-            current_forecast = data["list"][0]
-            weather_description = current_forecast["weather"][0]["description"]
-            temp_celsius = current_forecast["main"]["temp"]
-            
-            # Get city name from the response (may be more accurate than user input)
-            city_name = data["city"]["name"]
-            
-            # Format temperature based on user preference in state
-            if preferred_unit == "Fahrenheit":
-                temp_value = (temp_celsius * 9/5) + 32
-                temp_unit = "°F"
-            else:  # Default to Celsius
-                temp_value = temp_celsius
-                temp_unit = "°C"
-            
-            # Generate the report in the preferred language
-            if preferred_language == "Arabic":
-                report = f"الطقس الحالي في {city_name} هو {weather_description} مع درجة حرارة {temp_value:.1f}{temp_unit}."
-            elif preferred_language == "French":
-                report = f"La météo actuelle à {city_name} est {weather_description} avec une température de {temp_value:.1f}{temp_unit}."
-            else:  # Default to English
-                report = f"The current weather in {city_name} is {weather_description} with a temperature of {temp_value:.1f}{temp_unit}."
-            
-            result = {"status": "success", "report": report}
-            
-            # Write back to state that we checked this city
-            tool_context.state["last_city_checked"] = city_name
-            print(f"--- Tool: Updated state 'last_city_checked': {city_name} ---")
-            print(f"--- Tool: Generated report in {preferred_language} and {preferred_unit}. Result: {result} ---")
-            
-            return result
+        # Get city name from the response (may be more accurate than user input)
+        city_name = data.city
+        
+        # Generate the report in the preferred language and unit
+        if age is None:
+            report = current_weather_report(data, messages, preferred_unit)
         else:
-            if preferred_language == "Arabic":
-                error_msg = f"معلومات الطقس لـ '{city}' غير متوفرة. خطأ في API: {data.get('message', 'خطأ غير معروف')}"
-            elif preferred_language == "French":
-                error_msg = f"Les informations météo pour '{city}' ne sont pas disponibles. Erreur API: {data.get('message', 'Erreur inconnue')}"
-            else:  # Default to English
-                error_msg = f"Weather information for '{city}' is not available. API error: {data.get('message', 'Unknown error')}"
-                
-            print(f"--- Tool: API error: {error_msg} ---")
-            return {
-                "status": "error",
-                "error_message": error_msg,
-            }
+            report = current_weather_report(data, messages, preferred_unit, now=time.time())
+            report += data_age_note(messages, age)
+        
+        result = {"status": "success", "report": report}
+        if age is not None:
+            result["data_age_seconds"] = round(age)
+        
+        # Write back to state that we checked this city
+        tool_context.state["last_city_checked"] = city_name
+        print(f"--- Tool: Updated state 'last_city_checked': {city_name} ---")
+        print(f"--- Tool: Generated report in {preferred_language} and {preferred_unit}. Result: {result} ---")
+        
+        return result
+    except OWMError as e:
+        error_msg = api_error_message(messages, "weather_api_error", city, e)
+        print(f"--- Tool: API error: {error_msg} ---")
+        return {
+            "status": "error",
+            "error_message": error_msg,
+        }
     except Exception as e:
-        if preferred_language == "Arabic":
-            error_msg = f"خطأ في استرجاع الطقس لـ '{city}': {str(e)}"
-        elif preferred_language == "French":
-            error_msg = f"Erreur lors de la récupération de la météo pour '{city}': {str(e)}"
-        else:  # Default to English
-            error_msg = f"Error retrieving weather for '{city}': {str(e)}"
-            
+        error_msg = messages.message("weather_error", city=city, error=str(e))
         print(f"--- Tool: Exception: {error_msg} ---")
         return {
             "status": "error",
             "error_message": error_msg,
         }
 
-def get_weather_forecast(city: str, tool_context: ToolContext, days: int = 3) -> dict:
+async def get_weather_forecast(city: str, tool_context: ToolContext, days: int = 3) -> dict:
     """Retrieves weather forecast for a specified city for upcoming days.
 
     Args:
@@ -159,13 +140,11 @@ def get_weather_forecast(city: str, tool_context: ToolContext, days: int = 3) ->
     try:
         print(f"--- Tool: get_weather_forecast called for city='{city}', days={days} ---")
         
-        # Get API key from environment variable
-        api_key = os.environ.get("OPENWEATHERMAP_API_KEY")
-
         # Read preferred temperature unit from state
         preferred_unit = tool_context.state.get("user_preference_temperature_unit", "Celsius") # Default to Celsius
         preferred_city = tool_context.state.get("user_preference_city", "Tunis") # Default city preference
         preferred_language = tool_context.state.get("user_preference_language", "English") # Default language preference
+        messages = catalog(preferred_language)
         
         # Check if we should use the preferred city
         original_city = city
@@ -174,23 +153,16 @@ def get_weather_forecast(city: str, tool_context: ToolContext, days: int = 3) ->
             print(f"--- Tool: Using preferred city: '{city}' (was '{original_city}') ---")
         else:
             print(f"--- Tool: Using specified city: '{city}' ---")
+        hot_cities.record(city)
         
         # Validate days parameter
         days = max(1, min(5, days))  # Ensure days is between 1 and 5
         
         # First, get city coordinates by city name
-        geo_url = f"http://api.openweathermap.org/geo/1.0/direct?q={city}&limit=1&appid={api_key}"
-        geo_response = requests.get(geo_url)
-        geo_data = geo_response.json()
+        geo_data = await geocode_city(city)
         
         if not geo_data:
-            if preferred_language == "Arabic":
-                error_msg = f"لم يتم العثور على المدينة '{city}'."
-            elif preferred_language == "French":
-                error_msg = f"Ville '{city}' introuvable."
-            else:  # Default to English
-                error_msg = f"City '{city}' not found."
-                
+            error_msg = messages.message("city_not_found", city=city)
             print(f"--- Tool: {error_msg} ---")
             return {
                 "status": "error",
@@ -202,155 +174,38 @@ def get_weather_forecast(city: str, tool_context: ToolContext, days: int = 3) ->
         lon = geo_data[0]["lon"]
         city_name = geo_data[0].get("name", city)
             
-        # Make API request to OpenWeatherMap forecast endpoint
-        forecast_url = f"http://api.openweathermap.org/data/2.5/forecast?lat={lat}&lon={lon}&appid={api_key}&units=metric"
-        response = requests.get(forecast_url)
-        data = response.json()
+        # Forecast is shared with the other weather tool through the cache; old data if OWM is down
+        data, age = await get_forecast_with_age(lat, lon)
         
-        # Check if API request was successful
-        if response.status_code == 200:
-            # Extract forecast information
-            forecast_list = data["list"]
-            
-            # OpenWeatherMap provides forecast in 3-hour intervals
-            # We'll group by day and pick the mid-day forecast for each day
-            
-            # Get current date and initialize variables
-            forecast_days = {}
-            current_date = datetime.datetime.now().date()
-            
-            # Group forecasts by day
-            for forecast in forecast_list:
-                # Convert timestamp to datetime
-                timestamp = forecast["dt"]
-                forecast_date = datetime.datetime.fromtimestamp(timestamp).date()
-                forecast_hour = datetime.datetime.fromtimestamp(timestamp).hour
-                
-                # Skip current day and focus on future days
-                if forecast_date <= current_date:
-                    continue
-                
-                # Initialize day entry if not exists
-                if forecast_date not in forecast_days:
-                    forecast_days[forecast_date] = []
-                
-                # Add this forecast to the day's list
-                forecast_temp = forecast["main"]["temp"]
-                forecast_weather = forecast["weather"][0]["description"]
-                forecast_days[forecast_date].append({
-                    "hour": forecast_hour,
-                    "temp": forecast_temp,
-                    "weather": forecast_weather
-                })
-            
-            # Sort dates and limit to requested number of days
-            sorted_dates = sorted(forecast_days.keys())[:days]
-            
-            # Format the forecast results
-            daily_forecasts = []
-            for date in sorted_dates:
-                # Get forecasts for this day
-                day_forecasts = forecast_days[date]
-                
-                # Try to get mid-day forecast (around noon) or average if not available
-                midday_forecast = None
-                for fc in day_forecasts:
-                    if 10 <= fc["hour"] <= 14:
-                        midday_forecast = fc
-                        break
-                
-                # If no midday forecast, use the first one
-                if not midday_forecast and day_forecasts:
-                    midday_forecast = day_forecasts[0]
-                
-                if midday_forecast:
-                    # Format date based on preferred language
-                    if preferred_language == "Arabic":
-                        # Note: Arabic date formatting would need more extensive localization
-                        # For now, using a simplified approach
-                        date_str = date.strftime("%Y-%m-%d")  # e.g., "2023-07-10"
-                    elif preferred_language == "French":
-                        # French date format (for example, "lundi 10 juillet")
-                        locale = 'fr_FR'
-                        try:
-                            import locale as locale_module
-                            locale_module.setlocale(locale_module.LC_TIME, locale)
-                            date_str = date.strftime("%A %d %B")
-                            locale_module.setlocale(locale_module.LC_TIME, '')  # Reset locale
-                        except:
-                            # If locale setting fails, fallback
-                            date_str = date.strftime("%d/%m/%Y")
-                    else:  # Default to English
-                        date_str = date.strftime("%A, %B %d")  # e.g., "Monday, July 10"
-                    
-                    # Format temperature
-                    if preferred_unit == "Fahrenheit":
-                        temp_celsius = midday_forecast['temp']
-                        temp_value = (temp_celsius * 9/5) + 32
-                        temp_formatted = f"{temp_value:.1f}°F"
-                    else:  # Default to Celsius
-                        temp_formatted = f"{midday_forecast['temp']:.1f}°C"
-                    
-                    # Add to results
-                    daily_forecasts.append({
-                        "date": date_str,
-                        "temperature": temp_formatted,
-                        "weather": midday_forecast["weather"]
-                    })
-            
-            # Prepare the final report in the preferred language
-            if daily_forecasts:
-                if preferred_language == "Arabic":
-                    forecast_report = f"توقعات الطقس لـ {city_name} للأيام الـ {len(daily_forecasts)} القادمة:\n\n"
-                    for fc in daily_forecasts:
-                        forecast_report += f"• {fc['date']}: {fc['weather']} مع درجة حرارة حوالي {fc['temperature']}\n"
-                elif preferred_language == "French":
-                    forecast_report = f"Prévisions météo pour {city_name} pour les {len(daily_forecasts)} prochains jours:\n\n"
-                    for fc in daily_forecasts:
-                        forecast_report += f"• {fc['date']}: {fc['weather']} avec une température d'environ {fc['temperature']}\n"
-                else:  # Default to English
-                    forecast_report = f"Weather forecast for {city_name} for the next {len(daily_forecasts)} days:\n\n"
-                    for fc in daily_forecasts:
-                        forecast_report += f"• {fc['date']}: {fc['weather']} with temperature around {fc['temperature']}\n"
-                
-                return {
-                    "status": "success",
-                    "report": forecast_report,
-                    "daily_forecasts": daily_forecasts
-                }
-            else:
-                if preferred_language == "Arabic":
-                    error_msg = f"لا تتوفر بيانات توقعات للأيام القادمة في {city_name}."
-                elif preferred_language == "French":
-                    error_msg = f"Aucune donnée de prévision disponible pour les prochains jours à {city_name}."
-                else:  # Default to English
-                    error_msg = f"No forecast data available for upcoming days in {city_name}."
-                
-                return {
-                    "status": "error",
-                    "error_message": error_msg
-                }
+        # OpenWeatherMap provides forecast in 3-hour intervals; summarize each
+        # upcoming day (in the city's local time) by its range, mean, condition and rain chance
+        daily_forecasts = format_daily_forecasts(daily_statistics(data), days, messages, preferred_unit)
+        
+        # Prepare the final report in the preferred language
+        if daily_forecasts:
+            result = {
+                "status": "success",
+                "report": forecast_report(messages, city_name, daily_forecasts),
+                "daily_forecasts": daily_forecasts
+            }
+            if age is not None:
+                result["report"] += data_age_note(messages, age)
+                result["data_age_seconds"] = round(age)
+            return result
         else:
-            if preferred_language == "Arabic":
-                error_msg = f"توقعات الطقس لـ '{city}' غير متوفرة. خطأ في API: {data.get('message', 'خطأ غير معروف')}"
-            elif preferred_language == "French":
-                error_msg = f"Les prévisions météo pour '{city}' ne sont pas disponibles. Erreur API: {data.get('message', 'Erreur inconnue')}"
-            else:  # Default to English
-                error_msg = f"Weather forecast for '{city}' is not available. API error: {data.get('message', 'Unknown error')}"
-                
-            print(f"--- Tool: API error: {error_msg} ---")
             return {
                 "status": "error",
-                "error_message": error_msg,
+                "error_message": messages.message("forecast_empty", city=city_name)
             }
+    except OWMError as e:
+        error_msg = api_error_message(messages, "forecast_api_error", city, e)
+        print(f"--- Tool: API error: {error_msg} ---")
+        return {
+            "status": "error",
+            "error_message": error_msg,
+        }
     except Exception as e:
-        if preferred_language == "Arabic":
-            error_msg = f"خطأ في استرجاع التوقعات لـ '{city}': {str(e)}"
-        elif preferred_language == "French":
-            error_msg = f"Erreur lors de la récupération des prévisions pour '{city}': {str(e)}"
-        else:  # Default to English
-            error_msg = f"Error retrieving forecast for '{city}': {str(e)}"
-            
+        error_msg = messages.message("forecast_error", city=city, error=str(e))
         print(f"--- Tool: Exception: {error_msg} ---")
         return {
             "status": "error",
@@ -358,7 +213,85 @@ def get_weather_forecast(city: str, tool_context: ToolContext, days: int = 3) ->
         }
 
 
-def get_current_time(city: str, tool_context: ToolContext) -> dict:
+# get_weather_multi_city compares at most this many cities per call
+MULTI_CITY_MAX_CITIES = 10
+
+async def _fetch_city(city: str, messages) -> Tuple[Optional[CompactForecast], Optional[float], Optional[dict]]:
+    """Fetches one city's forecast for get_weather_multi_city: (forecast, age, None), or (None, None, error entry).
+
+    The age is None unless the forecast is old data served because OpenWeatherMap is unavailable.
+    """
+    try:
+        geo_data = await geocode_city(city)
+        if not geo_data:
+            return None, None, {"city": city, "status": "error",
+                                "error_message": messages.message("city_not_found", city=city)}
+        data, age = await get_forecast_with_age(geo_data[0]["lat"], geo_data[0]["lon"])
+        return data, age, None
+    except OWMError as e:
+        error_msg = api_error_message(messages, "weather_api_error", city, e)
+    except Exception as e:
+        error_msg = messages.message("weather_error", city=city, error=str(e))
+    print(f"--- Tool: {error_msg} ---")
+    return None, None, {"city": city, "status": "error", "error_message": error_msg}
+
+async def get_weather_multi_city(cities: List[str], tool_context: ToolContext, days: int = 0) -> dict:
+    """Retrieves and compares the weather in several cities with one call.
+
+    All cities are geocoded and fetched concurrently, so a comparison costs
+    one upstream round trip instead of one per city, and their daily
+    statistics are computed together in one vectorized pass.
+
+    Args:
+        cities (list[str]): The cities to compare, e.g. ["Paris", "London", "Rome"].
+        tool_context (ToolContext): Context object providing access to session state.
+        days (int, optional): Also include the forecast for this many upcoming days (0-5). Defaults to 0.
+
+    Returns:
+        dict: status, comparison report and per-city details, or error msg.
+    """
+    print(f"--- Tool: get_weather_multi_city called for cities={cities}, days={days} ---")
+
+    preferred_unit = tool_context.state.get("user_preference_temperature_unit", "Celsius") # Default to Celsius
+    preferred_city = tool_context.state.get("user_preference_city", "Tunis") # Default city preference
+    preferred_language = tool_context.state.get("user_preference_language", "English") # Default language preference
+    messages = catalog(preferred_language)
+
+    # "default"/"preferred" (or no cities at all) mean the preferred city; the same city named twice is fetched once
+    names = {}
+    for city in cities or [preferred_city]:
+        if not city or city.lower() in ("default", "preferred"):
+            city = preferred_city
+        names.setdefault(normalize_city(city), city)
+    selected = list(names.values())[:MULTI_CITY_MAX_CITIES]
+    truncated_to = MULTI_CITY_MAX_CITIES if len(names) > MULTI_CITY_MAX_CITIES else 0
+    for city in selected:
+        hot_cities.record(city)
+
+    days = max(0, min(5, days))
+    fetched = await asyncio.gather(*(_fetch_city(city, messages) for city in selected))
+    forecasts = [data for data, _, _ in fetched if data is not None]
+    daily = iter(daily_statistics_batch(forecasts) if days else [None] * len(forecasts))
+    now = time.time()
+    summaries = [
+        error if data is None else city_summary(data, messages, preferred_unit, next(daily), days,
+                                                None if age is None else now)
+        for data, age, error in fetched
+    ]
+
+    report = comparison_report(messages, summaries, truncated_to)
+    ages = [age for _, age, _ in fetched if age is not None]
+    if ages:
+        report += data_age_note(messages, max(ages))
+    if not any(summary["status"] == "success" for summary in summaries):
+        return {"status": "error", "error_message": report}
+
+    tool_context.state["last_city_checked"] = next(s["city"] for s in summaries if s["status"] == "success")
+    print(f"--- Tool: Compared {len(summaries)} cities in {preferred_language} and {preferred_unit} ---")
+    return {"status": "success", "report": report, "cities": summaries}
+
+
+async def get_current_time(city: str, tool_context: ToolContext) -> dict:
     """Returns the current time in a specified city.
 
     Args:
@@ -370,6 +303,7 @@ def get_current_time(city: str, tool_context: ToolContext) -> dict:
     """
     preferred_city = tool_context.state.get("user_preference_city", "Tunis") # Default city preference
     preferred_language = tool_context.state.get("user_preference_language", "English") # Default language preference
+    messages = catalog(preferred_language)
     
     # Check if we should use the preferred city
     original_city = city
@@ -379,150 +313,29 @@ def get_current_time(city: str, tool_context: ToolContext) -> dict:
     else:
         print(f"--- Tool: Using specified city for time: '{city}' ---")
     
-    # Dictionary mapping cities to their timezone identifiers
-    city_to_timezone = {
-        "new york": "America/New_York",
-        "san francisco": "America/Los_Angeles",
-        "los angeles": "America/Los_Angeles",
-        "chicago": "America/Chicago",
-        "houston": "America/Chicago",
-        "phoenix": "America/Phoenix",
-        "philadelphia": "America/New_York",
-        "san antonio": "America/Chicago",
-        "san diego": "America/Los_Angeles",
-        "dallas": "America/Chicago",
-        "san jose": "America/Los_Angeles",
-        "austin": "America/Chicago",
-        "london": "Europe/London",
-        "paris": "Europe/Paris",
-        "berlin": "Europe/Berlin",
-        "rome": "Europe/Rome",
-        "madrid": "Europe/Madrid",
-        "amsterdam": "Europe/Amsterdam",
-        "brussels": "Europe/Brussels",
-        "vienna": "Europe/Vienna",
-        "tokyo": "Asia/Tokyo",
-        "beijing": "Asia/Shanghai",
-        "shanghai": "Asia/Shanghai",
-        "hong kong": "Asia/Hong_Kong",
-        "singapore": "Asia/Singapore",
-        "sydney": "Australia/Sydney",
-        "melbourne": "Australia/Melbourne",
-        "auckland": "Pacific/Auckland",
-        "toronto": "America/Toronto",
-        "vancouver": "America/Vancouver",
-        "montreal": "America/Montreal",
-        "mexico city": "America/Mexico_City",
-        "sao paulo": "America/Sao_Paulo",
-        "rio de janeiro": "America/Sao_Paulo",
-        "buenos aires": "America/Argentina/Buenos_Aires",
-        "lagos": "Africa/Lagos",
-        "cairo": "Africa/Cairo",
-        "johannesburg": "Africa/Johannesburg",
-        "nairobi": "Africa/Nairobi",
-        "dubai": "Asia/Dubai",
-        "new delhi": "Asia/Kolkata",
-        "mumbai": "Asia/Kolkata",
-        "bangkok": "Asia/Bangkok",
-        "jakarta": "Asia/Jakarta",
-        "istanbul": "Europe/Istanbul",
-        "seoul": "Asia/Seoul",
-        "Tunis": "Africa/Tunis",
-        "monastir": "Africa/Tunis",
-        "Beb El Jazira": "Africa/Tunis",
-        "Abu Dhabi": "Asia/Dubai",
-        "Abuja": "Africa/Lagos",
-        "Accra": "Africa/Accra",
-        "Addis Ababa": "Africa/Addis_Ababa",
-        "Algiers": "Africa/Algiers",
-        
-    }
+    try:
+        match = await resolve_timezone(city)
+    except OWMError as e:
+        print(f"--- Tool: Timezone fallback lookup failed for '{city}': {e.message} ---")
+        match = None
 
-    city_lower = city.lower()
-    
-    # If we're using the preferred city, prioritize exact match first
-    if city == preferred_city:
-        # Direct lookup for preferred city with exact case match
-        if city in city_to_timezone:
-            tz_identifier = city_to_timezone[city]
-            print(f"--- Tool: Direct match for preferred city: '{city}' ---")
-            exact_match = city
-        else:
-            # Try case insensitive match for preferred city
-            for city_name in city_to_timezone.keys():
-                if city_name.lower() == city_lower:
-                    tz_identifier = city_to_timezone[city_name]
-                    exact_match = city_name
-                    print(f"--- Tool: Case-insensitive match for preferred city: '{city}' → '{city_name}' ---")
-                    break
-            else:
-                exact_match = None
-    else:
-        # First check for exact match (case-insensitive)
-        exact_match = None
-        for city_name, tz in city_to_timezone.items():
-            if city_name.lower() == city_lower:
-                exact_match = city_name
-                tz_identifier = tz
-                break
-    
-    if exact_match:
-        city = exact_match  # Use the exact matched city name
-    else:
-        # Try to find a partial match
-        matches = [c for c in city_to_timezone.keys() if city_lower in c.lower() or c.lower() in city_lower]
-        if matches:
-            # Use the first match if any
-            tz_identifier = city_to_timezone[matches[0]]
-            city = matches[0]  # Use the matched city name as is
-        else:
-            if preferred_language == "Arabic":
-                error_msg = f"عذراً، ليس لدي معلومات عن المنطقة الزمنية لـ {city}. حاول استخدام مدينة رئيسية."
-            elif preferred_language == "French":
-                error_msg = f"Désolé, je n'ai pas d'informations sur le fuseau horaire pour {city}. Essayez une ville principale."
-            else:  # Default to English
-                error_msg = f"Sorry, I don't have timezone information for {city}. Try a major city."
-                
-            return {
-                "status": "error",
-                "error_message": error_msg,
-            }
+    if match is None:
+        return {
+            "status": "error",
+            "error_message": messages.message("timezone_unknown", city=city),
+        }
+
+    print(f"--- Tool: Resolved '{city}' to '{match.name}' ({match.method}) ---")
+    city = match.name
 
     try:
-        tz = ZoneInfo(tz_identifier)
-        now = datetime.datetime.now(tz)
-        
-        # Format time based on preferred language
-        if preferred_language == "Arabic":
-            # Simplified Arabic time format
-            formatted_time = now.strftime("%Y-%m-%d %H:%M:%S %Z%z")
-            report = f'الوقت الحالي في {city.title()} هو {formatted_time}'
-        elif preferred_language == "French":
-            # French date format
-            try:
-                import locale as locale_module
-                locale_module.setlocale(locale_module.LC_TIME, 'fr_FR')
-                formatted_time = now.strftime("%d %B %Y %H:%M:%S %Z%z")
-                locale_module.setlocale(locale_module.LC_TIME, '')  # Reset locale
-            except:
-                formatted_time = now.strftime("%d/%m/%Y %H:%M:%S %Z%z")
-            report = f'L\'heure actuelle à {city.title()} est {formatted_time}'
-        else:  # Default to English
-            formatted_time = now.strftime("%Y-%m-%d %H:%M:%S %Z%z")
-            report = f'The current time in {city.title()} is {formatted_time}'
-            
+        now = datetime.datetime.now(match.tzinfo)
+        report = messages.message("time_report", city=city, time=messages.timestamp(now))
         return {"status": "success", "report": report}
     except Exception as e:
-        if preferred_language == "Arabic":
-            error_msg = f"خطأ في استرجاع الوقت لـ '{city}': {str(e)}"
-        elif preferred_language == "French":
-            error_msg = f"Erreur lors de la récupération de l'heure pour '{city}': {str(e)}"
-        else:  # Default to English
-            error_msg = f"Error retrieving time for '{city}': {str(e)}"
-            
         return {
             "status": "error",
-            "error_message": error_msg,
+            "error_message": messages.message("time_error", city=city, error=str(e)),
         }
 
 def say_hello(name: str = "There", tool_context: ToolContext = None) -> str:
@@ -540,12 +353,7 @@ def say_hello(name: str = "There", tool_context: ToolContext = None) -> str:
     if tool_context:
         preferred_language = tool_context.state.get("user_preference_language", "English")
     
-    if preferred_language == "Arabic":
-        return f"مرحباً، {name}!"
-    elif preferred_language == "French":
-        return f"Bonjour, {name}!"
-    else:  # Default to English
-        return f"Hello, {name}!"
+    return catalog(preferred_language).message("hello", name=name)
 
 def say_goodbye(tool_context: ToolContext = None) -> str:
     """Provides a simple farewell message to conclude the conversation.
@@ -561,40 +369,134 @@ def say_goodbye(tool_context: ToolContext = None) -> str:
     if tool_context:
         preferred_language = tool_context.state.get("user_preference_language", "English")
     
-    if preferred_language == "Arabic":
-        return "مع السلامة! أتمنى لك يوماً رائعاً."
-    elif preferred_language == "French":
-        return "Au revoir ! Passez une excellente journée."
-    else:  # Default to English
-        return "Goodbye! Have a great day."
+    return catalog(preferred_language).message("goodbye")
+
+
+""" CALLBACKS """
+
+# Agents whose successful tool reports are sent to the user as-is, e.g.
+# DIRECT_TOOL_ANSWER_AGENTS="weather_agent_v2,time_agent,forecast_agent"
+DIRECT_TOOL_ANSWER_AGENTS = {
+    name.strip() for name in os.environ.get("DIRECT_TOOL_ANSWER_AGENTS", "").split(",") if name.strip()
+}
+
+def direct_tool_answer(callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+    """Skips the model call that would only rephrase a tool's report.
+
+    The weather and time tools already return a localized, user-ready
+    'report'. When the request about to be sent is just the tool results
+    and every one of them succeeded, their reports become the final answer
+    and the model is not called.
+
+    Args:
+        callback_context (CallbackContext): Context of the agent making the call.
+        llm_request (LlmRequest): The request about to be sent to the model.
+
+    Returns:
+        LlmResponse: The reports as the model's answer, or None to call the model.
+    """
+    if not llm_request.contents:
+        return None
+    last_content = llm_request.contents[-1]
+    if not last_content.parts or not all(part.function_response for part in last_content.parts):
+        return None
+
+    reports = []
+    for part in last_content.parts:
+        response = part.function_response.response or {}
+        if response.get("status") != "success" or not response.get("report"):
+            return None
+        reports.append(response["report"])
+
+    print(f"--- Callback: {callback_context.agent_name} answering directly from tool report ---")
+    LLM_CALLS_SKIPPED.labels(callback_context.agent_name).inc()
+    return LlmResponse(content=types.Content(role="model", parts=[types.Part(text="\n\n".join(reports))]))
+
+def direct_tool_answer_for(agent_name: str):
+    """Returns the direct_tool_answer callback if it is enabled for the agent."""
+    return direct_tool_answer if agent_name in DIRECT_TOOL_ANSWER_AGENTS else None
+
+# Model and tool calls in progress: (start time, trace span). A call that
+# raises never reaches its "end" callback, so the oldest entries are dropped
+# past this size.
+MAX_PENDING_TIMINGS = 4096
+_model_calls_started: Dict[tuple, tuple] = {}
+_tool_calls_started: Dict[str, tuple] = {}
+
+def _remember_start(pending: Dict, key, span) -> None:
+    pending[key] = (time.perf_counter(), span)
+    if len(pending) > MAX_PENDING_TIMINGS:
+        del pending[next(iter(pending))]
+
+def record_model_start(callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+    """Notes the start of a model call for agent_llm_call_duration_seconds and the turn's trace."""
+    span = start_span("llm_call", agent=callback_context.agent_name, model=llm_request.model,
+                      contents=len(llm_request.contents))
+    _remember_start(_model_calls_started, (callback_context.invocation_id, callback_context.agent_name), span)
+    return None
+
+def record_model_end(callback_context: CallbackContext, llm_response: LlmResponse) -> Optional[LlmResponse]:
+    """Observes the model call latency once the complete (non-partial) response arrives."""
+    if llm_response.partial:
+        return None
+    started, span = _model_calls_started.pop((callback_context.invocation_id, callback_context.agent_name), (None, None))
+    if started is not None:
+        LLM_CALL_SECONDS.labels(callback_context.agent_name).observe(time.perf_counter() - started)
+    if span is not None:
+        if llm_response.content and llm_response.content.parts:
+            calls = [part.function_call.name for part in llm_response.content.parts if part.function_call]
+            span.set_attribute("function_calls", calls or None)
+        span.end(error=llm_response.error_message)
+    return None
+
+def model_callbacks(agent_name: str) -> list:
+    """before_model_callback chain for an agent: the direct answer first (when
+    enabled), so a skipped model call is not timed."""
+    return [callback for callback in (direct_tool_answer_for(agent_name), record_model_start) if callback]
+
+def record_tool_start(tool: BaseTool, args: Dict[str, Any], tool_context: ToolContext) -> Optional[dict]:
+    """Notes the start of a tool call; upstream requests made by the tool nest under its span."""
+    span = start_span("tool_call", activate=True, tool=tool.name, agent=tool_context.agent_name, args=args)
+    _remember_start(_tool_calls_started, tool_context.function_call_id, span)
+    return None
+
+def record_tool_end(tool: BaseTool, args: Dict[str, Any], tool_context: ToolContext, tool_response: Any) -> Optional[dict]:
+    """Observes the tool call latency and counts it by the 'status' the tool returned."""
+    started, span = _tool_calls_started.pop(tool_context.function_call_id, (None, None))
+    if started is not None:
+        TOOL_CALL_SECONDS.labels(tool.name).observe(time.perf_counter() - started)
+    status = tool_response.get("status", "success") if isinstance(tool_response, dict) else "success"
+    TOOL_CALLS.labels(tool.name, status).inc()
+    if span is not None:
+        span.set_attribute("status", status)
+        span.end(error=tool_response.get("error_message") if status == "error" else None)
+    return None
 
 
 """ AGENTS """
 
-greeting_agent = Agent(
-    name="greeting_agent",
-    model=os.environ.get("MODEL_GEMINI_2_0_FLASH"),
-    description=("Handles simple greetings and hellos using the 'say_hello' tool."), 
-    instruction=(
-        "You are the Greeting Agent. Your ONLY task is to provide a friendly greeting to the user. "
-        "Use the 'say_hello' tool to generate the greeting. "
-        "If the user provides their name, make sure to pass it to the tool. "
-        "ALWAYS pass the tool_context to the say_hello function to ensure the greeting is in the right language. "
-        "Do not engage in any other conversation or tasks."
-        "IMPORTANT: Always check the user's preferred language in the session state (user_preference_language). "
-        "You must respond in the user's preferred language regardless of what language they typed in. "
-        "If the preferred language is 'Arabic', respond in Arabic. "
-        "If the preferred language is 'French', respond in French. "
-        "If the preferred language is 'English' or not specified, respond in English."
-    ),
-    tools=[say_hello],
+# Shared by the root agent and by the sub-agents that the intent router can reach directly
+CONTENT_MODERATION_RULES = """
+                    # CONTENT MODERATION RULES 
+                    # 1. Reject any request containing harmful, offensive, or inappropriate language. Simply respond with "I cannot process requests containing inappropriate language."
+                    # 2. Refuse to provide weather information for these Israeli cities: Tel Aviv, Haifa, Eilat, Netanya, Herzliya, Ashdod, Beersheba, and Rishon LeZion.
+                    # 3. You may provide weather for Jerusalem and any Palestinian cities like Ramallah, Gaza, Bethlehem, Nablus, and Hebron.
+"""
+
+GREETING_AGENT_INSTRUCTION = (
+    "You are the Greeting Agent. Your ONLY task is to provide a friendly greeting to the user. "
+    "Use the 'say_hello' tool to generate the greeting. "
+    "If the user provides their name, make sure to pass it to the tool. "
+    "ALWAYS pass the tool_context to the say_hello function to ensure the greeting is in the right language. "
+    "Do not engage in any other conversation or tasks."
+    "IMPORTANT: Always check the user's preferred language in the session state (user_preference_language). "
+    "You must respond in the user's preferred language regardless of what language they typed in. "
+    "If the preferred language is 'Arabic', respond in Arabic. "
+    "If the preferred language is 'French', respond in French. "
+    "If the preferred language is 'English' or not specified, respond in English."
 )
 
-time_agent = Agent(
-    name="time_agent",
-    model=os.environ.get("MODEL_GEMINI_2_0_FLASH"),
-    description="Provides current time information for cities around the world.",
-    instruction="""You are the Time Agent. Your primary responsibility is to provide accurate current time information.
+TIME_AGENT_INSTRUCTION = """You are the Time Agent. Your primary responsibility is to provide accurate current time information.
                 Use the 'get_current_time' tool to fetch the current time for specific cities.
                 The tool will format the time based on user preference stored in state.
                 The tool will format the default city based on user preference stored in state.
@@ -624,15 +526,9 @@ time_agent = Agent(
                 - "Tell me the current time in Paris"
                 - "What's the time in New York right now?"
                 - "What time is it right now?" (use default city)
-                """,
-    tools=[get_current_time],
-)
+                """ + CONTENT_MODERATION_RULES
 
-forecast_agent = Agent(
-    name="forecast_agent",
-    model=os.environ.get("MODEL_GEMINI_2_0_FLASH"),
-    description="Provides weather forecasts for upcoming days using OpenWeatherMap API.",
-    instruction="""You are the Weather Forecast Agent. Your primary responsibility is to provide weather forecasts for the upcoming days.
+FORECAST_AGENT_INSTRUCTION = """You are the Weather Forecast Agent. Your primary responsibility is to provide weather forecasts for the upcoming days.
                 Use the 'get_weather_forecast' tool to fetch forecast data for specific cities.
                 The tool will format the temperature based on user preference stored in state.
                 The tool will format the default city based on user preference stored in state.
@@ -660,38 +556,26 @@ forecast_agent = Agent(
                 - "How will the weather be in Tokyo for the next 5 days?"
                 - "Will it rain in New York tomorrow?"
                 - "What's the forecast for the next few days?" (use default city)
-                """,
-    tools=[get_weather_forecast],
-)
-
-farewell_agent = Agent(
-    # Can use the same or a different model
-    model=os.environ.get("MODEL_GEMINI_2_0_FLASH"), # Using Gemini model directly
-    name="farewell_agent",
-    instruction="You are the Farewell Agent. Your ONLY task is to provide a polite goodbye message. "
-                "Use the 'say_goodbye' tool when the user indicates they are leaving or ending the conversation "
-                "(e.g., using words like 'bye', 'goodbye', 'thanks bye', 'see you'). "
-                "ALWAYS pass the tool_context to the say_goodbye function to ensure the farewell is in the right language. "
-                "Do not perform any other actions."
-                "IMPORTANT: Always check the user's preferred language in the session state (user_preference_language). "
-                "You must respond in the user's preferred language regardless of what language they typed in. "
-                "If the preferred language is 'Arabic', respond in Arabic. "
-                "If the preferred language is 'French', respond in French. "
-                "If the preferred language is 'English' or not specified, respond in English.",
-    description="Handles simple farewells and goodbyes using the 'say_goodbye' tool.", # Crucial for delegation
-    tools=[say_goodbye],
+                """ + CONTENT_MODERATION_RULES
+
+FAREWELL_AGENT_INSTRUCTION = (
+    "You are the Farewell Agent. Your ONLY task is to provide a polite goodbye message. "
+    "Use the 'say_goodbye' tool when the user indicates they are leaving or ending the conversation "
+    "(e.g., using words like 'bye', 'goodbye', 'thanks bye', 'see you'). "
+    "ALWAYS pass the tool_context to the say_goodbye function to ensure the farewell is in the right language. "
+    "Do not perform any other actions."
+    "IMPORTANT: Always check the user's preferred language in the session state (user_preference_language). "
+    "You must respond in the user's preferred language regardless of what language they typed in. "
+    "If the preferred language is 'Arabic', respond in Arabic. "
+    "If the preferred language is 'French', respond in French. "
+    "If the preferred language is 'English' or not specified, respond in English."
 )
 
-
-if greeting_agent and farewell_agent and 'get_weather_stateful' in globals():
-    root_agent_model = os.environ.get("MODEL_GEMINI_2_0_FLASH")
-
-    root_agent = Agent(
-        name="weather_agent_v2", # Give it a new version name
-        model=root_agent_model,
-        description="Main agent: Provides weather (state-aware unit), delegates greetings/farewells, saves report to state.",
-        instruction="""You are the main Weather Agent coordinating a team. Your primary responsibility is to provide weather information. 
+ROOT_AGENT_INSTRUCTION = """You are the main Weather Agent coordinating a team. Your primary responsibility is to provide weather information. 
                     Use the 'get_weather_stateful' tool ONLY for specific weather requests (e.g., 'weather in London'). 
+                    When the user asks about the weather in SEVERAL cities (e.g., 'Compare the weather in Paris, London and Rome'),
+                    call 'get_weather_multi_city' ONCE with all the cities instead of calling 'get_weather_stateful' per city.
+                    Pass days (1-5) when they also want the coming days for those cities.
                     The tool will format the temperature based on user preference stored in state.
                     The tool will format the default city based on user preference stored in state.
                     The tool will format the time based on user preference stored in state.
@@ -706,10 +590,7 @@ if greeting_agent and farewell_agent and 'get_weather_stateful' in globals():
                     If the preferred language is 'French', respond in French. 
                     If the preferred language is 'English' or not specified, respond in English.
 
-                    # CONTENT MODERATION RULES 
-                    # 1. Reject any request containing harmful, offensive, or inappropriate language. Simply respond with "I cannot process requests containing inappropriate language."
-                    # 2. Refuse to provide weather information for these Israeli cities: Tel Aviv, Haifa, Eilat, Netanya, Herzliya, Ashdod, Beersheba, and Rishon LeZion.
-                    # 3. You may provide weather for Jerusalem and any Palestinian cities like Ramallah, Gaza, Bethlehem, Nablus, and Hebron.
+                    """ + CONTENT_MODERATION_RULES + """
                     
                     MESSAGE HANDLING PRIORITIES:
                     1. If a message contains both a greeting AND a weather request, prioritize the weather request and do NOT delegate to the greeting agent.
@@ -724,13 +605,105 @@ if greeting_agent and farewell_agent and 'get_weather_stateful' in globals():
                     3. 'forecast_agent': Handles weather forecast requests for upcoming days. Delegate to it when users ask about future weather.
                     4. 'time_agent': Handles time-related questions for different cities. Delegate to it when users ask about current time.
                     
-                    Analyze the user's query carefully to determine its primary intent.""",
-        tools=[get_weather_stateful], # Now using the stateful version of the weather tool
-        sub_agents=[greeting_agent, farewell_agent, forecast_agent, time_agent],
-        output_key="last_weather_report"
+                    Analyze the user's query carefully to determine its primary intent."""
+
+ROOT_AGENT_NAME = "weather_agent_v2"
+
+# The agent team is built on first use (see build_agents), not at import
+_agents: Dict[str, Agent] = {}
+_agents_lock = threading.Lock()
+
+
+FAKE_LLM_MODULE = "loadtest.fake_llm"
+FAKE_LLM_MODEL = "fake-llm"
+
+
+def agent_model():
+    """The model every agent uses: Gemini, or with FAKE_LLM_ENABLED=true the load tests' deterministic model."""
+    if os.environ.get("FAKE_LLM_ENABLED", "false").lower() in ("1", "true", "yes"):
+        # The model lives with the load tests and registers itself with ADK when imported
+        importlib.import_module(FAKE_LLM_MODULE)
+        return LLMRegistry.new_llm(FAKE_LLM_MODEL)
+    return os.environ.get("MODEL_GEMINI_2_0_FLASH")
+
+
+def _agent(name: str, model, description: str, instruction: str, tools: list, **kwargs) -> Agent:
+    return Agent(
+        name=name,
+        model=model,
+        description=description,
+        instruction=instruction,
+        tools=tools,
+        before_model_callback=model_callbacks(name),
+        after_model_callback=record_model_end,
+        before_tool_callback=record_tool_start,
+        after_tool_callback=record_tool_end,
+        **kwargs,
     )
 
 
+def build_agents() -> Dict[str, Agent]:
+    """Builds the agent team on the first call and returns it by agent name.
+
+    Later calls (and the module attributes `root_agent`, `greeting_agent`,
+    `time_agent`, `forecast_agent` and `farewell_agent`) return the same
+    objects, so importing this module stays cheap and the server decides
+    when to pay for the team: during its warm-up, or on the first turn.
+
+    Returns:
+        dict: Agent name to agent, the root agent under ROOT_AGENT_NAME.
+    """
+    if _agents:
+        return _agents
+    with _agents_lock:
+        if _agents:
+            return _agents
+        model = agent_model()
+        greeting_agent = _agent(
+            "greeting_agent", model, "Handles simple greetings and hellos using the 'say_hello' tool.",
+            GREETING_AGENT_INSTRUCTION, [say_hello],
+        )
+        time_agent = _agent(
+            "time_agent", model, "Provides current time information for cities around the world.",
+            TIME_AGENT_INSTRUCTION, [get_current_time],
+        )
+        forecast_agent = _agent(
+            "forecast_agent", model, "Provides weather forecasts for upcoming days using OpenWeatherMap API.",
+            FORECAST_AGENT_INSTRUCTION, [get_weather_forecast],
+        )
+        farewell_agent = _agent(
+            "farewell_agent", model, "Handles simple farewells and goodbyes using the 'say_goodbye' tool.",
+            FAREWELL_AGENT_INSTRUCTION, [say_goodbye],
+        )
+        root_agent = _agent(
+            ROOT_AGENT_NAME, model,
+            "Main agent: Provides weather (state-aware unit), delegates greetings/farewells, saves report to state.",
+            ROOT_AGENT_INSTRUCTION,
+            [get_weather_stateful, get_weather_multi_city],
+            sub_agents=[greeting_agent, farewell_agent, forecast_agent, time_agent],
+            output_key="last_weather_report",
+        )
+        _agents.update((agent.name, agent) for agent in
+                       (root_agent, greeting_agent, time_agent, forecast_agent, farewell_agent))
+    return _agents
+
+
+_LAZY_AGENTS = {
+    "root_agent": ROOT_AGENT_NAME,
+    "greeting_agent": "greeting_agent",
+    "time_agent": "time_agent",
+    "forecast_agent": "forecast_agent",
+    "farewell_agent": "farewell_agent",
+}
+
+
+def __getattr__(name: str):
+    # PEP 562: `agent.root_agent` builds the team on first access
+    if name in _LAZY_AGENTS:
+        return build_agents()[_LAZY_AGENTS[name]]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 """Interaction with the Agent Team"""
 
 async def call_agent_async(query: str, runner, user_id, session_id):
@@ -769,48 +742,42 @@ async def call_agent_async(query: str, runner, user_id, session_id):
     print(f"DEBUG: Processed {event_count} events total")
     print(f"<<< Agent Response: {final_response_text}")
 
-if 'root_agent' in globals() and root_agent:
-    async def run_stateful_conversation():
-        print("\n--- Testing Agent Team Delegation ---")
-        # InMemorySessionService is simple, non-persistent storage for this tutorial.
-        session_service_stateful = InMemorySessionService()
+async def run_stateful_conversation():
+    print("\n--- Testing Agent Team Delegation ---")
+    # InMemorySessionService is simple, non-persistent storage for this tutorial.
+    session_service_stateful = InMemorySessionService()
 
-        # Define constants for identifying the interaction context
-        APP_NAME = "weather_tutorial_agent_team"
-        USER_ID_STATEFUL = "user_1_agent_team"
-        SESSION_ID_STATEFUL = "session_001_agent_team" # Using a fixed ID for simplicity
-        
-        initial_state = {
-            "user_preference_temperature_unit": "Celsius",
-            "user_preference_city": "Tunis",
-            "user_preference_language": "English"
-        }
+    # Define constants for identifying the interaction context
+    APP_NAME = "weather_tutorial_agent_team"
+    USER_ID_STATEFUL = "user_1_agent_team"
+    SESSION_ID_STATEFUL = "session_001_agent_team" # Using a fixed ID for simplicity
+    
+    initial_state = {
+        "user_preference_temperature_unit": "Celsius",
+        "user_preference_city": "Tunis",
+        "user_preference_language": "English"
+    }
 
-        # Create the specific session where the conversation will happen
-        session_stateful = session_service_stateful.create_session(
-            app_name=APP_NAME,
-            user_id=USER_ID_STATEFUL,
-            session_id=SESSION_ID_STATEFUL,
-            state=initial_state
-        )
-        print(f"✅ Session '{SESSION_ID_STATEFUL}' created for user '{USER_ID_STATEFUL}'.")
+    # Create the specific session where the conversation will happen
+    session_stateful = session_service_stateful.create_session(
+        app_name=APP_NAME,
+        user_id=USER_ID_STATEFUL,
+        session_id=SESSION_ID_STATEFUL,
+        state=initial_state
+    )
+    print(f"✅ Session '{SESSION_ID_STATEFUL}' created for user '{USER_ID_STATEFUL}'.")
 
-        # --- Get the actual root agent object ---
-        # Check for both possible variable names
-        root_agent_var_name = 'root_agent' # Default name from Step 3 guide
-        if 'root_agent' in globals(): # Check if user used this name instead
-            root_agent_var_name = 'root_agent'
-        
-        actual_root_agent = globals()[root_agent_var_name]
-
-        # Create a runner specific to this agent team test
-        runner_root_stateful = Runner(
-            agent=actual_root_agent, # Use the root agent object
-            app_name=APP_NAME,       # Use the specific app name
-            session_service=session_service_stateful # Use the stateful session service
-            )
-        # Corrected print statement to show the actual root agent's name
-        print(f"Runner created for agent '{actual_root_agent.name}'.")
+    # --- Get the actual root agent object (built on first use) ---
+    actual_root_agent = build_agents()[ROOT_AGENT_NAME]
+
+    # Create a runner specific to this agent team test
+    runner_root_stateful = Runner(
+        agent=actual_root_agent, # Use the root agent object
+        app_name=APP_NAME,       # Use the specific app name
+        session_service=session_service_stateful # Use the stateful session service
+        )
+    # Corrected print statement to show the actual root agent's name
+    print(f"Runner created for agent '{actual_root_agent.name}'.")
 
 
 
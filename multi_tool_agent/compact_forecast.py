@@ -0,0 +1,132 @@
+"""Compact, array-backed form of OpenWeatherMap forecast payloads.
+
+A raw 5 day / 3 hour payload is 40 slot dicts, each with nested `main`,
+`weather`, `wind`, `clouds` and `sys` dicts and a `dt_txt` string, most of
+which no tool reads. The forecast cache keeps `CompactForecast` objects
+instead: one fixed-width NumPy column per field the tools use, with
+condition descriptions interned process-wide as small integer codes.
+"""
+
+from typing import Dict, List
+
+import numpy as np
+
+
+class ConditionTable:
+    """Interns condition descriptions ("light rain", "ciel dégagé", ...) as uint16 codes."""
+
+    __slots__ = ("names", "_codes")
+
+    def __init__(self):
+        self.names: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def code(self, name: str) -> int:
+        code = self._codes.get(name)
+        if code is None:
+            if len(self.names) > np.iinfo(np.uint16).max:
+                raise ValueError("Too many distinct weather conditions to intern")
+            code = self._codes[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+conditions = ConditionTable()
+
+
+class ForecastSlot:
+    """One 3-hour slot, as read by the tools."""
+
+    __slots__ = ("dt", "temp", "description", "pop")
+
+    def __init__(self, dt: int, temp: float, description: str, pop: float):
+        self.dt = dt
+        self.temp = temp
+        self.description = description
+        self.pop = pop
+
+
+class CompactForecast:
+    """A forecast payload reduced to the city and four typed columns, one row per slot.
+
+    Attributes:
+        city (str): City name as OpenWeatherMap reports it.
+        timezone (int): The city's UTC offset in seconds.
+        times (np.ndarray): Slot start times, Unix seconds (int64), sorted.
+        temps (np.ndarray): Temperatures in Celsius (float32).
+        pops (np.ndarray): Precipitation probabilities, 0-1 (float32).
+        codes (np.ndarray): Condition codes in `conditions` (uint16).
+        current (ForecastSlot): The first (current) slot, or None for an
+            empty forecast; built once since every weather report reads it.
+    """
+
+    __slots__ = ("city", "timezone", "times", "temps", "pops", "codes", "current")
+
+    def __init__(self, city: str, timezone: int, times: np.ndarray, temps: np.ndarray, pops: np.ndarray,
+                 codes: np.ndarray):
+        self.city = city
+        self.timezone = timezone
+        self.times = times
+        self.temps = temps
+        self.pops = pops
+        self.codes = codes
+        self.current = self.slot(0) if len(times) else None
+
+    @classmethod
+    def from_payload(cls, data: dict) -> "CompactForecast":
+        """Builds the compact form of a raw OWM forecast payload."""
+        slots = data["list"]
+        return cls(
+            data["city"]["name"],
+            data["city"].get("timezone", 0),
+            np.array([slot["dt"] for slot in slots], dtype=np.int64),
+            np.array([slot["main"]["temp"] for slot in slots], dtype=np.float32),
+            np.array([slot.get("pop", 0.0) for slot in slots], dtype=np.float32),
+            np.array([conditions.code(slot["weather"][0]["description"]) for slot in slots], dtype=np.uint16),
+        )
+
+    @classmethod
+    def from_columns(cls, columns: dict) -> "CompactForecast":
+        """Inverse of `to_columns`."""
+        return cls(
+            columns["city"],
+            columns["timezone"],
+            np.array(columns["dt"], dtype=np.int64),
+            np.array(columns["temp"], dtype=np.float32),
+            np.array(columns["pop"], dtype=np.float32),
+            np.array([conditions.code(name) for name in columns["weather"]], dtype=np.uint16),
+        )
+
+    def to_columns(self) -> dict:
+        """JSON-serializable form, with condition names instead of this process's codes."""
+        return {
+            "city": self.city,
+            "timezone": self.timezone,
+            "dt": self.times.tolist(),
+            "temp": [round(temp, 2) for temp in self.temps.tolist()],
+            "pop": [round(pop, 2) for pop in self.pops.tolist()],
+            "weather": [conditions.names[code] for code in self.codes.tolist()],
+        }
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def slot(self, index: int) -> ForecastSlot:
+        # float32 keeps about 7 digits; rounding gives back OWM's 2-decimal readings exactly
+        return ForecastSlot(self.times.item(index), round(self.temps.item(index), 2),
+                            conditions.names[self.codes.item(index)], round(self.pops.item(index), 2))
+
+    def current_at(self, moment: float) -> ForecastSlot:
+        """The slot covering a Unix time; `current` unless the data is older than its first slot."""
+        index = int(np.searchsorted(self.times, moment, side="right")) - 1
+        if index <= 0:
+            return self.current
+        return self.slot(min(index, len(self.times) - 1))
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the columns."""
+        return self.times.nbytes + self.temps.nbytes + self.pops.nbytes + self.codes.nbytes
@@ -0,0 +1,227 @@
+"""Shared cache for OpenWeatherMap 5 day / 3 hour forecasts.
+
+OWM only refreshes forecast data on 3-hour slot boundaries, so an entry
+stays valid until the next boundary. Concurrent misses for the same
+location are coalesced into a single upstream request, and entries that
+expired only recently are served as-is while a refresh runs behind them.
+When a shared store is configured, fresh forecasts are published there and
+a local miss checks it before calling OWM, so workers share their fetches.
+
+Entries are kept as `CompactForecast` columns rather than raw payloads,
+about a tenth of the memory per city, so large caches stay small.
+
+When OpenWeatherMap is unavailable (its circuit breaker is open, or the
+fetch failed or ran out of time), an entry of any age is served instead
+of an error, and `get_with_age` reports how old it is so the tools can
+say so.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple, Union
+
+from . import owm_client
+from .compact_forecast import CompactForecast
+from .tracing import set_attribute
+from .shared_store import shared_key, shared_store
+from .upstream_guard import guards
+from .upstream_scheduler import join_shared, start_shared, upstream_priority
+
+logger = logging.getLogger(__name__)
+
+FORECAST_SLOT_SECONDS = 3 * 3600
+FORECAST_SLOT_GRACE_SECONDS = float(os.environ.get("FORECAST_SLOT_GRACE_SECONDS", "600"))
+FORECAST_CACHE_SIZE = int(os.environ.get("FORECAST_CACHE_SIZE", "2048"))
+FORECAST_COORD_PRECISION = int(os.environ.get("FORECAST_COORD_PRECISION", "2"))
+FORECAST_STALE_SECONDS = float(os.environ.get("FORECAST_STALE_SECONDS", "1800"))
+
+Key = Tuple[float, float]
+
+
+def forecast_key(lat: float, lon: float) -> Key:
+    """Rounds coordinates so nearby lookups share an entry (2 decimals is about 1 km)."""
+    return (round(lat, FORECAST_COORD_PRECISION), round(lon, FORECAST_COORD_PRECISION))
+
+
+def next_slot_expiry(now: float) -> float:
+    """Returns when data fetched at `now` goes stale.
+
+    That is the next 3-hour UTC boundary plus a grace period that leaves
+    OWM time to publish the new run.
+    """
+    slot = (now - FORECAST_SLOT_GRACE_SECONDS) // FORECAST_SLOT_SECONDS + 1
+    return slot * FORECAST_SLOT_SECONDS + FORECAST_SLOT_GRACE_SECONDS
+
+
+class CacheEntry:
+    __slots__ = ("data", "fetched_at", "expires_at")
+
+    def __init__(self, data: CompactForecast, fetched_at: float, expires_at: float):
+        self.data = data
+        self.fetched_at = fetched_at
+        self.expires_at = expires_at
+
+
+class ForecastCache:
+    """Bounded LRU of compact forecasts with single-flight refills."""
+
+    def __init__(self, max_entries: int = 2048, stale_seconds: float = 1800.0, shared=None):
+        self.max_entries = max_entries
+        self.stale_seconds = stale_seconds
+        self.shared = shared
+        self._entries: "OrderedDict[Key, CacheEntry]" = OrderedDict()
+        self._inflight: Dict[Key, asyncio.Future] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.shared_hits = 0
+        self.fallback_hits = 0
+
+    def peek(self, key: Key) -> Optional[CacheEntry]:
+        """Returns the entry for a key, fresh or not, without touching stats."""
+        return self._entries.get(key)
+
+    def store(self, key: Key, data: Union[dict, CompactForecast], fetched_at: Optional[float] = None) -> CacheEntry:
+        """Caches a forecast, given as a raw OWM payload or already compacted."""
+        if isinstance(data, dict):
+            data = CompactForecast.from_payload(data)
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        entry = CacheEntry(data, fetched_at, next_slot_expiry(fetched_at))
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    async def _fetch(self, key: Key) -> CompactForecast:
+        # Published in column form, under its own namespace so raw payloads from older workers are never read
+        shared_name = shared_key("forecast_columns", f"{key[0]},{key[1]}")
+        # The store client blocks, so its round trips run in a thread rather than on the event loop
+        if self.shared is not None:
+            payload = await asyncio.to_thread(self.shared.get, shared_name)
+            if payload is not None:
+                fetched_at, columns = json.loads(payload)
+                if next_slot_expiry(fetched_at) > time.time():
+                    self.shared_hits += 1
+                    return self.store(key, CompactForecast.from_columns(columns), fetched_at).data
+
+        entry = self.store(key, await owm_client.fetch_forecast(*key))
+        if self.shared is not None:
+            ttl = int(entry.expires_at - entry.fetched_at) + 1
+            await asyncio.to_thread(self.shared.set, shared_name,
+                                    json.dumps([entry.fetched_at, entry.data.to_columns()]), ex=ttl)
+        return entry.data
+
+    def refill(self, key: Key) -> asyncio.Future:
+        """Starts (or joins) the upstream fetch for a key."""
+        future = self._inflight.get(key)
+        if future is None:
+            future = start_shared(self._fetch(key))
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._refill_done(key, done))
+        else:
+            self.coalesced += 1
+            # A user turn joining a background refresh must not wait in the background lane
+            join_shared(future)
+        return future
+
+    def _refill_done(self, key: Key, future: asyncio.Future) -> None:
+        self._inflight.pop(key, None)
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning("Forecast refresh for %s failed: %s", key, future.exception())
+
+    async def get(self, lat: float, lon: float) -> CompactForecast:
+        """Returns the forecast for a location, fetching it if needed.
+
+        Args:
+            lat (float): Latitude.
+            lon (float): Longitude.
+
+        Returns:
+            CompactForecast: The forecast.
+        """
+        return (await self.get_with_age(lat, lon))[0]
+
+    async def get_with_age(self, lat: float, lon: float) -> Tuple[CompactForecast, Optional[float]]:
+        """`get`, also telling whether the answer is a fallback to old data.
+
+        Args:
+            lat (float): Latitude.
+            lon (float): Longitude.
+
+        Returns:
+            tuple: The forecast, and its age in seconds when it was served
+                only because OpenWeatherMap is unavailable (None otherwise).
+
+        Raises:
+            OWMUnavailable: OpenWeatherMap is unavailable and nothing is cached.
+        """
+        key = forecast_key(lat, lon)
+        entry = self._entries.get(key)
+        if entry is not None:
+            now = time.time()
+            if entry.expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                set_attribute("forecast_cache", "hit")
+                return entry.data, None
+            if now - entry.expires_at < self.stale_seconds:
+                # Stale-while-revalidate: answer now, refresh in the background
+                self._entries.move_to_end(key)
+                self.stale_hits += 1
+                set_attribute("forecast_cache", "stale")
+                # Nobody waits on this fetch, so it must not take quota from user turns
+                with upstream_priority("background"):
+                    self.refill(key)
+                return entry.data, None
+
+        self.misses += 1
+        if entry is not None and guards["forecast"].breaker.state == "open":
+            # No point waiting for a call the breaker would fail at once
+            return self._fall_back(entry)
+        set_attribute("forecast_cache", "miss")
+        try:
+            # Shielded so one cancelled caller does not fail everyone waiting on the fetch
+            return await asyncio.shield(self.refill(key)), None
+        except owm_client.OWMUnavailable:
+            if entry is None:
+                raise
+            return self._fall_back(entry)
+
+    def _fall_back(self, entry: CacheEntry) -> Tuple[CompactForecast, float]:
+        self.fallback_hits += 1
+        set_attribute("forecast_cache", "fallback")
+        return entry.data, time.time() - entry.fetched_at
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "shared_hits": self.shared_hits,
+            "fallback_hits": self.fallback_hits,
+            "inflight": len(self._inflight),
+            "hit_ratio": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+            "column_bytes": sum(entry.data.nbytes for entry in self._entries.values()),
+        }
+
+
+forecast_cache = ForecastCache(FORECAST_CACHE_SIZE, FORECAST_STALE_SECONDS, shared_store)
+
+
+async def get_forecast(lat: float, lon: float) -> CompactForecast:
+    """Cached, compacted replacement for owm_client.fetch_forecast."""
+    return await forecast_cache.get(lat, lon)
+
+
+async def get_forecast_with_age(lat: float, lon: float) -> Tuple[CompactForecast, Optional[float]]:
+    """`get_forecast`, plus the data's age when it is a fallback (see ForecastCache.get_with_age)."""
+    return await forecast_cache.get_with_age(lat, lon)
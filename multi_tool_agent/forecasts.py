@@ -0,0 +1,229 @@
+"""Turns OpenWeatherMap forecast payloads into the weather tools' reports.
+
+These helpers do no I/O and never touch session state: the tools fetch
+the forecast (a `CompactForecast` from the cache), read the user's preferences, and pass both in. That keeps
+the CPU-bound part of each tool callable on its own, which is what the
+benchmarks in benchmarks/ measure.
+
+Daily statistics are computed column-wise with NumPy over every 3-hour
+slot at once, and days are cut at midnight in the city's own time (the
+payload's `city.timezone` UTC offset), not the server's.
+"""
+
+import datetime
+import time
+from typing import List, Optional
+
+import numpy as np
+
+from .compact_forecast import CompactForecast, conditions
+from .localization import Catalog, format_temperature
+
+SECONDS_PER_DAY = 86400
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+# Group key = city index * this + local day number; far more days than any payload spans
+_CITY_KEY_STRIDE = 1 << 24
+
+
+def daily_statistics_batch(forecasts: List[CompactForecast], now: Optional[float] = None) -> List[List[dict]]:
+    """Per-day statistics for the upcoming days of many forecasts in one pass.
+
+    The forecasts' columns (time, temperature, precipitation probability,
+    condition code) are concatenated, keyed by (city, local date) in each
+    city's own time, and reduced per key with NumPy, so the cost per city
+    shrinks as the batch grows.
+
+    Args:
+        forecasts (list): Compact forecasts, slots sorted by time as
+            OpenWeatherMap returns them.
+        now (float, optional): Current Unix time. Defaults to time.time().
+
+    Returns:
+        list: For each forecast, its days after the city's current local
+            date in order, as dicts with "date" (datetime.date), "temp_min",
+            "temp_max", "temp_mean" (Celsius), "condition" (the most frequent
+            description, earliest seen on ties) and "pop" (highest
+            precipitation probability, 0-1).
+    """
+    results: List[List[dict]] = [[] for _ in forecasts]
+    if not any(len(forecast) for forecast in forecasts):
+        return results
+    if len(forecasts) == 1:
+        forecast = forecasts[0]
+        times, temps, pops, codes = forecast.times, forecast.temps, forecast.pops, forecast.codes
+        base = forecast.timezone
+    else:
+        times = np.concatenate([forecast.times for forecast in forecasts])
+        temps = np.concatenate([forecast.temps for forecast in forecasts])
+        pops = np.concatenate([forecast.pops for forecast in forecasts])
+        codes = np.concatenate([forecast.codes for forecast in forecasts])
+        # Per-slot city offset: UTC offset plus the city's key range
+        base = np.repeat(np.array([forecast.timezone for forecast in forecasts], dtype=np.int64)
+                         + np.arange(len(forecasts), dtype=np.int64) * _CITY_KEY_STRIDE * SECONDS_PER_DAY,
+                         [len(forecast) for forecast in forecasts])
+    keys = (times + base) // SECONDS_PER_DAY
+    today = (int(time.time() if now is None else now) + base) // SECONDS_PER_DAY
+    upcoming = keys > today
+    if not upcoming.any():
+        return results
+    keys, codes = keys[upcoming], codes[upcoming]
+    # Row 0: temperature, row 1: precipitation probability; back to OWM's 2-decimal readings from float32
+    values = np.round(np.stack((temps[upcoming], pops[upcoming])).astype(np.float64), 2)
+
+    # Slots are sorted within each city and cities are contiguous, so each key is one run
+    starts = np.concatenate(([0], np.flatnonzero(keys[1:] != keys[:-1]) + 1))
+    counts = np.diff(starts, append=len(keys))
+    temp_min = np.minimum.reduceat(values[0], starts)
+    temp_max, pop_max = np.maximum.reduceat(values, starts, axis=1)
+    temp_mean = np.add.reduceat(values[0], starts) / counts
+    # Renumber the conditions in order of first appearance so ties go to the earliest seen
+    present, first, local = np.unique(codes, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    width = len(present)
+    tally = np.bincount(np.repeat(np.arange(len(starts)) * width, counts) + rank[local],
+                        minlength=len(starts) * width)
+    dominant = present[order[tally.reshape(len(starts), width).argmax(axis=1)]]
+
+    names = conditions.names
+    for key, low, high, mean, pop, condition in zip(
+        keys[starts].tolist(), temp_min.tolist(), temp_max.tolist(), temp_mean.tolist(), pop_max.tolist(),
+        dominant.tolist()
+    ):
+        city, day = divmod(key, _CITY_KEY_STRIDE)
+        results[city].append({
+            "date": datetime.date.fromordinal(EPOCH_ORDINAL + day),
+            "temp_min": low,
+            "temp_max": high,
+            "temp_mean": mean,
+            "condition": names[condition],
+            "pop": pop,
+        })
+    return results
+
+
+def daily_statistics(forecast: CompactForecast, now: Optional[float] = None) -> List[dict]:
+    """`daily_statistics_batch` for a single forecast."""
+    return daily_statistics_batch([forecast], now)[0]
+
+
+def format_daily_forecasts(stats: List[dict], days: int, messages: Catalog, unit: str) -> List[dict]:
+    """Formats the first `days` entries of `daily_statistics` output for the user.
+
+    Args:
+        stats (list): One city's daily statistics.
+        days (int): How many upcoming days to return.
+        messages (Catalog): Catalog of the user's language.
+        unit (str): "Celsius" or "Fahrenheit".
+
+    Returns:
+        list: One dict per day with "date", "weather", "temperature" (mean),
+            "low", "high" and "pop" (precipitation chance in percent).
+    """
+    return [{
+        "date": messages.day_label(day["date"]),
+        "weather": day["condition"],
+        "temperature": format_temperature(day["temp_mean"], unit),
+        "low": format_temperature(day["temp_min"], unit),
+        "high": format_temperature(day["temp_max"], unit),
+        "pop": round(day["pop"] * 100),
+    } for day in stats[:days]]
+
+
+def forecast_report(messages: Catalog, city_name: str, daily: List[dict]) -> str:
+    """Renders the multi-day forecast report from `format_daily_forecasts` output."""
+    report = messages.message("forecast_header", city=city_name, days=len(daily))
+    return report + "".join(messages.message("forecast_line", **fc) for fc in daily)
+
+
+def current_weather_report(forecast: CompactForecast, messages: Catalog, unit: str,
+                           now: Optional[float] = None) -> str:
+    """Renders the current-conditions report from the first slot of a forecast.
+
+    Pass `now` for old data, to report the slot covering that time instead.
+    """
+    current = forecast.current if now is None else forecast.current_at(now)
+    return messages.message(
+        "weather_report",
+        city=forecast.city,
+        description=current.description,
+        temperature=format_temperature(current.temp, unit),
+    )
+
+
+def city_summary(forecast: CompactForecast, messages: Catalog, unit: str, stats: Optional[List[dict]] = None,
+                 days: int = 0, now: Optional[float] = None) -> dict:
+    """One city's entry in a multi-city comparison: current conditions, plus `days` upcoming days.
+
+    Args:
+        forecast (CompactForecast): The city's forecast.
+        messages (Catalog): Catalog of the user's language.
+        unit (str): "Celsius" or "Fahrenheit".
+        stats (list, optional): The city's `daily_statistics`, needed when days > 0.
+        days (int, optional): Upcoming days to include (0 for current conditions only).
+        now (float, optional): For old data, the time whose slot is reported as current.
+
+    Returns:
+        dict: "city", "status", "description", "temperature", "temp_celsius",
+            and "daily_forecasts" when days > 0.
+    """
+    current = forecast.current if now is None else forecast.current_at(now)
+    summary = {
+        "city": forecast.city,
+        "status": "success",
+        "description": current.description,
+        "temperature": format_temperature(current.temp, unit),
+        "temp_celsius": current.temp,
+    }
+    if days > 0:
+        summary["daily_forecasts"] = format_daily_forecasts(stats or [], days, messages, unit)
+    return summary
+
+
+def data_age_note(messages: Catalog, age_seconds: float) -> str:
+    """Sentence appended to a report built from old data because OpenWeatherMap is unavailable."""
+    minutes = max(1, round(age_seconds / 60))
+    if minutes < 120:
+        age = messages.message("age_minutes", count=minutes)
+    elif minutes < 48 * 60:
+        age = messages.message("age_hours", count=round(minutes / 60))
+    else:
+        age = messages.message("age_days", count=round(minutes / 1440))
+    return messages.message("stale_data_note", age=age)
+
+
+def comparison_report(messages: Catalog, summaries: List[dict], truncated_to: int = 0) -> str:
+    """Renders a multi-city comparison from `city_summary` entries and per-city errors.
+
+    Args:
+        messages (Catalog): Catalog of the user's language.
+        summaries (list): `city_summary` results, or {"status": "error",
+            "error_message": ...} for cities that could not be fetched, in
+            the order the user named them.
+        truncated_to (int, optional): When non-zero, notes that only this
+            many cities were compared.
+
+    Returns:
+        str: The report.
+    """
+    lines = [messages.message("compare_header", count=len(summaries))]
+    found = []
+    for summary in summaries:
+        if summary["status"] != "success":
+            lines.append(messages.message("compare_error_line", error=summary["error_message"]))
+            continue
+        found.append(summary)
+        lines.append(messages.message("compare_line", city=summary["city"], description=summary["description"],
+                                      temperature=summary["temperature"]))
+        lines.extend(messages.message("compare_day_line", **fc) for fc in summary.get("daily_forecasts", ()))
+    if len(found) > 1:
+        warmest = max(found, key=lambda summary: summary["temp_celsius"])
+        coldest = min(found, key=lambda summary: summary["temp_celsius"])
+        lines.append(messages.message("compare_extremes", warmest=warmest["city"],
+                                      warmest_temperature=warmest["temperature"], coldest=coldest["city"],
+                                      coldest_temperature=coldest["temperature"]))
+    if truncated_to:
+        lines.append(messages.message("compare_truncated", limit=truncated_to))
+    return "".join(lines)
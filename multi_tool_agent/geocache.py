@@ -0,0 +1,225 @@
+"""Two-tier cache for OpenWeatherMap geocoding lookups.
+
+A city's coordinates never change, so lookups are kept in a bounded
+in-memory LRU backed by a SQLite file that survives restarts, or by the
+shared store when one is configured so every worker benefits from each
+lookup. "City not found" answers are cached too, for a shorter time.
+Concurrent misses for the same city share a single upstream request.
+Only the LRU is consulted on the event loop; the SQLite and shared-store
+tiers are read and written from a worker thread.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from . import owm_client
+from .tracing import set_attribute
+from .shared_store import shared_key, shared_store
+from .upstream_scheduler import join_shared, start_shared
+
+logger = logging.getLogger(__name__)
+
+GEOCODE_CACHE_PATH = os.environ.get("GEOCODE_CACHE_PATH", ".cache/geocode.sqlite3")
+GEOCODE_CACHE_SIZE = int(os.environ.get("GEOCODE_CACHE_SIZE", "1024"))
+GEOCODE_NEGATIVE_TTL_SECONDS = float(os.environ.get("GEOCODE_NEGATIVE_TTL_SECONDS", "86400"))
+
+
+def normalize_city(city: str) -> str:
+    """Builds the cache key for a city name.
+
+    Folds case, strips diacritics and collapses whitespace, so that
+    "  São   Paulo", "sao paulo" and "SAO PAULO" share one entry.
+
+    Args:
+        city (str): The city name as typed by the user.
+
+    Returns:
+        str: The normalized key.
+    """
+    decomposed = unicodedata.normalize("NFKD", city)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    parts = [part.strip() for part in stripped.casefold().split(",")]
+    return ",".join(" ".join(part.split()) for part in parts)
+
+
+class GeocodeCache:
+    """Bounded LRU in front of an optional on-disk SQLite store.
+
+    Values are the geocoding result list as returned by OpenWeatherMap
+    (trimmed to the first match); an empty list means "city not found".
+    """
+
+    def __init__(self, path: Optional[str], max_entries: int = 1024, negative_ttl: float = 86400.0,
+                 shared=None):
+        self.path = path
+        self.shared = shared
+        self.max_entries = max_entries
+        self.negative_ttl = negative_ttl
+        self._memory: "OrderedDict[str, Tuple[list, float]]" = OrderedDict()
+        # Guards the LRU and counters; the SQLite connection has its own lock so slow I/O never holds this one
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "shared_hits": 0, "negative_hits": 0, "misses": 0}
+        # Memory misses that joined a lookup already in flight (the lookup itself counts once)
+        self.coalesced = 0
+        self.inflight: Dict[str, asyncio.Future] = {}
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self._db is None and self.path and self.shared is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS geocode ("
+                "key TEXT PRIMARY KEY, payload TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+        return self._db
+
+    def _expired(self, value: list, stored_at: float) -> bool:
+        return not value and time.time() - stored_at > self.negative_ttl
+
+    def _remember(self, key: str, value: list, stored_at: float) -> None:
+        self._memory[key] = (value, stored_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get_memory(self, key: str) -> Optional[list]:
+        """Returns the result held in memory for a normalized key, or None. Cheap enough for the event loop."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None or self._expired(*entry):
+                return None
+            self._memory.move_to_end(key)
+            self.counters["negative_hits" if not entry[0] else "memory_hits"] += 1
+            return entry[0]
+
+    def load(self, key: str) -> Optional[list]:
+        """Looks a normalized key up in the shared store or on disk, or None on a miss.
+
+        Blocks on I/O, so async callers run it in a thread.
+        """
+        if self.shared is not None:
+            payload = self.shared.get(shared_key("geocode", key))
+            if payload is not None:
+                value, stored_at = json.loads(payload)
+                with self._lock:
+                    self._remember(key, value, stored_at)
+                    self.counters["negative_hits" if not value else "shared_hits"] += 1
+                return value
+
+        with self._db_lock:
+            db = self._connect()
+            row = db.execute("SELECT payload, stored_at FROM geocode WHERE key = ?", (key,)).fetchone() if db else None
+        with self._lock:
+            if row is not None:
+                value, stored_at = json.loads(row[0]), row[1]
+                if not self._expired(value, stored_at):
+                    self._remember(key, value, stored_at)
+                    self.counters["negative_hits" if not value else "disk_hits"] += 1
+                    return value
+            self._memory.pop(key, None)
+            self.counters["misses"] += 1
+            return None
+
+    def get(self, key: str) -> Optional[list]:
+        """Returns the cached result for a normalized key, or None on a miss."""
+        cached = self.get_memory(key)
+        return cached if cached is not None else self.load(key)
+
+    def stats(self) -> dict:
+        lookups = sum(self.counters.values())
+        hits = lookups - self.counters["misses"]
+        return dict(self.counters, coalesced=self.coalesced, inflight=len(self.inflight), entries=len(self._memory),
+                    hit_ratio=hits / lookups if lookups else 0.0)
+
+    def remember(self, key: str, value: list) -> Tuple[list, float]:
+        """Keeps a geocoding result in memory. Returns the trimmed value and its timestamp for `store`."""
+        value = value[:1]
+        stored_at = time.time()
+        with self._lock:
+            self._remember(key, value, stored_at)
+        return value, stored_at
+
+    def store(self, key: str, value: list, stored_at: float) -> None:
+        """Writes a result remembered by `remember` to the shared store or to disk. Blocks on I/O."""
+        if self.shared is not None:
+            if not value and self.negative_ttl <= 0:
+                return  # negative answers are not cached
+            # The store expires negative answers itself; Redis needs a whole number of seconds, at least 1
+            self.shared.set(shared_key("geocode", key), json.dumps([value, stored_at]),
+                            ex=None if value else max(1, math.ceil(self.negative_ttl)))
+            return
+        with self._db_lock:
+            db = self._connect()
+            if db is not None:
+                db.execute(
+                    "INSERT OR REPLACE INTO geocode (key, payload, stored_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), stored_at),
+                )
+
+    def put(self, key: str, value: list) -> None:
+        """Stores a geocoding result (an empty list records "not found")."""
+        self.store(key, *self.remember(key, value))
+
+
+geocode_cache = GeocodeCache(GEOCODE_CACHE_PATH, GEOCODE_CACHE_SIZE, GEOCODE_NEGATIVE_TTL_SECONDS, shared_store)
+
+
+async def geocode_city(city: str) -> list:
+    """Cached replacement for owm_client.geocode.
+
+    Args:
+        city (str): The city name as typed by the user.
+
+    Returns:
+        list: Matching locations (empty when the city is unknown).
+    """
+    key = normalize_city(city)
+    # Only the in-memory tier is read on the event loop; disk and shared-store lookups run in a thread
+    cached = geocode_cache.get_memory(key)
+    if cached is not None:
+        set_attribute("geocode_cache", "hit")
+        return cached
+    set_attribute("geocode_cache", "miss")
+
+    future = geocode_cache.inflight.get(key)
+    if future is None:
+        future = start_shared(_lookup(city, key))
+        geocode_cache.inflight[key] = future
+        future.add_done_callback(lambda done: _lookup_done(key, done))
+    else:
+        geocode_cache.coalesced += 1
+        # Raises the lookup's quota lane when this caller's is higher
+        join_shared(future)
+    # Shielded so one cancelled caller does not fail everyone waiting on the lookup
+    return await asyncio.shield(future)
+
+
+def _lookup_done(key: str, future: asyncio.Future) -> None:
+    geocode_cache.inflight.pop(key, None)
+    if not future.cancelled():
+        # Callers see the error; this only stops asyncio reporting it as never retrieved
+        future.exception()
+
+
+async def _lookup(city: str, key: str) -> list:
+    cached = await asyncio.to_thread(geocode_cache.load, key)
+    if cached is not None:
+        set_attribute("geocode_cache", "hit")
+        return cached
+    value, stored_at = geocode_cache.remember(key, await owm_client.geocode(city))
+    await asyncio.to_thread(geocode_cache.store, key, value, stored_at)
+    return value
@@ -0,0 +1,315 @@
+"""In-process intent classifier that lets clear-cut messages skip the root agent.
+
+Every message normally costs a root-agent LLM call just to decide which
+sub-agent should handle it. The router combines keyword rules with a
+small character n-gram Naive Bayes model (English, French and Arabic,
+trained at import time on the seed phrases below) and only routes a
+message when it is confident; everything else still goes to the root
+agent.
+
+Routes:
+    greeting / farewell  -> answered locally with say_hello / say_goodbye (no LLM call)
+    time                 -> time_agent
+    forecast             -> forecast_agent
+    root                 -> root agent (weather questions, mixed or unclear messages)
+
+Time and forecast questions about several cities ("compare Paris and
+London tomorrow") and follow-ups that lean on earlier turns ("and
+tomorrow?") also stay with the root agent: the sub-agents have no
+multi-city tool and only the root agent's reply draws on the history.
+"""
+
+import math
+import os
+import re
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+INTENT_ROUTER_ENABLED = os.environ.get("INTENT_ROUTER_ENABLED", "false").lower() in ("1", "true", "yes")
+INTENT_CONFIDENCE_THRESHOLD = float(os.environ.get("INTENT_CONFIDENCE_THRESHOLD", "0.85"))
+
+# Intents the router may act on; "weather" and "other" always go to the root agent
+ROUTED_AGENTS = {
+    "greeting": "greeting_agent",
+    "farewell": "farewell_agent",
+    "time": "time_agent",
+    "forecast": "forecast_agent",
+}
+
+SEED_PHRASES: Dict[str, List[str]] = {
+    "greeting": [
+        "hi", "hello", "hey", "hello there", "hi there", "good morning", "good evening", "hey hey",
+        "greetings", "good afternoon", "yo", "hiya",
+        "bonjour", "salut", "bonsoir", "coucou", "bonjour à tous", "salut toi", "allô",
+        "مرحبا", "مرحباً", "أهلا", "اهلا وسهلا", "السلام عليكم", "صباح الخير", "مساء الخير", "أهلاً بك",
+    ],
+    "farewell": [
+        "bye", "goodbye", "see you", "see you later", "bye bye", "thanks bye", "good night", "take care",
+        "catch you later", "farewell", "thanks, goodbye", "later",
+        "au revoir", "à bientôt", "à plus", "bonne nuit", "salut à plus", "merci au revoir", "adieu", "à demain",
+        "مع السلامة", "وداعا", "وداعاً", "إلى اللقاء", "الى اللقاء", "تصبح على خير", "شكرا مع السلامة", "باي",
+    ],
+    "time": [
+        "what time is it", "what time is it in tokyo", "current time in paris", "time in new york",
+        "what's the time in london", "tell me the time", "what is the local time in sydney",
+        "what time is it now in dubai", "clock in berlin", "the time please",
+        "quelle heure est-il", "quelle heure est-il à paris", "l'heure à tokyo", "heure actuelle à londres",
+        "donne-moi l'heure", "il est quelle heure à montréal", "quelle est l'heure à tunis",
+        "كم الساعة", "كم الساعة في دبي", "ما هو الوقت الآن", "الوقت في باريس", "الساعة الآن في تونس",
+        "ما الوقت في لندن", "كم الوقت الآن",
+    ],
+    "forecast": [
+        "forecast", "weather forecast", "forecast for paris", "what's the forecast for tomorrow",
+        "will it rain tomorrow", "weather for the next 3 days", "forecast for the next five days in rome",
+        "how will the weather be this week", "weather tomorrow in london", "what will the weather be like tomorrow",
+        "prévisions météo", "prévisions pour paris", "quel temps fera-t-il demain", "va-t-il pleuvoir demain",
+        "météo des prochains jours", "prévisions pour les 3 prochains jours à tunis", "la météo de demain",
+        "توقعات الطقس", "توقعات الطقس لباريس", "هل ستمطر غدا", "الطقس غدا", "طقس الأيام القادمة",
+        "توقعات الطقس للأيام الثلاثة القادمة", "كيف سيكون الطقس غدا",
+    ],
+    "weather": [
+        "weather", "what's the weather", "weather in paris", "how is the weather in london", "is it raining in rome",
+        "temperature in madrid", "how hot is it in dubai", "current weather", "is it cold outside", "weather now",
+        "météo", "quel temps fait-il", "météo à paris", "il fait quel temps à lyon", "température à tunis",
+        "il pleut à londres", "la météo actuelle",
+        "الطقس", "كيف الطقس", "الطقس في القاهرة", "ما هي درجة الحرارة في تونس", "هل الجو حار في دبي",
+        "حالة الطقس الآن",
+    ],
+    "other": [
+        "change my unit to fahrenheit", "what can you do", "who are you", "help", "tell me a joke",
+        "what is the capital of france", "thank you", "thanks", "ok", "i don't understand",
+        "change my city to paris", "remember that i live in rome",
+        "merci", "qui es-tu", "aide-moi", "que peux-tu faire", "raconte une blague",
+        "شكرا", "من أنت", "ماذا يمكنك أن تفعل", "ساعدني", "غير المدينة إلى باريس",
+    ],
+}
+
+# Keyword rules, written against normalize_text() output. Greeting and
+# farewell rules only fire on messages made entirely of such words; the
+# others fire on a substring match.
+_GREETING_WORDS = {
+    "hi", "hello", "hey", "hiya", "yo", "greetings", "good", "morning", "afternoon", "evening", "there",
+    "bonjour", "salut", "bonsoir", "coucou", "allo",
+    "مرحبا", "اهلا", "وسهلا", "السلام", "عليكم", "صباح", "مساء", "الخير", "بك",
+}
+_FAREWELL_WORDS = {
+    "bye", "goodbye", "see", "you", "later", "thanks", "thank", "good", "night", "take", "care", "farewell",
+    "au", "revoir", "a", "bientot", "plus", "bonne", "nuit", "merci", "adieu", "demain",
+    "مع", "السلامة", "وداعا", "الى", "اللقاء", "شكرا", "تصبح", "على", "خير", "باي",
+}
+_FAREWELL_MARKERS = {"bye", "goodbye", "farewell", "revoir", "bientot", "adieu", "السلامة", "وداعا", "اللقاء", "باي", "night", "nuit", "later"}
+_KEYWORD_RULES = {
+    "time": re.compile(r"\b(what time|the time|time is it|local time|current time|quelle heure|l'heure|heure actuelle)\b|كم الساعة|الساعة الان|الوقت"),
+    "forecast": re.compile(r"\b(forecast|tomorrow|next \d+ days|next (few|three|five) days|this week|prevision|previsions|demain|prochains jours)\b|توقعات|غدا|الايام القادمة"),
+    "weather": re.compile(r"\b(weather|temperature|raining|meteo|quel temps|temperature)\b|الطقس|درجة الحرارة"),
+}
+# Messages about more than one place
+_MULTI_CITY = re.compile(r"\b(compare|compared|comparing|comparer|comparez|versus|vs|between|entre|both|les deux)\b|قارن|مقارنة|بين")
+# "Paris and London", "Rome ou Madrid" in the original casing (Latin script only; "Paris, France" is one place)
+_CITY_LIST = re.compile(r"\b[A-Z][\w'-]*\s*(?:&|\band\b|\bet\b|\bor\b|\bou\b)\s*[A-Z]")
+# Follow-ups that only make sense with the previous turn ("and tomorrow?", "what about there?")
+_FOLLOW_UP = re.compile(
+    r"^(and|what about|how about|same|et|et pour|qu'en est il|pareil|و|وماذا|ماذا عن|وبالنسبة)\b|^و(غدا|ماذا|الان)"
+    r"|\b(there|la bas)\b|هناك"
+)
+
+
+def normalize_text(text: str) -> str:
+    """Case-folds, strips diacritics (Latin accents, Arabic harakat and hamza/madda marks) and punctuation."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(re.sub(r"[^\w\s']", " ", stripped).split())
+
+
+def _features(text: str) -> Iterable[str]:
+    words = text.split()
+    for word in words:
+        yield "w:" + word
+    padded = f" {text} "
+    for size in (2, 3, 4):
+        for i in range(len(padded) - size + 1):
+            yield padded[i:i + size]
+
+
+class NaiveBayesIntentModel:
+    """Multinomial Naive Bayes over word and character n-grams. CPU-only, no dependencies."""
+
+    def __init__(self, alpha: float = 0.5):
+        self.alpha = alpha
+        self.labels: List[str] = []
+        self._log_priors: Dict[str, float] = {}
+        self._log_likelihoods: Dict[str, Dict[str, float]] = {}
+        self._log_unseen: Dict[str, float] = {}
+
+    def fit(self, samples: Iterable[Tuple[str, str]]) -> "NaiveBayesIntentModel":
+        feature_counts: Dict[str, Counter] = defaultdict(Counter)
+        label_counts: Counter = Counter()
+        vocabulary = set()
+        for text, label in samples:
+            features = list(_features(normalize_text(text)))
+            feature_counts[label].update(features)
+            label_counts[label] += 1
+            vocabulary.update(features)
+
+        total = sum(label_counts.values())
+        self.labels = sorted(label_counts)
+        for label in self.labels:
+            counts = feature_counts[label]
+            denominator = sum(counts.values()) + self.alpha * len(vocabulary)
+            self._log_priors[label] = math.log(label_counts[label] / total)
+            self._log_likelihoods[label] = {
+                feature: math.log((count + self.alpha) / denominator) for feature, count in counts.items()
+            }
+            self._log_unseen[label] = math.log(self.alpha / denominator)
+        return self
+
+    def predict_proba(self, text: str) -> Dict[str, float]:
+        features = list(_features(normalize_text(text)))
+        scores = {}
+        for label in self.labels:
+            likelihoods = self._log_likelihoods[label]
+            unseen = self._log_unseen[label]
+            scores[label] = self._log_priors[label] + sum(likelihoods.get(f, unseen) for f in features)
+        # Scale by feature count so long messages do not produce overconfident posteriors
+        scale = max(1, len(features)) ** 0.5
+        best = max(scores.values())
+        exp_scores = {label: math.exp((score - best) / scale) for label, score in scores.items()}
+        norm = sum(exp_scores.values())
+        return {label: value / norm for label, value in exp_scores.items()}
+
+
+class IntentDecision:
+    __slots__ = ("intent", "confidence", "agent_name", "source")
+
+    def __init__(self, intent: str, confidence: float, agent_name: Optional[str], source: str):
+        self.intent = intent
+        self.confidence = confidence
+        self.agent_name = agent_name
+        self.source = source
+
+    @property
+    def routed(self) -> bool:
+        return self.agent_name is not None
+
+
+class IntentRouter:
+    """Decides whether a message can bypass the root agent."""
+
+    def __init__(self, model: NaiveBayesIntentModel, threshold: float = 0.85):
+        self.model = model
+        self.threshold = threshold
+        self.routes: Counter = Counter()
+        self.fallbacks = 0
+        self.classify_seconds = 0.0
+
+    def _rule_intents(self, normalized: str) -> set:
+        intents = {intent for intent, pattern in _KEYWORD_RULES.items() if pattern.search(normalized)}
+        if "forecast" in intents:
+            # "weather forecast", "la meteo de demain": the forecast wins
+            intents.discard("weather")
+        words = normalized.split()
+        if words and len(words) <= 5:
+            word_set = set(words)
+            if word_set <= _FAREWELL_WORDS and word_set & _FAREWELL_MARKERS:
+                intents.add("farewell")
+            elif word_set <= _GREETING_WORDS:
+                intents.add("greeting")
+        return intents
+
+    def classify(self, text: str) -> IntentDecision:
+        """Classifies a message and picks the agent that should handle it.
+
+        Args:
+            text (str): The user's message.
+
+        Returns:
+            IntentDecision: The intent, its confidence and the target agent
+            (None when the root agent should handle the message).
+        """
+        started = time.perf_counter()
+        normalized = normalize_text(text)
+        rule_intents = self._rule_intents(normalized)
+        probabilities = self.model.predict_proba(text)
+        model_intent = max(probabilities, key=probabilities.get)
+        confidence = probabilities[model_intent]
+
+        if len(rule_intents) > 1:
+            # e.g. "hi, what's the weather?" - let the root agent prioritise
+            decision = IntentDecision("mixed", confidence, None, "rules")
+        elif len(rule_intents) == 1:
+            intent = next(iter(rule_intents))
+            # Rules and model agree: trust it; rules alone: trust the unambiguous small-talk rules only
+            if model_intent == intent:
+                confidence = max(confidence, 0.95)
+            elif intent in ("greeting", "farewell"):
+                confidence = 0.9
+            else:
+                confidence = probabilities.get(intent, 0.0)
+            decision = IntentDecision(intent, confidence, ROUTED_AGENTS.get(intent), "rules")
+        else:
+            decision = IntentDecision(model_intent, confidence, ROUTED_AGENTS.get(model_intent), "model")
+
+        if decision.agent_name is not None and decision.confidence < self.threshold:
+            decision.agent_name = None
+        if decision.agent_name in ("time_agent", "forecast_agent"):
+            if _MULTI_CITY.search(normalized) or _CITY_LIST.search(text) or len(_cities_in(text)) > 1:
+                decision.agent_name, decision.source = None, "multi_city"
+            elif _FOLLOW_UP.search(normalized) and not _cities_in(text):
+                decision.agent_name, decision.source = None, "follow_up"
+        if decision.routed:
+            self.routes[decision.intent] += 1
+        else:
+            self.fallbacks += 1
+        self.classify_seconds += time.perf_counter() - started
+        return decision
+
+    def stats(self) -> dict:
+        total = sum(self.routes.values()) + self.fallbacks
+        return {
+            "enabled": True,
+            "threshold": self.threshold,
+            "routed": dict(self.routes),
+            "fallbacks": self.fallbacks,
+            "routed_ratio": sum(self.routes.values()) / total if total else 0.0,
+            "mean_classify_ms": 1000 * self.classify_seconds / total if total else 0.0,
+        }
+
+
+def _cities_in(text: str) -> List[str]:
+    from .timezones import timezone_resolver
+
+    return timezone_resolver.find_cities(text)
+
+
+def build_router(threshold: float = INTENT_CONFIDENCE_THRESHOLD) -> IntentRouter:
+    """Trains the model on the seed phrases and returns a ready router."""
+    samples = [(phrase, intent) for intent, phrases in SEED_PHRASES.items() for phrase in phrases]
+    return IntentRouter(NaiveBayesIntentModel().fit(samples), threshold)
+
+
+class _StateContext:
+    """Minimal stand-in for ToolContext; say_hello/say_goodbye only read state."""
+
+    def __init__(self, state: dict):
+        self.state = state
+
+
+def local_answer(intent: str, state: dict) -> Optional[str]:
+    """Answers greetings and farewells without any model call.
+
+    Args:
+        intent (str): "greeting" or "farewell".
+        state (dict): The session state (for the preferred language).
+
+    Returns:
+        str: The reply, or None if the intent needs an agent.
+    """
+    from .agent import say_goodbye, say_hello
+
+    if intent == "greeting":
+        return say_hello(tool_context=_StateContext(state))
+    if intent == "farewell":
+        return say_goodbye(tool_context=_StateContext(state))
+    return None
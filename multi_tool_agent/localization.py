@@ -0,0 +1,181 @@
+"""Localized messages and date formatting for the agent tools.
+
+Each supported language has one catalog: its message templates plus the
+day and month names used in dates. Everything is built at import and
+only read afterwards, so tools never call `locale.setlocale` (which
+changes process-wide state and races between concurrent tool calls).
+Adding a language means adding one entry to `CATALOGS`.
+"""
+
+import datetime
+from typing import Callable, Dict, Sequence
+
+DEFAULT_LANGUAGE = "English"
+
+MESSAGES: Dict[str, Dict[str, str]] = {
+    "English": {
+        "hello": "Hello, {name}!",
+        "goodbye": "Goodbye! Have a great day.",
+        "city_not_found": "City '{city}' not found.",
+        "weather_report": "The current weather in {city} is {description} with a temperature of {temperature}.",
+        "weather_api_error": "Weather information for '{city}' is not available. API error: {error}",
+        "weather_error": "Error retrieving weather for '{city}': {error}",
+        "forecast_header": "Weather forecast for {city} for the next {days} days:\n\n",
+        "forecast_line": "• {date}: {weather}, {low} to {high} (around {temperature}), {pop}% chance of precipitation\n",
+        "forecast_empty": "No forecast data available for upcoming days in {city}.",
+        "forecast_api_error": "Weather forecast for '{city}' is not available. API error: {error}",
+        "forecast_error": "Error retrieving forecast for '{city}': {error}",
+        "upstream_busy": "The weather service is busy right now, so '{city}' could not be looked up. Please try again in about {seconds} seconds.",
+        "stale_data_note": "\n(The weather service is not responding, so this is the latest data available, from {age} ago.)",
+        "age_minutes": "{count} minutes",
+        "age_hours": "{count} hours",
+        "age_days": "{count} days",
+        "timezone_unknown": "Sorry, I don't have timezone information for {city}. Try a major city.",
+        "time_report": "The current time in {city} is {time}",
+        "time_error": "Error retrieving time for '{city}': {error}",
+        "compare_header": "Weather in {count} cities:\n\n",
+        "compare_line": "• {city}: {description}, {temperature}\n",
+        "compare_day_line": "    {date}: {weather}, {low} / {high}\n",
+        "compare_error_line": "• {error}\n",
+        "compare_extremes": "\nWarmest: {warmest} ({warmest_temperature}). Coldest: {coldest} ({coldest_temperature}).\n",
+        "compare_truncated": "\nOnly the first {limit} cities were compared.\n",
+    },
+    "French": {
+        "hello": "Bonjour, {name}!",
+        "goodbye": "Au revoir ! Passez une excellente journée.",
+        "city_not_found": "Ville '{city}' introuvable.",
+        "weather_report": "La météo actuelle à {city} est {description} avec une température de {temperature}.",
+        "weather_api_error": "Les informations météo pour '{city}' ne sont pas disponibles. Erreur API: {error}",
+        "weather_error": "Erreur lors de la récupération de la météo pour '{city}': {error}",
+        "forecast_header": "Prévisions météo pour {city} pour les {days} prochains jours:\n\n",
+        "forecast_line": "• {date}: {weather}, de {low} à {high} (environ {temperature}), {pop}% de risque de précipitations\n",
+        "forecast_empty": "Aucune donnée de prévision disponible pour les prochains jours à {city}.",
+        "forecast_api_error": "Les prévisions météo pour '{city}' ne sont pas disponibles. Erreur API: {error}",
+        "forecast_error": "Erreur lors de la récupération des prévisions pour '{city}': {error}",
+        "upstream_busy": "Le service météo est surchargé, '{city}' n'a pas pu être consultée. Réessayez dans environ {seconds} secondes.",
+        "stale_data_note": "\n(Le service météo ne répond pas : voici les dernières données disponibles, datant d'il y a {age}.)",
+        "age_minutes": "{count} minutes",
+        "age_hours": "{count} heures",
+        "age_days": "{count} jours",
+        "timezone_unknown": "Désolé, je n'ai pas d'informations sur le fuseau horaire pour {city}. Essayez une ville principale.",
+        "time_report": "L'heure actuelle à {city} est {time}",
+        "time_error": "Erreur lors de la récupération de l'heure pour '{city}': {error}",
+        "compare_header": "Météo dans {count} villes:\n\n",
+        "compare_line": "• {city}: {description}, {temperature}\n",
+        "compare_day_line": "    {date}: {weather}, min. {low} / max. {high}\n",
+        "compare_error_line": "• {error}\n",
+        "compare_extremes": "\nLa plus chaude: {warmest} ({warmest_temperature}). La plus froide: {coldest} ({coldest_temperature}).\n",
+        "compare_truncated": "\nSeules les {limit} premières villes ont été comparées.\n",
+    },
+    "Arabic": {
+        "hello": "مرحباً، {name}!",
+        "goodbye": "مع السلامة! أتمنى لك يوماً رائعاً.",
+        "city_not_found": "لم يتم العثور على المدينة '{city}'.",
+        "weather_report": "الطقس الحالي في {city} هو {description} مع درجة حرارة {temperature}.",
+        "weather_api_error": "معلومات الطقس لـ '{city}' غير متوفرة. خطأ في API: {error}",
+        "weather_error": "خطأ في استرجاع الطقس لـ '{city}': {error}",
+        "forecast_header": "توقعات الطقس لـ {city} للأيام الـ {days} القادمة:\n\n",
+        "forecast_line": "• {date}: {weather}، من {low} إلى {high} (حوالي {temperature})، احتمال هطول {pop}%\n",
+        "forecast_empty": "لا تتوفر بيانات توقعات للأيام القادمة في {city}.",
+        "forecast_api_error": "توقعات الطقس لـ '{city}' غير متوفرة. خطأ في API: {error}",
+        "forecast_error": "خطأ في استرجاع التوقعات لـ '{city}': {error}",
+        "upstream_busy": "خدمة الطقس مشغولة حالياً، تعذر البحث عن '{city}'. يرجى المحاولة مرة أخرى بعد حوالي {seconds} ثانية.",
+        "stale_data_note": "\n(خدمة الطقس لا تستجيب، هذه آخر البيانات المتوفرة، منذ {age}.)",
+        "age_minutes": "{count} دقيقة",
+        "age_hours": "{count} ساعة",
+        "age_days": "{count} يوم",
+        "timezone_unknown": "عذراً، ليس لدي معلومات عن المنطقة الزمنية لـ {city}. حاول استخدام مدينة رئيسية.",
+        "time_report": "الوقت الحالي في {city} هو {time}",
+        "time_error": "خطأ في استرجاع الوقت لـ '{city}': {error}",
+        "compare_header": "الطقس في {count} مدن:\n\n",
+        "compare_line": "• {city}: {description}، {temperature}\n",
+        "compare_day_line": "    {date}: {weather}، الصغرى {low} / العظمى {high}\n",
+        "compare_error_line": "• {error}\n",
+        "compare_extremes": "\nالأدفأ: {warmest} ({warmest_temperature}). الأبرد: {coldest} ({coldest_temperature}).\n",
+        "compare_truncated": "\nتمت مقارنة أول {limit} مدن فقط.\n",
+    },
+}
+
+# Monday first, matching date.weekday()
+DAY_NAMES: Dict[str, Sequence[str]] = {
+    "English": ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"),
+    "French": ("lundi", "mardi", "mercredi", "jeudi", "vendredi", "samedi", "dimanche"),
+    "Arabic": ("الاثنين", "الثلاثاء", "الأربعاء", "الخميس", "الجمعة", "السبت", "الأحد"),
+}
+
+# Index 0 unused so date.month indexes directly
+MONTH_NAMES: Dict[str, Sequence[str]] = {
+    "English": ("", "January", "February", "March", "April", "May", "June", "July",
+                "August", "September", "October", "November", "December"),
+    "French": ("", "janvier", "février", "mars", "avril", "mai", "juin", "juillet",
+               "août", "septembre", "octobre", "novembre", "décembre"),
+    "Arabic": ("", "يناير", "فبراير", "مارس", "أبريل", "مايو", "يونيو", "يوليو",
+               "أغسطس", "سبتمبر", "أكتوبر", "نوفمبر", "ديسمبر"),
+}
+
+# Layouts use only numeric strftime codes, which do not depend on the C locale
+DAY_LABEL_FORMATS = {
+    "English": "{weekday}, {month} {day:02d}",  # Monday, July 10
+    "French": "{weekday} {day:02d} {month}",  # lundi 10 juillet
+    "Arabic": "{weekday} {day} {month}",  # الاثنين 10 يوليو
+}
+
+TIMESTAMP_FORMATS = {
+    "English": "{date:%Y-%m-%d %H:%M:%S} {zone}",
+    "French": "{date.day:02d} {month} {date.year} {date:%H:%M:%S} {zone}",
+    "Arabic": "{date:%Y-%m-%d %H:%M:%S} {zone}",
+}
+
+
+class Catalog:
+    """Message templates and date tables for one language."""
+
+    __slots__ = ("language", "_templates", "_days", "_months", "_day_label", "_timestamp")
+
+    def __init__(self, language: str):
+        fallback = MESSAGES[DEFAULT_LANGUAGE]
+        messages = MESSAGES.get(language, {})
+        self.language = language
+        # Bound str.format methods: no template parsing or dict merging per call
+        self._templates: Dict[str, Callable[..., str]] = {
+            key: messages.get(key, template).format for key, template in fallback.items()
+        }
+        self._days = DAY_NAMES.get(language, DAY_NAMES[DEFAULT_LANGUAGE])
+        self._months = MONTH_NAMES.get(language, MONTH_NAMES[DEFAULT_LANGUAGE])
+        self._day_label = DAY_LABEL_FORMATS.get(language, DAY_LABEL_FORMATS[DEFAULT_LANGUAGE]).format
+        self._timestamp = TIMESTAMP_FORMATS.get(language, TIMESTAMP_FORMATS[DEFAULT_LANGUAGE]).format
+
+    def message(self, key: str, **fields) -> str:
+        """Renders a message template, e.g. message("city_not_found", city="Paris")."""
+        return self._templates[key](**fields)
+
+    def day_label(self, date: datetime.date) -> str:
+        """Weekday, day and month, as used for forecast days."""
+        return self._day_label(weekday=self._days[date.weekday()], day=date.day, month=self._months[date.month])
+
+    def timestamp(self, moment: datetime.datetime) -> str:
+        """Full date and time including the timezone name and UTC offset."""
+        zone = moment.strftime("%Z%z")
+        return self._timestamp(date=moment, month=self._months[moment.month], zone=zone)
+
+
+CATALOGS: Dict[str, Catalog] = {language: Catalog(language) for language in MESSAGES}
+
+
+def catalog(language: str) -> Catalog:
+    """Returns the catalog for a language, falling back to English.
+
+    Args:
+        language (str): A language name as stored in `user_preference_language`.
+
+    Returns:
+        Catalog: The language's catalog.
+    """
+    return CATALOGS.get(language) or CATALOGS[DEFAULT_LANGUAGE]
+
+
+def format_temperature(celsius: float, unit: str) -> str:
+    """Formats a Celsius reading in the user's preferred unit, e.g. "21.5°C"."""
+    if unit == "Fahrenheit":
+        return f"{celsius * 9 / 5 + 32:.1f}°F"
+    return f"{celsius:.1f}°C"
@@ -0,0 +1,244 @@
+"""In-process metrics in the Prometheus text format.
+
+Counters, gauges and histograms are recorded where the work happens (chat
+turns in the server, model and tool calls in agent callbacks, upstream
+requests in the OWM client) and rendered by `render()` for the /metrics
+endpoint. Values that already live elsewhere, such as cache statistics,
+are copied in at scrape time by collectors registered with
+`add_collector`.
+
+Metrics are kept per process. With several workers, each one exposes its
+own series and Prometheus sums them across instances.
+"""
+
+import bisect
+import threading
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Seconds; spans cached lookups (a few ms) up to slow model calls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+EVENT_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+_INF_BUCKET = 'le="+Inf"'
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class _Buckets:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.bounds, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metric:
+    """A named metric with a fixed set of label names.
+
+    `labels(*values)` returns the child for one combination of label
+    values; metrics without labels can be used directly.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _new_child(self):
+        return _Value()
+
+    def labels(self, *values: str):
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(child.value)}"
+                for key, child in sorted(self._children.items())]
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help_text, labelnames)
+
+    def _new_child(self):
+        return _Buckets(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, child in sorted(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(child.bounds, child.counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, _INF_BUCKET)} {child.count}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(child.sum)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {child.count}")
+        return lines
+
+
+REGISTRY: List[Metric] = []
+_collectors: List[Callable[[], None]] = []
+
+
+def add_collector(collector: Callable[[], None]) -> None:
+    """Registers a function that updates metrics just before each scrape."""
+    _collectors.append(collector)
+
+
+def render() -> str:
+    """Renders every registered metric in the Prometheus text exposition format."""
+    for collector in _collectors:
+        collector()
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Chat turns (agent_server.py)
+CHAT_TURN_SECONDS = Histogram(
+    "chat_turn_duration_seconds", "Wall time of one chat turn.", ("endpoint", "outcome"))
+CHAT_TURN_EVENTS = Histogram(
+    "chat_turn_events", "Runner events produced by one chat turn.", ("endpoint",), buckets=EVENT_BUCKETS)
+CHAT_TURNS_IN_FLIGHT = Gauge(
+    "chat_turns_in_flight", "Chat turns currently being processed.", ("endpoint",))
+
+# Admission control (admission.py); queue depth and running turns are copied at scrape time
+CHAT_QUEUE_WAIT_SECONDS = Histogram(
+    "chat_queue_wait_seconds", "Time a chat turn waited for its session and a free slot.", ("endpoint",))
+CHAT_TURNS_REJECTED = Counter(
+    "chat_turns_rejected_total", "Chat turns rejected by admission control, by reason.", ("endpoint", "reason"))
+CHAT_TURNS_QUEUED = Gauge(
+    "chat_turns_queued", "Chat turns waiting for their session or a free slot.")
+CHAT_TURNS_RUNNING = Gauge(
+    "chat_turns_running", "Chat turns holding one of the worker's slots.")
+CHAT_TURN_SLOTS = Gauge(
+    "chat_turn_slots", "Chat turns the worker runs at once (CHAT_MAX_CONCURRENT, 0 for no limit).")
+
+# Agents and tools (agent.py callbacks)
+LLM_CALL_SECONDS = Histogram(
+    "agent_llm_call_duration_seconds", "Latency of one model call, by calling agent.", ("agent",))
+LLM_CALLS_SKIPPED = Counter(
+    "agent_llm_calls_skipped_total", "Model calls replaced by a direct tool answer.", ("agent",))
+TOOL_CALL_SECONDS = Histogram(
+    "tool_call_duration_seconds", "Latency of one tool call.", ("tool",))
+TOOL_CALLS = Counter(
+    "tool_calls_total", "Tool calls by result status (success or error).", ("tool", "status"))
+
+# Upstream requests (owm_client.py)
+OWM_REQUEST_SECONDS = Histogram(
+    "owm_request_duration_seconds", "Latency of OpenWeatherMap requests; status is the HTTP code or 'error'.",
+    ("endpoint", "status"))
+
+# OpenWeatherMap quota scheduler (upstream_scheduler.py); queue depth and tokens are copied at scrape time
+OWM_QUEUE_WAIT_SECONDS = Histogram(
+    "owm_queue_wait_seconds", "Time an OpenWeatherMap request waited for quota, by priority lane.", ("lane",))
+OWM_REQUESTS_SHED = Counter(
+    "owm_requests_shed_total", "OpenWeatherMap requests dropped for lack of quota, by lane and reason.",
+    ("lane", "reason"))
+OWM_RATE_LIMITED = Counter(
+    "owm_rate_limited_total", "429 answers from OpenWeatherMap; each pauses all upstream traffic for Retry-After.")
+OWM_REQUESTS_QUEUED = Gauge(
+    "owm_requests_queued", "OpenWeatherMap requests waiting for quota, by priority lane.", ("lane",))
+OWM_QUOTA_TOKENS = Gauge(
+    "owm_quota_tokens", "OpenWeatherMap calls that can be made right now without waiting.")
+
+# Latency budgets, hedging and circuit breakers (upstream_guard.py); breaker state is copied at scrape time
+OWM_CALL_FAILURES = Counter(
+    "owm_call_failures_total",
+    "OpenWeatherMap calls that failed: budget, connection, server_error or circuit_open.", ("endpoint", "reason"))
+OWM_HEDGED_REQUESTS = Counter(
+    "owm_hedged_requests_total", "Hedge requests sent for slow OpenWeatherMap calls, by which request answered first.",
+    ("endpoint", "winner"))
+OWM_CIRCUIT_OPEN = Gauge(
+    "owm_circuit_open", "1 while the endpoint's circuit breaker is open or half-open, else 0.", ("endpoint",))
+
+# Caches, copied from their stats() at scrape time
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total", "Cache lookups by outcome, as counted by the cache.", ("cache", "result"))
+CACHE_HIT_RATIO = Gauge(
+    "cache_hit_ratio", "Share of cache lookups answered without an upstream call since start.", ("cache",))
+CACHE_ENTRIES = Gauge(
+    "cache_entries", "Entries held in the in-process cache.", ("cache",))
@@ -0,0 +1,244 @@
+"""Shared async client for the OpenWeatherMap API.
+
+All weather tools go through this module so that upstream calls reuse one
+pooled keep-alive connection set and never block the event loop. Every
+request first waits for quota from `owm_scheduler` (see
+upstream_scheduler.py); a 429 pauses the scheduler for its Retry-After
+and the request is retried once behind the pause if its lane can wait
+that long. Each call then runs under its endpoint's guard (see
+upstream_guard.py): a latency budget, a hedge request when it is slow,
+and a circuit breaker.
+"""
+
+import asyncio
+import email.utils
+import logging
+import math
+import os
+import time
+from typing import Any, Optional
+
+import httpx
+
+from .metrics import OWM_CALL_FAILURES, OWM_HEDGED_REQUESTS, OWM_REQUEST_SECONDS
+from .tracing import span
+from .upstream_guard import EndpointGuard, guards
+from .upstream_scheduler import QuotaExceeded, owm_scheduler
+
+logger = logging.getLogger(__name__)
+
+OWM_BASE_URL = os.environ.get("OWM_BASE_URL", "http://api.openweathermap.org")
+OWM_TIMEOUT_SECONDS = float(os.environ.get("OWM_TIMEOUT_SECONDS", "5"))
+OWM_CONNECT_TIMEOUT_SECONDS = float(os.environ.get("OWM_CONNECT_TIMEOUT_SECONDS", "2"))
+OWM_MAX_CONNECTIONS = int(os.environ.get("OWM_MAX_CONNECTIONS", "100"))
+OWM_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("OWM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+
+GEOCODE_PATH = "/geo/1.0/direct"
+FORECAST_PATH = "/data/2.5/forecast"
+
+
+class OWMError(Exception):
+    """Raised when OpenWeatherMap answers with a non-200 status."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+
+class OWMUnavailable(OWMError):
+    """Raised when OpenWeatherMap cannot answer: budget spent, connection failed, 5xx, or circuit open.
+
+    Attributes:
+        retry_after (int): Suggested seconds before trying again.
+    """
+
+    def __init__(self, retry_after: int, message: str, status_code: int = 503):
+        super().__init__(status_code, message)
+        self.retry_after = retry_after
+
+
+class OWMRateLimited(OWMUnavailable):
+    """Raised when the call quota is used up: shed locally, or answered 429 twice."""
+
+    def __init__(self, retry_after: int, message: str):
+        super().__init__(retry_after, message, 429)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Reads a Retry-After header, given in seconds or as an HTTP date; None when absent or invalid."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Returns the process-wide client, creating it for the running loop if needed."""
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            base_url=OWM_BASE_URL,
+            timeout=httpx.Timeout(OWM_TIMEOUT_SECONDS, connect=OWM_CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=OWM_MAX_CONNECTIONS,
+                max_keepalive_connections=OWM_MAX_KEEPALIVE_CONNECTIONS,
+            ),
+        )
+        _client_loop = loop
+    return _client
+
+
+async def aclose() -> None:
+    """Closes the shared client. Called from the server shutdown hook."""
+    global _client, _client_loop
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+    _client_loop = None
+
+
+async def _get_json(endpoint: str, path: str, params: dict, timeout: Optional[float] = None) -> Any:
+    params = dict(params, appid=os.environ.get("OPENWEATHERMAP_API_KEY"))
+    kwargs = {"timeout": timeout} if timeout is not None else {}
+    guard = guards[endpoint]
+    if not guard.breaker.allow():
+        OWM_CALL_FAILURES.labels(endpoint, "circuit_open").inc()
+        retry_after = max(1, math.ceil(guard.breaker.retry_after()))
+        raise OWMUnavailable(retry_after, f"Service unavailable, retry in {retry_after}s")
+    for attempt in range(2):
+        try:
+            await owm_scheduler.acquire()
+        except QuotaExceeded as e:
+            raise OWMRateLimited(e.retry_after, f"Too many requests, retry in {e.retry_after}s") from None
+        response = await _guarded(guard, path, params, kwargs)
+        if response.status_code != 429 or not owm_scheduler.enabled:
+            break
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        logger.warning("OpenWeatherMap rate limit hit on %s, pausing for %ss", endpoint,
+                       "default" if retry_after is None else f"{retry_after:g}")
+        owm_scheduler.rate_limited_for(retry_after)
+    try:
+        data = response.json()
+    except ValueError:
+        data = {}
+    if response.status_code == 429:
+        retry_after = max(1, math.ceil(owm_scheduler.paused_for()))
+        raise OWMRateLimited(retry_after, f"Too many requests, retry in {retry_after}s")
+    message = data.get("message", "Unknown error") if isinstance(data, dict) else "Unknown error"
+    if response.status_code >= 500:
+        # Counted against the breaker like a timeout, and served from stale data the same way
+        retry_after = max(1, math.ceil(guard.breaker.retry_after()))
+        raise OWMUnavailable(retry_after, f"Service unavailable ({response.status_code}: {message})",
+                             response.status_code)
+    if response.status_code != 200:
+        raise OWMError(response.status_code, message)
+    return data
+
+
+async def _guarded(guard: EndpointGuard, path: str, params: dict, kwargs: dict) -> httpx.Response:
+    """One call within the endpoint's latency budget; timeouts, connection errors and 5xx count against its breaker."""
+    try:
+        response = await asyncio.wait_for(_hedged(guard, path, params, kwargs), guard.budget)
+    except asyncio.TimeoutError:
+        reason, detail = "budget", f"no answer within {guard.budget:g}s"
+    except httpx.TransportError as e:
+        reason, detail = "connection", str(e) or type(e).__name__
+    else:
+        if response.status_code < 500:
+            guard.breaker.record_success()
+        else:
+            guard.failed("server_error")
+            OWM_CALL_FAILURES.labels(guard.endpoint, "server_error").inc()
+        return response
+    guard.failed(reason)
+    OWM_CALL_FAILURES.labels(guard.endpoint, reason).inc()
+    logger.warning("OpenWeatherMap %s call failed (%s), breaker %s", guard.endpoint, detail, guard.breaker.state)
+    retry_after = max(1, math.ceil(guard.breaker.retry_after()))
+    raise OWMUnavailable(retry_after, f"Service not responding ({detail})")
+
+
+async def _hedged(guard: EndpointGuard, path: str, params: dict, kwargs: dict) -> httpx.Response:
+    """Sends the request, and a second one if the first outlives the endpoint's hedge delay; first good answer wins."""
+    first = asyncio.ensure_future(_request(guard, path, params, kwargs))
+    pending = {first}
+    hedged = False
+    try:
+        delay = guard.hedge_delay()
+        if delay is not None:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            # Only with a token to spare: a hedge must never delay another user's call
+            if not done and owm_scheduler.try_acquire():
+                guard.hedged += 1
+                hedged = True
+                pending.add(asyncio.ensure_future(_request(guard, path, params, kwargs)))
+        last = first
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None and task.result().status_code < 500:
+                    if hedged:
+                        winner = "first" if task is first else "hedge"
+                        guard.hedge_wins += winner == "hedge"
+                        OWM_HEDGED_REQUESTS.labels(guard.endpoint, winner).inc()
+                    return task.result()
+                last = task
+        # Every request failed: report the last failure
+        return last.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def _request(guard: EndpointGuard, path: str, params: dict, kwargs: dict) -> httpx.Response:
+    endpoint = guard.endpoint
+    with span(f"owm {endpoint}", endpoint=endpoint) as request_span:
+        started = time.perf_counter()
+        status = "error"  # timeouts and connection failures
+        try:
+            response = await get_client().get(path, params=params, **kwargs)
+            status = str(response.status_code)
+        finally:
+            OWM_REQUEST_SECONDS.labels(endpoint, status).observe(time.perf_counter() - started)
+        guard.latency.record(time.perf_counter() - started)
+        if request_span is not None:
+            request_span.set_attribute("http.status_code", response.status_code)
+    return response
+
+
+async def geocode(city: str, timeout: Optional[float] = None) -> list:
+    """Looks up a city by name.
+
+    Args:
+        city (str): The city name as typed by the user.
+        timeout (float, optional): Per-call timeout in seconds.
+
+    Returns:
+        list: Matching locations (empty when the city is unknown).
+    """
+    return await _get_json("geocode", GEOCODE_PATH, {"q": city, "limit": 1}, timeout)
+
+
+async def fetch_forecast(lat: float, lon: float, timeout: Optional[float] = None) -> dict:
+    """Downloads the 5 day / 3 hour forecast for a coordinate pair, in metric units.
+
+    Args:
+        lat (float): Latitude.
+        lon (float): Longitude.
+        timeout (float, optional): Per-call timeout in seconds.
+
+    Returns:
+        dict: The raw forecast payload.
+    """
+    return await _get_json("forecast", FORECAST_PATH, {"lat": lat, "lon": lon, "units": "metric"}, timeout)
@@ -0,0 +1,179 @@
+"""Background refresh of weather data for frequently requested cities.
+
+The tools report every city they resolve to `hot_cities`, and the server
+registers each session's preferred city (and forgets it again when the
+session is evicted, so cities of sessions that are gone stop taking
+refresh slots). A periodic asyncio task keeps
+the geocode and forecast caches warm for the top cities, refreshing
+forecasts shortly before they expire so interactive turns rarely wait on
+OpenWeatherMap. Each worker tracks and refreshes the cities its own users
+ask for; with a shared store, a forecast another worker already fetched
+for the current slot is read from the store instead of from OpenWeatherMap.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+from .forecast_cache import forecast_cache, forecast_key
+from .geocache import geocode_city, normalize_city
+from .upstream_scheduler import upstream_priority
+
+logger = logging.getLogger(__name__)
+
+REFRESH_INTERVAL_SECONDS = float(os.environ.get("REFRESH_INTERVAL_SECONDS", "60"))
+REFRESH_AHEAD_SECONDS = float(os.environ.get("REFRESH_AHEAD_SECONDS", "600"))
+REFRESH_TOP_CITIES = int(os.environ.get("REFRESH_TOP_CITIES", "50"))
+REFRESH_CONCURRENCY = int(os.environ.get("REFRESH_CONCURRENCY", "4"))
+REFRESH_DECAY = float(os.environ.get("REFRESH_DECAY", "0.9"))
+REFRESH_MAX_TRACKED = int(os.environ.get("REFRESH_MAX_TRACKED", "5000"))
+
+
+class HotCityTracker:
+    """Exponentially decayed request counts per city, plus the preferred cities of live sessions."""
+
+    def __init__(self, decay: float = 0.9, max_tracked: int = 5000):
+        self.decay = decay
+        self.max_tracked = max_tracked
+        self.counts: Counter = Counter()
+        # Preferred city -> number of live sessions preferring it
+        self.preferred: Counter = Counter()
+        self._session_city: Dict[str, str] = {}
+
+    def record(self, city: str) -> None:
+        """Counts one request for a city."""
+        key = normalize_city(city)
+        if key:
+            self.counts[key] += 1
+
+    def mark_preferred(self, city: str, session_id: str) -> None:
+        """Keeps a session's preferred city warm for as long as the session lives."""
+        key = normalize_city(city)
+        if not key or self._session_city.get(session_id) == key:
+            return
+        self.forget_sessions([session_id])
+        self._session_city[session_id] = key
+        self.preferred[key] += 1
+
+    def forget_sessions(self, session_ids: Iterable[str]) -> None:
+        """Releases the preferred cities of sessions that were evicted or replaced."""
+        for session_id in session_ids:
+            key = self._session_city.pop(session_id, None)
+            if key is not None:
+                self.preferred[key] -= 1
+                if self.preferred[key] <= 0:
+                    del self.preferred[key]
+
+    def top(self, limit: int) -> List[str]:
+        """Returns preferred cities first (most shared first), then the most requested ones, up to `limit`."""
+        ranked = [city for city, _ in self.counts.most_common() if city not in self.preferred]
+        preferred = sorted(self.preferred, key=lambda city: (-self.preferred[city], -self.counts.get(city, 0)))
+        return (preferred + ranked)[:limit]
+
+    def age(self) -> None:
+        """Decays counts so yesterday's burst does not pin a city forever."""
+        for city in list(self.counts):
+            self.counts[city] *= self.decay
+            if self.counts[city] < 0.5:
+                del self.counts[city]
+        if len(self.counts) > self.max_tracked:
+            self.counts = Counter(dict(self.counts.most_common(self.max_tracked)))
+
+
+hot_cities = HotCityTracker(REFRESH_DECAY, REFRESH_MAX_TRACKED)
+
+
+class RefreshScheduler:
+    """Periodic task that refreshes forecasts for hot cities ahead of expiry."""
+
+    def __init__(self, tracker: HotCityTracker, interval: float = 60.0, ahead: float = 600.0,
+                 top_cities: int = 50, concurrency: int = 4):
+        self.tracker = tracker
+        self.interval = interval
+        self.ahead = ahead
+        self.top_cities = top_cities
+        self.concurrency = concurrency
+        self.refreshed = 0
+        self.failed = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info("Started weather refresh scheduler (every %ss, top %s cities)",
+                        self.interval, self.top_cities)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh_once()
+            except Exception as e:
+                logger.warning(f"Refresh cycle failed: {str(e)}")
+            self.tracker.age()
+            await asyncio.sleep(self.interval)
+
+    async def refresh_once(self) -> int:
+        """Refreshes every tracked city whose forecast is missing or about to expire.
+
+        Upstream calls go in the scheduler's background lane, behind user
+        turns; cities that cannot get quota in time are left for the next cycle.
+
+        Returns:
+            int: Number of forecasts fetched in this cycle.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        deadline = time.time() + self.ahead
+
+        async def refresh(city: str) -> bool:
+            async with semaphore:
+                geo_data = await geocode_city(city)
+                if not geo_data:
+                    return False
+                key = forecast_key(geo_data[0]["lat"], geo_data[0]["lon"])
+                entry = forecast_cache.peek(key)
+                if entry is not None and entry.expires_at > deadline:
+                    return False
+                # Shielded like the user turns joining the same fetch: cancelling the warm-up or the
+                # scheduler must not cancel the fetch under them
+                await asyncio.shield(forecast_cache.refill(key))
+                return True
+
+        with upstream_priority("background"):
+            results = await asyncio.gather(
+                *(refresh(city) for city in self.tracker.top(self.top_cities)),
+                return_exceptions=True,
+            )
+        fetched = sum(1 for result in results if result is True)
+        self.refreshed += fetched
+        self.failed += sum(1 for result in results if isinstance(result, Exception))
+        return fetched
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "tracked_cities": len(self.tracker.counts),
+            "preferred_cities": len(self.tracker.preferred),
+            "refreshed": self.refreshed,
+            "failed": self.failed,
+        }
+
+
+refresh_scheduler = RefreshScheduler(
+    hot_cities,
+    interval=REFRESH_INTERVAL_SECONDS,
+    ahead=REFRESH_AHEAD_SECONDS,
+    top_cities=REFRESH_TOP_CITIES,
+    concurrency=REFRESH_CONCURRENCY,
+)
@@ -0,0 +1,230 @@
+"""Eviction and memory accounting for session services.
+
+Both session backends mix in `BoundedSessionsMixin`, which tracks every
+session in LRU order together with its event count and serialized event
+size. Sessions idle for longer than SESSION_IDLE_TTL_SECONDS are removed
+by a periodic sweep, the least recently used ones are removed as soon as
+there are more than SESSION_MAX_SESSIONS, and each session keeps at most
+SESSION_MAX_EVENTS events. Trimming starts at a user message, so the
+history a model sees never opens with a dangling tool call or result.
+A value of 0 disables the corresponding limit.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Deque, List, Optional, Sequence, Set, Tuple
+
+from google.adk.events import Event
+from google.adk.sessions import InMemorySessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig
+
+logger = logging.getLogger(__name__)
+
+SESSION_IDLE_TTL_SECONDS = float(os.environ.get("SESSION_IDLE_TTL_SECONDS", "86400"))
+SESSION_MAX_SESSIONS = int(os.environ.get("SESSION_MAX_SESSIONS", "10000"))
+SESSION_MAX_EVENTS = int(os.environ.get("SESSION_MAX_EVENTS", "200"))
+SESSION_SWEEP_INTERVAL_SECONDS = float(os.environ.get("SESSION_SWEEP_INTERVAL_SECONDS", "60"))
+
+SessionKey = Tuple[str, str, str]
+
+
+def event_size(event: Event) -> int:
+    """Serialized size of an event in bytes, as used for memory accounting."""
+    return len(event.model_dump_json(exclude_none=True).encode())
+
+
+def trim_point(authors: Sequence[str], max_events: int) -> int:
+    """Returns how many leading events to drop so at most `max_events` remain.
+
+    The cut is moved forward to the next user message; if the newest
+    `max_events` events contain none, it falls back to a plain cut.
+
+    Args:
+        authors (Sequence[str]): The author of each stored event, oldest first.
+        max_events (int): The per-session cap (0 disables trimming).
+
+    Returns:
+        int: Number of events to drop from the front.
+    """
+    excess = len(authors) - max_events
+    if max_events <= 0 or excess <= 0:
+        return 0
+    for index in range(excess, len(authors)):
+        if authors[index] == "user":
+            return index
+    return excess
+
+
+class SessionUsage:
+    __slots__ = ("last_access", "event_sizes", "event_bytes")
+
+    def __init__(self, last_access: float):
+        self.last_access = last_access
+        self.event_sizes: Deque[int] = deque()
+        self.event_bytes = 0
+
+
+class BoundedSessionsMixin:
+    """LRU, idle-TTL and per-session event limits shared by the session services.
+
+    Subclasses call `_init_limits` from `__init__`, `_touch` whenever a
+    session is created or used, `_record_event`/`_trim` when events are
+    stored, and `_forget` when a session is deleted. `on_evict` is called
+    with the ids of the sessions removed by each sweep or cap enforcement.
+    """
+
+    def _init_limits(self, idle_ttl: float, max_sessions: int, max_events: int) -> None:
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.max_events = max_events
+        self.pinned: Set[str] = set()
+        self.on_evict: Optional[Callable[[List[str]], None]] = None
+        self._usage: "OrderedDict[SessionKey, SessionUsage]" = OrderedDict()
+        self.limit_counters = {"evicted_idle": 0, "evicted_lru": 0, "trimmed_events": 0}
+
+    def _touch(self, key: SessionKey, now: Optional[float] = None) -> SessionUsage:
+        usage = self._usage.get(key)
+        if usage is None:
+            usage = self._usage[key] = SessionUsage(time.time() if now is None else now)
+        else:
+            usage.last_access = time.time() if now is None else now
+            self._usage.move_to_end(key)
+        return usage
+
+    def _forget(self, key: SessionKey) -> None:
+        self._usage.pop(key, None)
+
+    def _record_event(self, key: SessionKey, size: int) -> None:
+        usage = self._touch(key)
+        usage.event_sizes.append(size)
+        usage.event_bytes += size
+
+    def _trim(self, key: SessionKey, events: List[Event]) -> int:
+        """Drops the oldest events of a stored session beyond the cap, in place."""
+        if self.max_events <= 0 or len(events) <= self.max_events:
+            return 0
+        dropped = trim_point([event.author for event in events], self.max_events)
+        if dropped:
+            del events[:dropped]
+            usage = self._usage.get(key)
+            if usage is not None:
+                for _ in range(min(dropped, len(usage.event_sizes))):
+                    usage.event_bytes -= usage.event_sizes.popleft()
+            self.limit_counters["trimmed_events"] += dropped
+        return dropped
+
+    def _evict(self, keys: List[SessionKey], reason: str) -> None:
+        for app_name, user_id, session_id in keys:
+            self.delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+        self.limit_counters[reason] += len(keys)
+        if keys and self.on_evict is not None:
+            self.on_evict([key[2] for key in keys])
+
+    def _enforce_max_sessions(self) -> int:
+        if self.max_sessions <= 0 or len(self._usage) <= self.max_sessions:
+            return 0
+        excess = len(self._usage) - self.max_sessions
+        victims = [key for key in self._usage if key[2] not in self.pinned][:excess]
+        self._evict(victims, "evicted_lru")
+        return len(victims)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Evicts idle sessions and enforces the session cap. Returns the eviction count."""
+        now = time.time() if now is None else now
+        idle = []
+        if self.idle_ttl > 0:
+            for key, usage in self._usage.items():
+                if now - usage.last_access <= self.idle_ttl:
+                    break  # LRU order: everything after this was used more recently
+                if key[2] not in self.pinned:
+                    idle.append(key)
+        self._evict(idle, "evicted_idle")
+        return len(idle) + self._enforce_max_sessions()
+
+    def usage_stats(self) -> dict:
+        return dict(
+            self.limit_counters,
+            sessions=len(self._usage),
+            events=sum(len(usage.event_sizes) for usage in self._usage.values()),
+            event_bytes=sum(usage.event_bytes for usage in self._usage.values()),
+            idle_ttl_seconds=self.idle_ttl,
+            max_sessions=self.max_sessions,
+            max_events_per_session=self.max_events,
+        )
+
+
+class BoundedInMemorySessionService(BoundedSessionsMixin, InMemorySessionService):
+    """InMemorySessionService with session eviction and per-session event caps."""
+
+    def __init__(self, idle_ttl: float = 86400.0, max_sessions: int = 10000, max_events: int = 200):
+        super().__init__()
+        self._init_limits(idle_ttl, max_sessions, max_events)
+
+    def create_session(self, *, app_name: str, user_id: str, state=None, session_id=None) -> Session:
+        session = super().create_session(app_name=app_name, user_id=user_id, state=state, session_id=session_id)
+        key = (app_name, user_id, session.id)
+        self._forget(key)
+        self._touch(key)
+        self._enforce_max_sessions()
+        return session
+
+    def get_session(self, *, app_name: str, user_id: str, session_id: str,
+                    config: Optional[GetSessionConfig] = None) -> Optional[Session]:
+        session = super().get_session(app_name=app_name, user_id=user_id, session_id=session_id, config=config)
+        if session is not None:
+            self._touch((app_name, user_id, session_id))
+        return session
+
+    def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        # Skips the base class' deep copy of the session just to test that it exists
+        self.sessions.get(app_name, {}).get(user_id, {}).pop(session_id, None)
+        self._forget((app_name, user_id, session_id))
+
+    def append_event(self, session: Session, event: Event) -> Event:
+        super().append_event(session=session, event=event)
+        if event.partial:
+            return event
+        key = (session.app_name, session.user_id, session.id)
+        stored_session = self.sessions.get(session.app_name, {}).get(session.user_id, {}).get(session.id)
+        if stored_session is not None:
+            self._record_event(key, event_size(event))
+            self._trim(key, stored_session.events)
+        return event
+
+    def stats(self) -> dict:
+        return dict(self.usage_stats(), backend="memory")
+
+
+class SessionSweeper:
+    """Periodic task that runs the session service's idle sweep."""
+
+    def __init__(self, service: BoundedSessionsMixin, interval: float = 60.0):
+        self.service = service
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                evicted = self.service.sweep()
+                if evicted:
+                    logger.info(f"Evicted {evicted} idle or excess sessions")
+            except Exception as e:
+                logger.warning(f"Session sweep failed: {str(e)}")
@@ -0,0 +1,315 @@
+"""ADK session service on top of the shared store (Redis or LocalStore).
+
+Every worker reads and writes the same keys, so any worker can serve any
+turn of any session. Per session:
+
+    <prefix>session:<app>:<user>:<id>:meta    hash: last_update_time, events, bytes
+    <prefix>session:<app>:<user>:<id>:state   hash: one field per state key (JSON)
+    <prefix>session:<app>:<user>:<id>:events  list: events as JSON, oldest first
+
+plus app/user state hashes, a sorted set of all sessions scored by last
+access (used for idle and LRU eviction across workers), and a usage hash
+with shared event/byte totals and eviction counters. Each operation is a
+single pipelined round trip, apart from trimming a session that has just
+gone over its event cap. Appending an event is one script, so a session
+evicted by another worker at the same moment is never written back.
+"""
+
+import json
+import logging
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, Session, State
+from google.adk.sessions.base_session_service import (
+    GetSessionConfig,
+    ListEventsResponse,
+    ListSessionsResponse,
+)
+
+from .session_limits import trim_point
+from .shared_store import register_script, shared_key
+
+logger = logging.getLogger(__name__)
+
+SessionKey = Tuple[str, str, str]
+
+# KEYS: index, meta, events, usage, then the session, app and user state hashes.
+# ARGV: index member, access time, update time, event size, event payload, then
+# how many session, app and user state fields follow as field/value pairs.
+# Returns the new event count, or -1 when the session is no longer indexed.
+APPEND_EVENT_LUA = """
+if not redis.call("ZSCORE", KEYS[1], ARGV[1]) then
+  return -1
+end
+local arg = 9
+for i = 1, 3 do
+  for _ = 1, tonumber(ARGV[5 + i]) do
+    redis.call("HSET", KEYS[4 + i], ARGV[arg], ARGV[arg + 1])
+    arg = arg + 2
+  end
+end
+redis.call("HSET", KEYS[2], "last_update_time", ARGV[3])
+redis.call("HINCRBY", KEYS[2], "events", 1)
+redis.call("HINCRBY", KEYS[2], "bytes", ARGV[4])
+redis.call("HINCRBY", KEYS[4], "events", 1)
+redis.call("HINCRBY", KEYS[4], "event_bytes", ARGV[4])
+redis.call("ZADD", KEYS[1], "XX", ARGV[2], ARGV[1])
+return redis.call("RPUSH", KEYS[3], ARGV[5])
+"""
+
+
+def _append_event_locally(store, keys: List[str], args: List[str]) -> int:
+    """APPEND_EVENT_LUA for a LocalStore."""
+    index, meta, events_key, usage, *state_keys = keys
+    member, accessed, updated, size, payload, *rest = args
+    if store.zscore(index, member) is None:
+        return -1
+    fields = rest[3:]
+    for state_key, count in zip(state_keys, map(int, rest[:3])):
+        pairs, fields = fields[:2 * count], fields[2 * count:]
+        if pairs:
+            store.hset(state_key, mapping=dict(zip(pairs[::2], pairs[1::2])))
+    store.hset(meta, "last_update_time", updated)
+    store.hincrby(meta, "events", 1)
+    store.hincrby(meta, "bytes", int(size))
+    store.hincrby(usage, "events", 1)
+    store.hincrby(usage, "event_bytes", int(size))
+    store.zadd(index, {member: float(accessed)}, xx=True)
+    return store.rpush(events_key, payload)
+
+
+class StoreSessionService(BaseSessionService):
+    """Session service whose state lives entirely in the shared store."""
+
+    def __init__(self, store, idle_ttl: float = 86400.0, max_sessions: int = 10000, max_events: int = 200):
+        self.store = store
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.max_events = max_events
+        self.pinned: Set[str] = set()
+        self.on_evict: Optional[Callable[[List[str]], None]] = None
+        self._index = shared_key("sessions")
+        self._usage = shared_key("session_usage")
+        self._append = register_script(store, APPEND_EVENT_LUA, _append_event_locally)
+
+    # -- keys -------------------------------------------------------------
+
+    @staticmethod
+    def _member(key: SessionKey) -> str:
+        return json.dumps(key)
+
+    @staticmethod
+    def _keys(key: SessionKey) -> Tuple[str, str, str]:
+        base = shared_key("session", *key)
+        return base + ":meta", base + ":state", base + ":events"
+
+    @staticmethod
+    def _app_state_key(app_name: str) -> str:
+        return shared_key("app_state", app_name)
+
+    @staticmethod
+    def _user_state_key(app_name: str, user_id: str) -> str:
+        return shared_key("user_state", app_name, user_id)
+
+    # -- BaseSessionService ---------------------------------------------
+
+    def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        session_id = session_id.strip() if session_id and session_id.strip() else str(uuid.uuid4())
+        key = (app_name, user_id, session_id)
+        session = Session(app_name=app_name, user_id=user_id, id=session_id, state=state or {},
+                          last_update_time=time.time())
+
+        # Same semantics as InMemorySessionService: an existing id is replaced
+        self.delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+        meta, state_key, _ = self._keys(key)
+        pipe = self.store.pipeline(transaction=False)
+        pipe.hset(meta, mapping={"last_update_time": session.last_update_time, "events": 0, "bytes": 0})
+        if session.state:
+            pipe.hset(state_key, mapping={name: json.dumps(value) for name, value in session.state.items()})
+        pipe.zadd(self._index, {self._member(key): session.last_update_time})
+        pipe.hgetall(self._app_state_key(app_name))
+        pipe.hgetall(self._user_state_key(app_name, user_id))
+        results = pipe.execute()
+        self._enforce_max_sessions()
+        return self._merge_state(session, results[-2], results[-1])
+
+    def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        key = (app_name, user_id, session_id)
+        meta, state_key, events_key = self._keys(key)
+        start = -config.num_recent_events if config and config.num_recent_events else 0
+        pipe = self.store.pipeline(transaction=False)
+        pipe.hget(meta, "last_update_time")
+        pipe.hgetall(state_key)
+        pipe.lrange(events_key, start, -1)
+        pipe.hgetall(self._app_state_key(app_name))
+        pipe.hgetall(self._user_state_key(app_name, user_id))
+        pipe.zadd(self._index, {self._member(key): time.time()}, xx=True)
+        updated, state, payloads, app_state, user_state, _ = pipe.execute()
+        if updated is None:
+            return None
+
+        events = [Event.model_validate_json(payload) for payload in payloads]
+        if config and config.after_timestamp:
+            events = [event for event in events if event.timestamp >= config.after_timestamp]
+        session = Session(app_name=app_name, user_id=user_id, id=session_id,
+                          state={name: json.loads(value) for name, value in state.items()},
+                          events=events, last_update_time=float(updated))
+        return self._merge_state(session, app_state, user_state)
+
+    def _merge_state(self, session: Session, app_state: Dict[str, str], user_state: Dict[str, str]) -> Session:
+        for name, value in app_state.items():
+            session.state[State.APP_PREFIX + name] = json.loads(value)
+        for name, value in user_state.items():
+            session.state[State.USER_PREFIX + name] = json.loads(value)
+        return session
+
+    def list_sessions(self, *, app_name: str, user_id: str) -> ListSessionsResponse:
+        keys = [tuple(json.loads(member)) for member in self.store.zrange(self._index, 0, -1)]
+        keys = [key for key in keys if key[0] == app_name and key[1] == user_id]
+        pipe = self.store.pipeline(transaction=False)
+        for key in keys:
+            pipe.hget(self._keys(key)[0], "last_update_time")
+        return ListSessionsResponse(sessions=[
+            Session(app_name=app_name, user_id=user_id, id=key[2], last_update_time=float(updated))
+            for key, updated in zip(keys, pipe.execute()) if updated is not None
+        ])
+
+    def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        self._delete((app_name, user_id, session_id))
+
+    def _delete(self, key: SessionKey) -> bool:
+        """Removes a session and its share of the usage totals. Returns False if it was already gone."""
+        meta = self._keys(key)[0]
+        events, size = self.store.hmget(meta, ["events", "bytes"])
+        pipe = self.store.pipeline(transaction=False)
+        pipe.zrem(self._index, self._member(key))
+        pipe.delete(*self._keys(key))
+        removed = pipe.execute()[0]
+        if removed and events is not None:
+            pipe.hincrby(self._usage, "events", -int(events))
+            pipe.hincrby(self._usage, "event_bytes", -int(size))
+            pipe.execute()
+        return bool(removed)
+
+    def list_events(self, *, app_name: str, user_id: str, session_id: str) -> ListEventsResponse:
+        payloads = self.store.lrange(self._keys((app_name, user_id, session_id))[2], 0, -1)
+        return ListEventsResponse(events=[Event.model_validate_json(payload) for payload in payloads])
+
+    def append_event(self, session: Session, event: Event) -> Event:
+        # Update the caller's copy
+        super().append_event(session=session, event=event)
+        session.last_update_time = event.timestamp
+        if event.partial:
+            return event
+
+        key = (session.app_name, session.user_id, session.id)
+        meta, state_key, events_key = self._keys(key)
+        payload = event.model_dump_json(exclude_none=True)
+        size = len(payload.encode())
+
+        session_delta, app_delta, user_delta = {}, {}, {}
+        if event.actions and event.actions.state_delta:
+            for name, value in event.actions.state_delta.items():
+                if name.startswith(State.APP_PREFIX):
+                    app_delta[name.removeprefix(State.APP_PREFIX)] = json.dumps(value)
+                elif name.startswith(State.USER_PREFIX):
+                    user_delta[name.removeprefix(State.USER_PREFIX)] = json.dumps(value)
+                elif not name.startswith(State.TEMP_PREFIX):
+                    session_delta[name] = json.dumps(value)
+        deltas = (session_delta, app_delta, user_delta)
+        args = [self._member(key), time.time(), event.timestamp, size, payload]
+        args += [len(delta) for delta in deltas]
+        args += [item for delta in deltas for pair in delta.items() for item in pair]
+        # The existence check and the writes run as one script: writing to a session that was
+        # evicted or deleted would recreate keys no index entry points to, which sweep could
+        # then never remove
+        length = self._append(
+            [self._index, meta, events_key, self._usage, state_key,
+             self._app_state_key(session.app_name), self._user_state_key(session.app_name, session.user_id)],
+            args,
+        )
+        if length < 0:
+            logger.warning("Dropping event for session %s, which no longer exists", session.id)
+            return event
+
+        if self.max_events > 0 and length > self.max_events:
+            self._trim(key, events_key, meta)
+        return event
+
+    def _trim(self, key: SessionKey, events_key: str, meta: str) -> None:
+        payloads = self.store.lrange(events_key, 0, -1)
+        dropped = trim_point([json.loads(payload).get("author") for payload in payloads], self.max_events)
+        if not dropped:
+            return
+        size = sum(len(payload.encode()) for payload in payloads[:dropped])
+        pipe = self.store.pipeline(transaction=False)
+        pipe.ltrim(events_key, dropped, -1)
+        pipe.hincrby(meta, "events", -dropped)
+        pipe.hincrby(meta, "bytes", -size)
+        pipe.hincrby(self._usage, "events", -dropped)
+        pipe.hincrby(self._usage, "event_bytes", -size)
+        pipe.hincrby(self._usage, "trimmed_events", dropped)
+        pipe.execute()
+
+    # -- eviction ---------------------------------------------------------
+
+    def _evict(self, keys: List[SessionKey], reason: str) -> int:
+        # zrem decides the winner when several workers sweep at once
+        evicted = [key for key in keys if key[2] not in self.pinned and self._delete(key)]
+        if evicted:
+            self.store.hincrby(self._usage, reason, len(evicted))
+            if self.on_evict is not None:
+                self.on_evict([key[2] for key in evicted])
+        return len(evicted)
+
+    def _enforce_max_sessions(self) -> int:
+        if self.max_sessions <= 0:
+            return 0
+        excess = self.store.zcard(self._index) - self.max_sessions
+        if excess <= 0:
+            return 0
+        members = self.store.zrange(self._index, 0, excess + len(self.pinned) - 1)
+        victims = [tuple(json.loads(member)) for member in members]
+        return self._evict([key for key in victims if key[2] not in self.pinned][:excess], "evicted_lru")
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Evicts idle sessions and enforces the session cap. Returns the eviction count."""
+        now = time.time() if now is None else now
+        evicted = 0
+        if self.idle_ttl > 0:
+            members = self.store.zrangebyscore(self._index, "-inf", now - self.idle_ttl)
+            evicted += self._evict([tuple(json.loads(member)) for member in members], "evicted_idle")
+        return evicted + self._enforce_max_sessions()
+
+    def stats(self) -> dict:
+        pipe = self.store.pipeline(transaction=False)
+        pipe.hgetall(self._usage)
+        pipe.zcard(self._index)
+        usage, sessions = pipe.execute()
+        counters = {name: int(usage.get(name, 0)) for name in
+                    ("evicted_idle", "evicted_lru", "trimmed_events", "events", "event_bytes")}
+        return dict(
+            counters,
+            sessions=sessions,
+            idle_ttl_seconds=self.idle_ttl,
+            max_sessions=self.max_sessions,
+            max_events_per_session=self.max_events,
+            backend="shared",
+        )
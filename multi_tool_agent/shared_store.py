@@ -0,0 +1,304 @@
+"""Key-value store shared by every worker process.
+
+With SHARED_STORE_URL set to a redis:// (or rediss://) URL, sessions,
+session names, geocoding results and forecasts live in Redis, so the
+server can run several workers or replicas without sticky routing.
+SHARED_STORE_URL=local selects `LocalStore`, an in-process stand-in with
+the same interface (one process only, useful for tests). Left empty,
+every process keeps its own state as before.
+
+Only the small subset of the redis-py client API used by this package is
+relied on, so `LocalStore` implements exactly that subset. Operations that
+must be atomic across keys are written twice with `register_script`: as a
+Lua script for Redis, and as a Python function that `LocalStore` runs
+under its lock.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SHARED_STORE_URL = os.environ.get("SHARED_STORE_URL", "").strip()
+SHARED_STORE_PREFIX = os.environ.get("SHARED_STORE_PREFIX", "mta:")
+
+
+def _index_range(length: int, start: int, end: int) -> range:
+    """Redis-style inclusive range with negative indexes."""
+    if start < 0:
+        start = max(length + start, 0)
+    end = length + end if end < 0 else min(end, length - 1)
+    return range(start, end + 1)
+
+
+class LocalStore:
+    """Thread-safe in-process implementation of the Redis commands used here."""
+
+    def __init__(self):
+        self._data: Dict[str, Any] = {}
+        self._expires: Dict[str, float] = {}
+        self._lock = threading.RLock()
+
+    def _get(self, key: str, kind: type = None) -> Any:
+        expires = self._expires.get(key)
+        if expires is not None and expires <= time.time():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        value = self._data.get(key)
+        if value is None and kind is not None:
+            value = self._data[key] = kind()
+        return value
+
+    # strings
+
+    def get(self, name: str) -> Optional[str]:
+        with self._lock:
+            return self._get(name)
+
+    def set(self, name: str, value: Any, ex: Optional[float] = None, nx: bool = False) -> Optional[bool]:
+        with self._lock:
+            if nx and self._get(name) is not None:
+                return None
+            self._data[name] = str(value)
+            if ex:
+                self._expires[name] = time.time() + ex
+            else:
+                self._expires.pop(name, None)
+            return True
+
+    def delete(self, *names: str) -> int:
+        with self._lock:
+            removed = 0
+            for name in names:
+                if self._get(name) is not None:
+                    removed += 1
+                self._data.pop(name, None)
+                self._expires.pop(name, None)
+            return removed
+
+    def exists(self, *names: str) -> int:
+        with self._lock:
+            return sum(1 for name in names if self._get(name) is not None)
+
+    def expire(self, name: str, time_seconds: float) -> bool:
+        with self._lock:
+            if self._get(name) is None:
+                return False
+            self._expires[name] = time.time() + time_seconds
+            return True
+
+    # hashes
+
+    def hget(self, name: str, key: str) -> Optional[str]:
+        with self._lock:
+            return (self._get(name) or {}).get(key)
+
+    def hmget(self, name: str, keys: List[str]) -> List[Optional[str]]:
+        with self._lock:
+            values = self._get(name) or {}
+            return [values.get(key) for key in keys]
+
+    def hset(self, name: str, key: Optional[str] = None, value: Any = None,
+             mapping: Optional[Dict[str, Any]] = None) -> int:
+        with self._lock:
+            values = self._get(name, dict)
+            items = dict(mapping or {})
+            if key is not None:
+                items[key] = value
+            added = sum(1 for field in items if field not in values)
+            values.update((field, str(item)) for field, item in items.items())
+            return added
+
+    def hgetall(self, name: str) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._get(name) or {})
+
+    def hdel(self, name: str, *keys: str) -> int:
+        with self._lock:
+            values = self._get(name) or {}
+            return sum(1 for key in keys if values.pop(key, None) is not None)
+
+    def hincrby(self, name: str, key: str, amount: int = 1) -> int:
+        with self._lock:
+            values = self._get(name, dict)
+            result = int(values.get(key, 0)) + amount
+            values[key] = str(result)
+            return result
+
+    def hlen(self, name: str) -> int:
+        with self._lock:
+            return len(self._get(name) or {})
+
+    # lists
+
+    def rpush(self, name: str, *values: Any) -> int:
+        with self._lock:
+            items = self._get(name, list)
+            items.extend(str(value) for value in values)
+            return len(items)
+
+    def lrange(self, name: str, start: int, end: int) -> List[str]:
+        with self._lock:
+            items = self._get(name) or []
+            return [items[index] for index in _index_range(len(items), start, end)]
+
+    def ltrim(self, name: str, start: int, end: int) -> bool:
+        with self._lock:
+            items = self._get(name) or []
+            items[:] = [items[index] for index in _index_range(len(items), start, end)]
+            return True
+
+    def llen(self, name: str) -> int:
+        with self._lock:
+            return len(self._get(name) or [])
+
+    # sorted sets
+
+    def zadd(self, name: str, mapping: Dict[str, float], nx: bool = False, xx: bool = False) -> int:
+        with self._lock:
+            scores = self._get(name, dict)
+            added = 0
+            for member, score in mapping.items():
+                present = member in scores
+                if (nx and present) or (xx and not present):
+                    continue
+                added += not present
+                scores[member] = float(score)
+            return added
+
+    def zrem(self, name: str, *members: str) -> int:
+        with self._lock:
+            scores = self._get(name) or {}
+            return sum(1 for member in members if scores.pop(member, None) is not None)
+
+    def zscore(self, name: str, member: str) -> Optional[float]:
+        with self._lock:
+            return (self._get(name) or {}).get(member)
+
+    def zcard(self, name: str) -> int:
+        with self._lock:
+            return len(self._get(name) or {})
+
+    def _ordered(self, name: str) -> List[str]:
+        scores = self._get(name) or {}
+        return sorted(scores, key=lambda member: (scores[member], member))
+
+    def zrange(self, name: str, start: int, end: int) -> List[str]:
+        with self._lock:
+            members = self._ordered(name)
+            return [members[index] for index in _index_range(len(members), start, end)]
+
+    def zrangebyscore(self, name: str, min: Any, max: Any) -> List[str]:
+        with self._lock:
+            scores = self._get(name) or {}
+            low, high = float(min), float(max)  # accepts "-inf" / "+inf" like Redis
+            return [member for member in self._ordered(name) if low <= scores[member] <= high]
+
+    def pipeline(self, transaction: bool = False) -> "LocalPipeline":
+        return LocalPipeline(self)
+
+
+class LocalPipeline:
+    """Queues commands and runs them together, like a redis-py pipeline."""
+
+    def __init__(self, store: LocalStore):
+        self._store = store
+        self._commands: List[tuple] = []
+
+    def __getattr__(self, command: str):
+        method = getattr(self._store, command)
+
+        def queue(*args, **kwargs):
+            self._commands.append((method, args, kwargs))
+            return self
+        return queue
+
+    def execute(self) -> List[Any]:
+        with self._store._lock:
+            results = [method(*args, **kwargs) for method, args, kwargs in self._commands]
+        self._commands = []
+        return results
+
+
+class SharedMapping(MutableMapping):
+    """A str -> str mapping stored as one hash in the shared store."""
+
+    def __init__(self, store, name: str):
+        self.store = store
+        self.name = name
+
+    def __getitem__(self, key: str) -> str:
+        value = self.store.hget(self.name, key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: str) -> None:
+        self.store.hset(self.name, key, value)
+
+    def __delitem__(self, key: str) -> None:
+        if not self.store.hdel(self.name, key):
+            raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.store.hgetall(self.name))
+
+    def __len__(self) -> int:
+        return self.store.hlen(self.name)
+
+    def items(self):
+        # One round trip instead of one per key
+        return self.store.hgetall(self.name).items()
+
+
+def build_shared_store():
+    """Creates the store selected by SHARED_STORE_URL.
+
+    Returns:
+        A redis-py client, a LocalStore, or None when no shared store is configured.
+    """
+    if not SHARED_STORE_URL:
+        return None
+    if SHARED_STORE_URL == "local":
+        return LocalStore()
+    try:
+        import redis
+    except ImportError as e:
+        raise RuntimeError("SHARED_STORE_URL points at Redis but the 'redis' package is not installed") from e
+    logger.info("Using shared store at %s", SHARED_STORE_URL.split("@")[-1])
+    return redis.Redis.from_url(SHARED_STORE_URL, decode_responses=True)
+
+
+shared_store = build_shared_store()
+
+
+def register_script(store, lua: str, local: Callable[[LocalStore, List[str], List[Any]], Any]
+                    ) -> Callable[[List[str], List[Any]], Any]:
+    """Prepares an operation that runs atomically in one round trip.
+
+    Args:
+        store: A redis-py client or a LocalStore.
+        lua (str): The operation as a Redis Lua script, reading KEYS and ARGV.
+        local (callable): The same operation for a LocalStore, called as
+            local(store, keys, args) while the store's lock is held.
+
+    Returns:
+        callable: run(keys, args), returning what the script returns.
+    """
+    if isinstance(store, LocalStore):
+        def run_locally(keys: List[str], args: List[Any]) -> Any:
+            with store._lock:
+                return local(store, keys, [str(arg) for arg in args])
+        return run_locally
+
+    script = store.register_script(lua)
+    return lambda keys, args: script(keys=keys, args=args)
+
+
+def shared_key(*parts: str) -> str:
+    """Namespaced key in the shared store, e.g. shared_key("geocode", "paris")."""
+    return SHARED_STORE_PREFIX + ":".join(parts)
@@ -0,0 +1,462 @@
+"""Durable ADK session service backed by SQLite.
+
+Sessions, their events, app/user state and the server's session-name
+mappings live in one SQLite database in WAL mode, so conversations survive
+restarts. Writes go to a pending batch that a background thread commits
+every SESSION_FLUSH_INTERVAL_SECONDS (or as soon as SESSION_FLUSH_BATCH
+statements are queued), so a chat turn never waits on a disk sync. Reads
+are served from an LRU of hot sessions; a miss flushes pending writes and
+loads the session from disk. When a batch fails, its statements are
+retried one by one: a statement that keeps failing is logged and dropped
+(counted in `dropped_writes`) instead of holding up every later write.
+
+State is stored one row per key, and each event only upserts the keys in
+its state delta instead of rewriting the whole session.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, MutableMapping, Optional, Tuple
+
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, Session, State
+from google.adk.sessions.base_session_service import (
+    GetSessionConfig,
+    ListEventsResponse,
+    ListSessionsResponse,
+)
+
+from .session_limits import (
+    SESSION_IDLE_TTL_SECONDS,
+    SESSION_MAX_EVENTS,
+    SESSION_MAX_SESSIONS,
+    BoundedInMemorySessionService,
+    BoundedSessionsMixin,
+)
+from .shared_store import SharedMapping, shared_key, shared_store
+
+logger = logging.getLogger(__name__)
+
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "shared" if shared_store is not None else "sqlite").lower()
+SESSION_DB_PATH = os.environ.get("SESSION_DB_PATH", ".cache/sessions.sqlite3")
+SESSION_CACHE_SIZE = int(os.environ.get("SESSION_CACHE_SIZE", "1024"))
+SESSION_FLUSH_INTERVAL_SECONDS = float(os.environ.get("SESSION_FLUSH_INTERVAL_SECONDS", "0.05"))
+SESSION_FLUSH_BATCH = int(os.environ.get("SESSION_FLUSH_BATCH", "256"))
+SESSION_FLUSH_MAX_RETRIES = int(os.environ.get("SESSION_FLUSH_MAX_RETRIES", "5"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    app_name TEXT NOT NULL, user_id TEXT NOT NULL, id TEXT NOT NULL,
+    last_update_time REAL NOT NULL,
+    PRIMARY KEY (app_name, user_id, id)
+);
+CREATE TABLE IF NOT EXISTS session_state (
+    app_name TEXT NOT NULL, user_id TEXT NOT NULL, session_id TEXT NOT NULL,
+    key TEXT NOT NULL, value TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id, session_id, key)
+);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    app_name TEXT NOT NULL, user_id TEXT NOT NULL, session_id TEXT NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_by_session ON events (app_name, user_id, session_id, seq);
+CREATE TABLE IF NOT EXISTS app_state (
+    app_name TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,
+    PRIMARY KEY (app_name, key)
+);
+CREATE TABLE IF NOT EXISTS user_state (
+    app_name TEXT NOT NULL, user_id TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id, key)
+);
+CREATE TABLE IF NOT EXISTS session_mappings (
+    name TEXT PRIMARY KEY, session_id TEXT NOT NULL
+);
+"""
+
+SessionKey = Tuple[str, str, str]
+# SQL, parameters, and how many flushes already failed to write it
+PendingWrite = Tuple[str, tuple, int]
+
+
+class SqliteSessionService(BoundedSessionsMixin, BaseSessionService):
+    """Drop-in replacement for InMemorySessionService that persists to SQLite."""
+
+    def __init__(self, path: str, cache_size: int = 1024, flush_interval: float = 0.05,
+                 flush_batch: int = 256, idle_ttl: float = 86400.0, max_sessions: int = 10000,
+                 max_events: int = 200, max_retries: int = 5):
+        self._init_limits(idle_ttl, max_sessions, max_events)
+        self.path = path
+        self.cache_size = cache_size
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.max_retries = max_retries
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL: commits are atomic, and only checkpoints sync to disk
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._db_lock = threading.Lock()
+        self._pending: List[PendingWrite] = []
+        self._pending_lock = threading.Lock()
+        self._sessions: "OrderedDict[SessionKey, Session]" = OrderedDict()
+        self._app_state: Dict[str, Dict[str, Any]] = {}
+        self._user_state: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for app_name, key, value in self._db.execute("SELECT app_name, key, value FROM app_state"):
+            self._app_state.setdefault(app_name, {})[key] = json.loads(value)
+        for app_name, user_id, key, value in self._db.execute("SELECT app_name, user_id, key, value FROM user_state"):
+            self._user_state.setdefault((app_name, user_id), {})[key] = json.loads(value)
+        # Rebuild the LRU and size accounting for sessions stored by earlier runs
+        for app_name, user_id, session_id, updated in self._db.execute(
+            "SELECT app_name, user_id, id, last_update_time FROM sessions ORDER BY last_update_time"
+        ):
+            self._touch((app_name, user_id, session_id), now=updated)
+        for app_name, user_id, session_id, size in self._db.execute(
+            "SELECT app_name, user_id, session_id, LENGTH(CAST(payload AS BLOB)) FROM events ORDER BY seq"
+        ):
+            usage = self._usage.get((app_name, user_id, session_id))
+            if usage is not None:
+                usage.event_sizes.append(size)
+                usage.event_bytes += size
+        self.counters = {"cache_hits": 0, "cache_misses": 0, "flushes": 0, "statements": 0, "dropped_writes": 0}
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="session-flusher", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    # -- write batching -------------------------------------------------
+
+    def _queue(self, sql: str, params: tuple) -> None:
+        with self._pending_lock:
+            self._pending.append((sql, params, 0))
+            if len(self._pending) >= self.flush_batch:
+                self._wake.set()
+
+    def flush(self) -> int:
+        """Commits all pending writes, in one transaction when they all succeed. Returns the statement count."""
+        with self._db_lock:
+            with self._pending_lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                self._db.execute("BEGIN")
+                for sql, params, _ in batch:
+                    self._db.execute(sql, params)
+                self._db.execute("COMMIT")
+                written = len(batch)
+            except Exception as e:
+                if self._db.in_transaction:
+                    self._db.execute("ROLLBACK")
+                logger.warning("Failed to persist %d session writes in one batch (%s), retrying one by one",
+                               len(batch), e)
+                written = self._write_one_by_one(batch)
+            self.counters["flushes"] += 1
+            self.counters["statements"] += written
+            return written
+
+    def _write_one_by_one(self, batch: List[PendingWrite]) -> int:
+        # Each statement commits on its own, so one bad row cannot hold up the rest
+        written = 0
+        for index, (sql, params, failures) in enumerate(batch):
+            try:
+                self._db.execute(sql, params)
+                written += 1
+            except sqlite3.OperationalError as e:
+                # Busy, locked or I/O errors may pass: keep this write and everything after it, in order
+                if failures + 1 < self.max_retries:
+                    with self._pending_lock:
+                        self._pending[:0] = [(sql, params, failures + 1)] + batch[index + 1:]
+                    return written
+                self._drop_write(sql, params, e)
+            except Exception as e:
+                self._drop_write(sql, params, e)
+        return written
+
+    def _drop_write(self, sql: str, params: tuple, error: Exception) -> None:
+        self.counters["dropped_writes"] += 1
+        logger.error("Dropped session write %r %r: %s", sql, params, error)
+
+    def _flush_before_read(self) -> None:
+        # Reads go on with what is on disk rather than fail the turn when writes cannot be persisted
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Failed to persist pending session writes before a read")
+
+    def _flush_loop(self) -> None:
+        while not self._closed.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to persist pending session writes")
+
+    def close(self) -> None:
+        """Stops the background flusher and writes everything still pending."""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._wake.set()
+        self._flusher.join(timeout=5)
+        self.flush()
+
+    # -- hot session cache ------------------------------------------------
+
+    def _remember(self, key: SessionKey, session: Session) -> None:
+        self._sessions[key] = session
+        self._sessions.move_to_end(key)
+        while len(self._sessions) > self.cache_size:
+            self._sessions.popitem(last=False)
+
+    def _load(self, key: SessionKey) -> Optional[Session]:
+        session = self._sessions.get(key)
+        if session is not None:
+            self._sessions.move_to_end(key)
+            self._touch(key)
+            self.counters["cache_hits"] += 1
+            return session
+
+        self.counters["cache_misses"] += 1
+        self._flush_before_read()
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT last_update_time FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?", key
+            ).fetchone()
+            if row is None:
+                return None
+            state = {
+                state_key: json.loads(value)
+                for state_key, value in self._db.execute(
+                    "SELECT key, value FROM session_state WHERE app_name = ? AND user_id = ? AND session_id = ?", key
+                )
+            }
+            events = [
+                Event.model_validate_json(payload)
+                for (payload,) in self._db.execute(
+                    "SELECT payload FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? ORDER BY seq", key
+                )
+            ]
+        session = Session(app_name=key[0], user_id=key[1], id=key[2], state=state, events=events,
+                          last_update_time=row[0])
+        self._remember(key, session)
+        self._touch(key)
+        return session
+
+    def _merge_state(self, session: Session) -> Session:
+        for key, value in self._app_state.get(session.app_name, {}).items():
+            session.state[State.APP_PREFIX + key] = value
+        for key, value in self._user_state.get((session.app_name, session.user_id), {}).items():
+            session.state[State.USER_PREFIX + key] = value
+        return session
+
+    # -- BaseSessionService ---------------------------------------------
+
+    def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        session_id = session_id.strip() if session_id and session_id.strip() else str(uuid.uuid4())
+        key = (app_name, user_id, session_id)
+        session = Session(app_name=app_name, user_id=user_id, id=session_id, state=state or {},
+                          last_update_time=time.time())
+
+        # Same semantics as InMemorySessionService: an existing id is replaced
+        self._queue_delete(key)
+        self._queue("INSERT INTO sessions (app_name, user_id, id, last_update_time) VALUES (?, ?, ?, ?)",
+                    key + (session.last_update_time,))
+        for state_key, value in session.state.items():
+            self._queue_state(key, state_key, value)
+        self._remember(key, session)
+        self._forget(key)
+        self._touch(key)
+        self._enforce_max_sessions()
+        return self._merge_state(copy.deepcopy(session))
+
+    def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        session = self._load((app_name, user_id, session_id))
+        if session is None:
+            return None
+        copied_session = copy.deepcopy(session)
+
+        if config:
+            if config.num_recent_events:
+                copied_session.events = copied_session.events[-config.num_recent_events:]
+            if config.after_timestamp:
+                copied_session.events = [
+                    event for event in copied_session.events if event.timestamp >= config.after_timestamp
+                ]
+
+        return self._merge_state(copied_session)
+
+    def list_sessions(self, *, app_name: str, user_id: str) -> ListSessionsResponse:
+        self._flush_before_read()
+        with self._db_lock:
+            rows = self._db.execute(
+                "SELECT id, last_update_time FROM sessions WHERE app_name = ? AND user_id = ?", (app_name, user_id)
+            ).fetchall()
+        return ListSessionsResponse(sessions=[
+            Session(app_name=app_name, user_id=user_id, id=session_id, last_update_time=updated)
+            for session_id, updated in rows
+        ])
+
+    def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        key = (app_name, user_id, session_id)
+        self._sessions.pop(key, None)
+        self._forget(key)
+        self._queue_delete(key)
+
+    def list_events(self, *, app_name: str, user_id: str, session_id: str) -> ListEventsResponse:
+        session = self._load((app_name, user_id, session_id))
+        return ListEventsResponse(events=copy.deepcopy(session.events) if session else [])
+
+    def append_event(self, session: Session, event: Event) -> Event:
+        # Update the caller's copy
+        super().append_event(session=session, event=event)
+        session.last_update_time = event.timestamp
+        if event.partial:
+            return event
+
+        key = (session.app_name, session.user_id, session.id)
+        stored_session = self._load(key)
+        if stored_session is None:
+            return event
+
+        if event.actions and event.actions.state_delta:
+            for state_key, value in event.actions.state_delta.items():
+                if state_key.startswith(State.APP_PREFIX):
+                    name = state_key.removeprefix(State.APP_PREFIX)
+                    self._app_state.setdefault(session.app_name, {})[name] = value
+                    self._queue("INSERT OR REPLACE INTO app_state (app_name, key, value) VALUES (?, ?, ?)",
+                                (session.app_name, name, json.dumps(value)))
+                elif state_key.startswith(State.USER_PREFIX):
+                    name = state_key.removeprefix(State.USER_PREFIX)
+                    self._user_state.setdefault((session.app_name, session.user_id), {})[name] = value
+                    self._queue("INSERT OR REPLACE INTO user_state (app_name, user_id, key, value) VALUES (?, ?, ?, ?)",
+                                (session.app_name, session.user_id, name, json.dumps(value)))
+                elif not state_key.startswith(State.TEMP_PREFIX):
+                    self._queue_state(key, state_key, value)
+
+        super().append_event(session=stored_session, event=event)
+        stored_session.last_update_time = event.timestamp
+        payload = event.model_dump_json(exclude_none=True)
+        self._queue("INSERT INTO events (app_name, user_id, session_id, payload) VALUES (?, ?, ?, ?)",
+                    key + (payload,))
+        self._record_event(key, len(payload.encode()))
+        dropped = self._trim(key, stored_session.events)
+        if dropped:
+            self._queue(
+                "DELETE FROM events WHERE seq IN (SELECT seq FROM events "
+                "WHERE app_name = ? AND user_id = ? AND session_id = ? ORDER BY seq LIMIT ?)",
+                key + (dropped,),
+            )
+        self._queue("UPDATE sessions SET last_update_time = ? WHERE app_name = ? AND user_id = ? AND id = ?",
+                    (event.timestamp,) + key)
+        return event
+
+    def _queue_state(self, key: SessionKey, state_key: str, value: Any) -> None:
+        self._queue(
+            "INSERT OR REPLACE INTO session_state (app_name, user_id, session_id, key, value) VALUES (?, ?, ?, ?, ?)",
+            key + (state_key, json.dumps(value)),
+        )
+
+    def _queue_delete(self, key: SessionKey) -> None:
+        self._queue("DELETE FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?", key)
+        self._queue("DELETE FROM session_state WHERE app_name = ? AND user_id = ? AND session_id = ?", key)
+        self._queue("DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?", key)
+
+    def stats(self) -> dict:
+        with self._pending_lock:
+            pending = len(self._pending)
+        return dict(self.usage_stats(), **self.counters, backend="sqlite", cached_sessions=len(self._sessions),
+                    pending_writes=pending)
+
+
+class SqliteMapping(MutableMapping):
+    """Session name -> session id mapping stored next to the sessions.
+
+    Reads come from memory; writes go through the service's write batch.
+    """
+
+    def __init__(self, service: SqliteSessionService):
+        self.service = service
+        service.flush()
+        with service._db_lock:
+            self._data = dict(service._db.execute("SELECT name, session_id FROM session_mappings"))
+
+    def __getitem__(self, name: str) -> str:
+        return self._data[name]
+
+    def __setitem__(self, name: str, session_id: str) -> None:
+        self._data[name] = session_id
+        self.service._queue("INSERT OR REPLACE INTO session_mappings (name, session_id) VALUES (?, ?)",
+                            (name, session_id))
+
+    def __delitem__(self, name: str) -> None:
+        del self._data[name]
+        self.service._queue("DELETE FROM session_mappings WHERE name = ?", (name,))
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def build_session_service() -> Tuple[BaseSessionService, MutableMapping]:
+    """Creates the session service and name mapping selected by SESSION_BACKEND.
+
+    Returns:
+        tuple: (session service, session name -> id mapping). "memory" keeps
+            both in process memory, "sqlite" persists both to SESSION_DB_PATH,
+            and "shared" keeps both in the shared store so every worker sees
+            them. The default is "shared" when SHARED_STORE_URL is set and
+            "sqlite" otherwise.
+    """
+    if SESSION_BACKEND == "shared":
+        if shared_store is None:
+            raise RuntimeError("SESSION_BACKEND=shared requires SHARED_STORE_URL")
+        from .shared_sessions import StoreSessionService
+
+        service = StoreSessionService(shared_store, SESSION_IDLE_TTL_SECONDS, SESSION_MAX_SESSIONS, SESSION_MAX_EVENTS)
+        return service, SharedMapping(shared_store, shared_key("session_mappings"))
+
+    if SESSION_BACKEND == "memory":
+        return BoundedInMemorySessionService(SESSION_IDLE_TTL_SECONDS, SESSION_MAX_SESSIONS, SESSION_MAX_EVENTS), {}
+
+    service = SqliteSessionService(
+        SESSION_DB_PATH,
+        cache_size=SESSION_CACHE_SIZE,
+        flush_interval=SESSION_FLUSH_INTERVAL_SECONDS,
+        flush_batch=SESSION_FLUSH_BATCH,
+        idle_ttl=SESSION_IDLE_TTL_SECONDS,
+        max_sessions=SESSION_MAX_SESSIONS,
+        max_events=SESSION_MAX_EVENTS,
+        max_retries=SESSION_FLUSH_MAX_RETRIES,
+    )
+    logger.info(f"Persisting sessions to {SESSION_DB_PATH}")
+    return service, SqliteMapping(service)
@@ -0,0 +1,182 @@
+"""Cold-start timing for agent_server.py.
+
+The server scales to zero, so every cold start pays for the imports, the
+agent team and the first upstream connections before it can answer. The
+report splits that time into named phases (imports, app setup, each
+warm-up step), and records when the process became ready and when it sent
+its first response, counted from process start.
+
+With STARTUP_PROFILE_IMPORTS=true an import hook also attributes import
+time to top-level packages ("google.adk", "fastapi", "numpy", ...), by
+self time so nested imports are not counted twice. It has to be installed
+before those imports run, which is why agent_server imports this module
+first. `python -X importtime` gives the same data module by module.
+"""
+
+import contextlib
+import importlib.abc
+import logging
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+STARTUP_PROFILE_IMPORTS = os.environ.get("STARTUP_PROFILE_IMPORTS", "false").lower() in ("1", "true", "yes")
+STARTUP_IMPORT_REPORT_TOP = 15
+
+
+def _seconds_since_process_start() -> float:
+    """Age of this process, so interpreter start-up counts too; 0 where /proc is unavailable."""
+    try:
+        with open("/proc/self/stat") as f:
+            # Field 22 (after the parenthesised command name) is the start time in clock ticks since boot
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+def _package(name: str) -> str:
+    """Groups modules by distribution: "google.adk.agents" -> "google.adk", "numpy.linalg" -> "numpy"."""
+    parts = name.split(".")
+    return ".".join(parts[:2]) if parts[0] == "google" and len(parts) > 1 else parts[0]
+
+
+class _TimedLoader(importlib.abc.Loader):
+    """Wraps a module's loader to time its execution; everything else goes to the real loader."""
+
+    def __init__(self, loader, name: str, timer: "ImportTimer"):
+        self._loader = loader
+        self._name = name
+        self._timer = timer
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        module.__loader__ = self._loader
+        if module.__spec__ is not None:
+            module.__spec__.loader = self._loader
+        with self._timer.timing(self._name):
+            self._loader.exec_module(module)
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+
+class ImportTimer(importlib.abc.MetaPathFinder):
+    """Meta path hook that adds up import self time per top-level package."""
+
+    def __init__(self):
+        self.self_seconds: Dict[str, float] = defaultdict(float)
+        self.modules: Dict[str, int] = defaultdict(int)
+        self._stack: List[List[float]] = []
+        self._local = threading.local()
+
+    def find_spec(self, fullname, path, target=None):
+        if getattr(self._local, "finding", False):
+            return None
+        self._local.finding = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(fullname, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._local.finding = False
+        if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+            spec.loader = _TimedLoader(spec.loader, fullname, self)
+        return spec
+
+    @contextlib.contextmanager
+    def timing(self, name: str) -> Iterator[None]:
+        # [start, time spent in nested imports]
+        frame = [time.perf_counter(), 0.0]
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            elapsed = time.perf_counter() - frame[0]
+            package = _package(name)
+            self.self_seconds[package] += elapsed - frame[1]
+            self.modules[package] += 1
+            if self._stack:
+                self._stack[-1][1] += elapsed
+
+    def install(self) -> None:
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self) -> None:
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def top(self, limit: int = STARTUP_IMPORT_REPORT_TOP) -> List[dict]:
+        ranked = sorted(self.self_seconds.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [{"package": package, "seconds": round(seconds, 4), "modules": self.modules[package]}
+                for package, seconds in ranked]
+
+
+class StartupReport:
+    """Phase timings, readiness and first response of this process, in seconds."""
+
+    def __init__(self, import_timer: Optional[ImportTimer] = None):
+        self.origin = time.perf_counter() - _seconds_since_process_start()
+        self.phases: Dict[str, float] = {}
+        self.marks: Dict[str, float] = {}
+        self.import_timer = import_timer
+        self._mark_start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round(time.perf_counter() - started, 4)
+
+    def lap(self, name: str) -> None:
+        """Records the time since the previous lap (or since this module loaded) as a phase."""
+        now = time.perf_counter()
+        self.phases[name] = round(now - self._mark_start, 4)
+        self._mark_start = now
+
+    def mark(self, name: str) -> None:
+        """Records the first time `name` happens, as seconds since process start."""
+        if name not in self.marks:
+            self.marks[name] = round(time.perf_counter() - self.origin, 4)
+
+    def report(self) -> dict:
+        report = {
+            "phases": dict(self.phases),
+            "ready_after": self.marks.get("ready"),
+            "first_response_after": self.marks.get("first_response"),
+        }
+        if self.import_timer is not None:
+            report["imports"] = self.import_timer.top()
+        return report
+
+    def log(self) -> None:
+        phases = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in self.phases.items())
+        logger.info(f"Startup: ready {self.marks.get('ready', 0.0):.3f}s after process start ({phases})")
+        if self.import_timer is not None:
+            logger.info("Import time by package: " + ", ".join(
+                f"{entry['package']} {entry['seconds']:.3f}s" for entry in self.import_timer.top()))
+
+
+_import_timer = ImportTimer() if STARTUP_PROFILE_IMPORTS else None
+if _import_timer is not None:
+    _import_timer.install()
+
+startup_report = StartupReport(_import_timer)
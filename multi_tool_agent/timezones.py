@@ -0,0 +1,274 @@
+"""City to timezone resolution for get_current_time.
+
+The alias index is built once at import: every city is reachable by its
+English name and its common French and Arabic names, normalized the same
+way as geocoding keys, so exact lookups are a single dict hit. Cities
+that are not in the table are geocoded and mapped to the timezone of a
+known city nearby, or, when none is that close, to the UTC offset
+OpenWeatherMap reports for the location. Only names geocoding does not
+know are treated as typos: a trigram index shortlists table aliases for
+an edit distance check, so a real city is never "corrected" into a
+similar-looking one elsewhere.
+"""
+
+import datetime
+import math
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+
+from .geocache import geocode_city, normalize_city
+
+# Beyond this distance the nearest table city is not trusted to share the timezone
+# (zone and DST borders are often closer than that; OWM's offset is used instead)
+NEAREST_CITY_MAX_KM = 150.0
+
+# Shorter names are too close to other real names for typo correction ("Nome" / "Rome")
+FUZZY_MIN_LENGTH = 5
+
+# (display name, IANA timezone, latitude, longitude, French/Arabic/other aliases)
+CITY_TIMEZONES: List[Tuple[str, str, float, float, Tuple[str, ...]]] = [
+    ("New York", "America/New_York", 40.71, -74.01, ("نيويورك",)),
+    ("San Francisco", "America/Los_Angeles", 37.77, -122.42, ("سان فرانسيسكو",)),
+    ("Los Angeles", "America/Los_Angeles", 34.05, -118.24, ("لوس أنجلوس",)),
+    ("Chicago", "America/Chicago", 41.88, -87.63, ("شيكاغو",)),
+    ("Houston", "America/Chicago", 29.76, -95.37, ("هيوستن",)),
+    ("Phoenix", "America/Phoenix", 33.45, -112.07, ("فينيكس",)),
+    ("Philadelphia", "America/New_York", 39.95, -75.17, ("Philadelphie", "فيلادلفيا")),
+    ("San Antonio", "America/Chicago", 29.42, -98.49, ("سان أنطونيو",)),
+    ("San Diego", "America/Los_Angeles", 32.72, -117.16, ("سان دييغو",)),
+    ("Dallas", "America/Chicago", 32.78, -96.80, ("دالاس",)),
+    ("San Jose", "America/Los_Angeles", 37.34, -121.89, ("سان خوسيه",)),
+    ("Austin", "America/Chicago", 30.27, -97.74, ("أوستن",)),
+    ("Denver", "America/Denver", 39.74, -104.99, ("دنفر",)),
+    ("Anchorage", "America/Anchorage", 61.22, -149.90, ()),
+    ("Honolulu", "Pacific/Honolulu", 21.31, -157.86, ("هونولولو",)),
+    ("London", "Europe/London", 51.51, -0.13, ("Londres", "لندن")),
+    ("Paris", "Europe/Paris", 48.86, 2.35, ("باريس",)),
+    ("Berlin", "Europe/Berlin", 52.52, 13.40, ("برلين",)),
+    ("Rome", "Europe/Rome", 41.90, 12.50, ("Roma", "روما")),
+    ("Madrid", "Europe/Madrid", 40.42, -3.70, ("مدريد",)),
+    ("Amsterdam", "Europe/Amsterdam", 52.37, 4.90, ("أمستردام",)),
+    ("Brussels", "Europe/Brussels", 50.85, 4.35, ("Bruxelles", "بروكسل")),
+    ("Vienna", "Europe/Vienna", 48.21, 16.37, ("Vienne", "Wien", "فيينا")),
+    ("Geneva", "Europe/Zurich", 46.20, 6.14, ("Genève", "جنيف")),
+    ("Lisbon", "Europe/Lisbon", 38.72, -9.14, ("Lisbonne", "Lisboa", "لشبونة")),
+    ("Athens", "Europe/Athens", 37.98, 23.73, ("Athènes", "أثينا")),
+    ("Stockholm", "Europe/Stockholm", 59.33, 18.07, ("ستوكهولم",)),
+    ("Reykjavik", "Atlantic/Reykjavik", 64.15, -21.94, ()),
+    ("Moscow", "Europe/Moscow", 55.76, 37.62, ("Moscou", "موسكو")),
+    ("Istanbul", "Europe/Istanbul", 41.01, 28.98, ("إسطنبول", "اسطنبول")),
+    ("Tokyo", "Asia/Tokyo", 35.68, 139.69, ("طوكيو",)),
+    ("Beijing", "Asia/Shanghai", 39.90, 116.41, ("Pékin", "بكين")),
+    ("Shanghai", "Asia/Shanghai", 31.23, 121.47, ("Shanghaï", "شنغهاي")),
+    ("Hong Kong", "Asia/Hong_Kong", 22.32, 114.17, ("هونغ كونغ",)),
+    ("Singapore", "Asia/Singapore", 1.35, 103.82, ("Singapour", "سنغافورة")),
+    ("Seoul", "Asia/Seoul", 37.57, 126.98, ("Séoul", "سيول")),
+    ("Manila", "Asia/Manila", 14.60, 120.98, ("Manille", "مانيلا")),
+    ("Bangkok", "Asia/Bangkok", 13.76, 100.50, ("بانكوك",)),
+    ("Jakarta", "Asia/Jakarta", -6.21, 106.85, ("جاكرتا",)),
+    ("New Delhi", "Asia/Kolkata", 28.61, 77.21, ("Delhi", "نيودلهي")),
+    ("Mumbai", "Asia/Kolkata", 19.08, 72.88, ("Bombay", "مومباي")),
+    ("Karachi", "Asia/Karachi", 24.86, 67.01, ("كراتشي",)),
+    ("Tehran", "Asia/Tehran", 35.69, 51.39, ("Téhéran", "طهران")),
+    ("Dubai", "Asia/Dubai", 25.20, 55.27, ("Dubaï", "دبي")),
+    ("Abu Dhabi", "Asia/Dubai", 24.45, 54.38, ("Abou Dabi", "أبو ظبي", "أبوظبي")),
+    ("Doha", "Asia/Qatar", 25.29, 51.53, ("الدوحة",)),
+    ("Riyadh", "Asia/Riyadh", 24.71, 46.68, ("Riyad", "الرياض")),
+    ("Jeddah", "Asia/Riyadh", 21.49, 39.19, ("Djeddah", "جدة")),
+    ("Baghdad", "Asia/Baghdad", 33.31, 44.36, ("Bagdad", "بغداد")),
+    ("Beirut", "Asia/Beirut", 33.89, 35.50, ("Beyrouth", "بيروت")),
+    ("Amman", "Asia/Amman", 31.95, 35.93, ("عمّان",)),
+    ("Jerusalem", "Asia/Jerusalem", 31.77, 35.21, ("Jérusalem", "Al-Quds", "القدس")),
+    ("Ramallah", "Asia/Hebron", 31.90, 35.20, ("رام الله",)),
+    ("Gaza", "Asia/Gaza", 31.50, 34.47, ("غزة",)),
+    ("Sydney", "Australia/Sydney", -33.87, 151.21, ("سيدني",)),
+    ("Melbourne", "Australia/Melbourne", -37.81, 144.96, ("ملبورن",)),
+    ("Auckland", "Pacific/Auckland", -36.85, 174.76, ("أوكلاند",)),
+    ("Toronto", "America/Toronto", 43.65, -79.38, ("تورونتو",)),
+    ("Vancouver", "America/Vancouver", 49.28, -123.12, ("فانكوفر",)),
+    ("Montreal", "America/Montreal", 45.50, -73.57, ("Montréal", "مونتريال")),
+    ("Mexico City", "America/Mexico_City", 19.43, -99.13, ("Mexico", "مكسيكو")),
+    ("Bogota", "America/Bogota", 4.71, -74.07, ("Bogotá", "بوغوتا")),
+    ("Lima", "America/Lima", -12.05, -77.04, ("ليما",)),
+    ("Santiago", "America/Santiago", -33.45, -70.67, ("سانتياغو",)),
+    ("Sao Paulo", "America/Sao_Paulo", -23.55, -46.63, ("São Paulo", "ساو باولو")),
+    ("Rio de Janeiro", "America/Sao_Paulo", -22.91, -43.17, ("Rio", "ريو دي جانيرو")),
+    ("Buenos Aires", "America/Argentina/Buenos_Aires", -34.60, -58.38, ("بوينس آيرس",)),
+    ("Lagos", "Africa/Lagos", 6.52, 3.38, ("لاغوس",)),
+    ("Abuja", "Africa/Lagos", 9.08, 7.40, ("أبوجا",)),
+    ("Accra", "Africa/Accra", 5.60, -0.19, ("أكرا",)),
+    ("Dakar", "Africa/Dakar", 14.72, -17.47, ("داكار",)),
+    ("Kinshasa", "Africa/Kinshasa", -4.44, 15.27, ("كينشاسا",)),
+    ("Cairo", "Africa/Cairo", 30.04, 31.24, ("Le Caire", "القاهرة")),
+    ("Johannesburg", "Africa/Johannesburg", -26.20, 28.05, ("جوهانسبرغ",)),
+    ("Nairobi", "Africa/Nairobi", -1.29, 36.82, ("نيروبي",)),
+    ("Addis Ababa", "Africa/Addis_Ababa", 9.03, 38.74, ("Addis-Abeba", "أديس أبابا")),
+    ("Algiers", "Africa/Algiers", 36.75, 3.06, ("Alger", "الجزائر")),
+    ("Casablanca", "Africa/Casablanca", 33.57, -7.59, ("الدار البيضاء",)),
+    ("Rabat", "Africa/Casablanca", 34.02, -6.83, ("الرباط",)),
+    ("Tripoli", "Africa/Tripoli", 32.89, 13.19, ("طرابلس",)),
+    ("Tunis", "Africa/Tunis", 36.81, 10.18, ("تونس",)),
+    ("Monastir", "Africa/Tunis", 35.78, 10.83, ("المنستير",)),
+    ("Sousse", "Africa/Tunis", 35.83, 10.64, ("سوسة",)),
+    ("Sfax", "Africa/Tunis", 34.74, 10.76, ("صفاقس",)),
+    ("Beb El Jazira", "Africa/Tunis", 36.80, 10.18, ("Bab El Jazira", "باب الجزيرة")),
+]
+
+
+class TimezoneMatch(NamedTuple):
+    name: str
+    tzinfo: datetime.tzinfo
+    method: str  # "exact", "fuzzy", "nearest" or "offset"
+
+
+@lru_cache(maxsize=None)
+def _zone(identifier: str) -> ZoneInfo:
+    return ZoneInfo(identifier)
+
+
+def _trigrams(key: str) -> Set[str]:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance, giving up (returning limit + 1) once it exceeds `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def _haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(a))
+
+
+class TimezoneResolver:
+    """Alias index with trigram-backed fuzzy matching and nearest-city fallback."""
+
+    def __init__(self, entries: List[Tuple[str, str, float, float, Tuple[str, ...]]]):
+        self.cities = [(name, tz, lat, lon) for name, tz, lat, lon, _ in entries]
+        self.aliases: Dict[str, int] = {}
+        self._alias_keys: List[str] = []
+        self._alias_city: List[int] = []
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        for city_id, (name, _, _, _, aliases) in enumerate(entries):
+            for alias in (name,) + tuple(aliases):
+                self.add_alias(alias, city_id)
+
+    def add_alias(self, alias: str, city_id: int) -> None:
+        key = normalize_city(alias)
+        if not key or key in self.aliases:
+            return
+        self.aliases[key] = city_id
+        alias_id = len(self._alias_keys)
+        self._alias_keys.append(key)
+        self._alias_city.append(city_id)
+        for gram in _trigrams(key):
+            self._postings[gram].append(alias_id)
+
+    def _match(self, city_id: int, method: str) -> TimezoneMatch:
+        name, tz, _, _ = self.cities[city_id]
+        return TimezoneMatch(name, _zone(tz), method)
+
+    def exact(self, city: str) -> Optional[TimezoneMatch]:
+        key = normalize_city(city)
+        city_id = self.aliases.get(key)
+        if city_id is None and "," in key:
+            # "Paris, France" -> "paris"
+            city_id = self.aliases.get(key.split(",", 1)[0])
+        return self._match(city_id, "exact") if city_id is not None else None
+
+    def find_cities(self, text: str) -> List[str]:
+        """Known cities named in free text, in order, preferring the longest alias of up to three words."""
+        words = [word.strip("?؟!.,;:\"'") for word in text.split()]
+        cities: List[str] = []
+        start = 0
+        while start < len(words):
+            for size in (3, 2, 1):
+                match = self.exact(" ".join(words[start:start + size]))
+                if match is not None:
+                    if match.name not in cities:
+                        cities.append(match.name)
+                    start += size
+                    break
+            else:
+                start += 1
+        return cities
+
+    def fuzzy(self, city: str, shortlist: int = 20) -> Optional[TimezoneMatch]:
+        """Best alias within a small edit distance (one typo per four letters, none below FUZZY_MIN_LENGTH)."""
+        key = normalize_city(city).split(",", 1)[0]
+        if len(key) < FUZZY_MIN_LENGTH:
+            return None
+        shared = Counter()
+        for gram in _trigrams(key):
+            for alias_id in self._postings.get(gram, ()):
+                shared[alias_id] += 1
+
+        limit = len(key) // 4
+        best: Optional[Tuple[int, int, int]] = None
+        for alias_id, overlap in shared.most_common(shortlist):
+            distance = _edit_distance(key, self._alias_keys[alias_id], limit)
+            if distance <= limit and (best is None or (distance, -overlap) < best[:2]):
+                best = (distance, -overlap, alias_id)
+        return self._match(self._alias_city[best[2]], "fuzzy") if best else None
+
+    def nearest(self, lat: float, lon: float, max_km: float = NEAREST_CITY_MAX_KM) -> Optional[int]:
+        """Index of the closest table city within `max_km`, if any."""
+        distance, city_id = min(
+            (_haversine_km(lat, lon, c_lat, c_lon), city_id)
+            for city_id, (_, _, c_lat, c_lon) in enumerate(self.cities)
+        )
+        return city_id if distance <= max_km else None
+
+    def resolve(self, city: str) -> Optional[TimezoneMatch]:
+        """Exact alias hit, else the best fuzzy match. No network access."""
+        return self.exact(city) or self.fuzzy(city)
+
+
+timezone_resolver = TimezoneResolver(CITY_TIMEZONES)
+
+
+async def resolve_timezone(city: str) -> Optional[TimezoneMatch]:
+    """Finds the timezone for a city, geocoding it when it is not in the table.
+
+    Args:
+        city (str): The city name as typed by the user.
+
+    Returns:
+        TimezoneMatch: The resolved name and tzinfo, or None if the city is unknown.
+    """
+    match = timezone_resolver.exact(city)
+    if match is not None:
+        return match
+
+    geo_data = await geocode_city(city)
+    if not geo_data:
+        # Unknown to geocoding as well: most likely a typo of a table city
+        return timezone_resolver.fuzzy(city)
+    location = geo_data[0]
+    name = location.get("name", city)
+    city_id = timezone_resolver.nearest(location["lat"], location["lon"])
+    if city_id is not None:
+        return TimezoneMatch(name, _zone(timezone_resolver.cities[city_id][1]), "nearest")
+
+    # Nothing close in the table: use the UTC offset OpenWeatherMap reports for the spot
+    from .forecast_cache import get_forecast
+
+    data = await get_forecast(location["lat"], location["lon"])
+    offset = datetime.timedelta(seconds=data.timezone)
+    return TimezoneMatch(name, datetime.timezone(offset), "offset")
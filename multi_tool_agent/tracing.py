@@ -0,0 +1,294 @@
+"""Per-turn tracing of chat turns, runner events, model calls and tool calls.
+
+Each chat turn opens a trace. Inside it, every runner event, model call,
+tool call and OpenWeatherMap request becomes a span with its timing and
+attributes (agent, tool arguments, cache outcome), nested through a
+context variable so a geocode request shows up under the tool call that
+made it.
+
+Spans are recorded for every turn, and the keep/drop decision is made when
+the turn ends: turns slower than TRACE_SLOW_TURN_SECONDS are always kept,
+plus a TRACE_SAMPLE_RATE fraction of the others. Kept traces are appended
+to TRACE_EXPORT_PATH by a background thread, one OTLP/JSON
+`ExportTraceServiceRequest` per line (the layout of the OpenTelemetry
+Collector's file exporter), so they can be replayed into any OTLP backend.
+Tracing is off when TRACE_EXPORT_PATH is empty.
+"""
+
+import atexit
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TRACE_EXPORT_PATH = os.environ.get("TRACE_EXPORT_PATH", "")
+TRACE_SLOW_TURN_SECONDS = float(os.environ.get("TRACE_SLOW_TURN_SECONDS", "2"))
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0"))
+
+SERVICE_NAME = "multi_tool_agent"
+MAX_SPANS_PER_TRACE = 1000
+MAX_ATTRIBUTE_LENGTH = 256
+EXPORT_QUEUE_SIZE = 1000
+
+# OTLP status codes
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+
+class Trace:
+    __slots__ = ("trace_id", "spans", "last_event_ns")
+
+    def __init__(self):
+        self.trace_id = f"{random.getrandbits(128):032x}"
+        self.spans: List["Span"] = []
+        self.last_event_ns = time.time_ns()
+
+
+class Span:
+    """One timed operation inside a trace."""
+
+    __slots__ = ("trace", "span_id", "parent", "name", "start_ns", "end_ns", "attributes", "status",
+                 "_previous")
+
+    def __init__(self, trace: Trace, parent: Optional["Span"], name: str, attributes: Dict[str, Any],
+                 start_ns: Optional[int] = None):
+        self.trace = trace
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent = parent
+        self.name = name
+        self.start_ns = time.time_ns() if start_ns is None else start_ns
+        self.end_ns: Optional[int] = None
+        self.attributes = {key: value for key, value in attributes.items() if value is not None}
+        self.status = STATUS_OK
+        self._previous: Optional[Span] = None
+        if len(trace.spans) < MAX_SPANS_PER_TRACE:
+            trace.spans.append(self)
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if value is not None:
+            self.attributes[key] = value
+
+    def end(self, error: Optional[str] = None) -> None:
+        """Closes the span and, if it was made current, restores its parent."""
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if error:
+            self.status = STATUS_ERROR
+            self.attributes["error"] = error
+        if self._previous is not None and _current_span.get() is self:
+            _current_span.set(self._previous)
+
+    @property
+    def duration(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if not isinstance(value, str):
+        value = json.dumps(value, ensure_ascii=False, default=str)
+    return {"stringValue": value[:MAX_ATTRIBUTE_LENGTH]}
+
+
+def to_otlp(trace: Trace) -> dict:
+    """Converts a finished trace into an OTLP/JSON ExportTraceServiceRequest."""
+    spans = []
+    for span in trace.spans:
+        spans.append({
+            "traceId": trace.trace_id,
+            "spanId": span.span_id,
+            "parentSpanId": span.parent.span_id if span.parent is not None else "",
+            "name": span.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns or span.start_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()],
+            "status": {"code": span.status},
+        })
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+        "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+    }]}
+
+
+class Tracer:
+    """Opens one trace per turn and exports the ones the sampler keeps."""
+
+    def __init__(self, export_path: str = "", slow_seconds: float = 2.0, sample_rate: float = 0.0):
+        self.export_path = export_path
+        self.slow_seconds = slow_seconds
+        self.sample_rate = sample_rate
+        self.enabled = bool(export_path)
+        self.counters = {"turns": 0, "exported": 0, "slow": 0, "sampled": 0, "dropped": 0}
+        self._queue: "queue.Queue[Optional[Trace]]" = queue.Queue(EXPORT_QUEUE_SIZE)
+        self._writer: Optional[threading.Thread] = None
+
+    @contextlib.contextmanager
+    def turn(self, name: str, **attributes) -> Iterator[Optional[Span]]:
+        """Traces one turn; yields its root span (None when tracing is off)."""
+        if not self.enabled:
+            yield None
+            return
+        root = Span(Trace(), None, name, attributes)
+        token = _current_span.set(root)
+        try:
+            yield root
+        except Exception as e:
+            root.end(error=f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            root.end()
+            # A streaming generator may be closed from another context
+            with contextlib.suppress(ValueError):
+                _current_span.reset(token)
+            self._finish(root)
+
+    def _finish(self, root: Span) -> None:
+        self.counters["turns"] += 1
+        if root.duration >= self.slow_seconds > 0:
+            reason = "slow"
+        elif self.sample_rate > 0 and random.random() < self.sample_rate:
+            reason = "sampled"
+        else:
+            return
+        root.set_attribute("sampling.reason", reason)
+        self._start_writer()
+        try:
+            self._queue.put_nowait(root.trace)
+            self.counters[reason] += 1
+        except queue.Full:
+            self.counters["dropped"] += 1
+
+    # -- export -----------------------------------------------------------
+
+    def _start_writer(self) -> None:
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name="trace-exporter", daemon=True)
+            self._writer.start()
+            atexit.register(self.close)
+
+    def _write_loop(self) -> None:
+        directory = os.path.dirname(self.export_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        while True:
+            traces = [self._queue.get()]
+            while True:
+                try:
+                    traces.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            closing = None in traces
+            lines = [json.dumps(to_otlp(trace), ensure_ascii=False) + "\n" for trace in traces if trace is not None]
+            try:
+                with open(self.export_path, "a", encoding="utf-8") as f:
+                    f.writelines(lines)
+                self.counters["exported"] += len(lines)
+            except OSError as e:
+                self.counters["dropped"] += len(lines)
+                logger.warning(f"Could not write traces to {self.export_path}: {str(e)}")
+            if closing:
+                return
+
+    def close(self) -> None:
+        """Writes the traces still queued and stops the exporter thread."""
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join(timeout=5)
+
+    def stats(self) -> dict:
+        return dict(
+            self.counters,
+            enabled=self.enabled,
+            slow_turn_seconds=self.slow_seconds,
+            sample_rate=self.sample_rate,
+        )
+
+
+tracer = Tracer(TRACE_EXPORT_PATH, TRACE_SLOW_TURN_SECONDS, TRACE_SAMPLE_RATE)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def start_span(name: str, activate: bool = False, **attributes) -> Optional[Span]:
+    """Opens a child of the current span; end it with `Span.end()`.
+
+    Args:
+        name (str): Span name.
+        activate (bool): Make it the current span until it ends, so work
+            done meanwhile (e.g. a tool's upstream requests) nests under it.
+        **attributes: Span attributes; None values are skipped.
+
+    Returns:
+        Span: The new span, or None outside a traced turn.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return None
+    span = Span(parent.trace, parent, name, attributes)
+    if activate:
+        span._previous = parent
+        _current_span.set(span)
+    return span
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes) -> Iterator[Optional[Span]]:
+    """Context manager form of `start_span` (the span is current inside the block)."""
+    child = start_span(name, activate=True, **attributes)
+    if child is None:
+        yield None
+        return
+    try:
+        yield child
+    except Exception as e:
+        child.end(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        child.end()
+
+
+def set_attribute(key: str, value: Any) -> None:
+    """Sets an attribute on the current span, if any (e.g. a cache outcome)."""
+    current = _current_span.get()
+    if current is not None:
+        current.set_attribute(key, value)
+
+
+def record_event(event) -> None:
+    """Adds a span for one runner event, covering the time since the previous event of the turn."""
+    current = _current_span.get()
+    if current is None:
+        return
+    trace = current.trace
+    root = trace.spans[0]
+    now = time.time_ns()
+    event_span = Span(trace, root, "event", {
+        "author": event.author,
+        "event.id": event.id,
+        "partial": bool(event.partial),
+        "final": event.is_final_response(),
+        "function_calls": [call.name for call in event.get_function_calls()] or None,
+        "function_responses": [response.name for response in event.get_function_responses()] or None,
+    }, start_ns=trace.last_event_ns)
+    event_span.end_ns = now
+    trace.last_event_ns = now
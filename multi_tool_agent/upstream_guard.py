@@ -0,0 +1,176 @@
+"""Tail-latency protection for OpenWeatherMap calls, per endpoint.
+
+`owm_client` wraps every geocode and forecast call in its endpoint's
+`EndpointGuard`:
+
+- a latency budget (OWM_GEOCODE_BUDGET_SECONDS, OWM_FORECAST_BUDGET_SECONDS)
+  bounds the whole call, hedge included, so a hung connection cannot
+  hold a chat turn;
+- once a call has run longer than the endpoint's recent
+  OWM_HEDGE_PERCENTILE latency, one identical request is sent alongside
+  it and the first good answer wins (calls are idempotent GETs, and a
+  hedge is only sent when the quota has a token to spare);
+- a circuit breaker opens after OWM_BREAKER_FAILURES failures in a row
+  (timeouts, connection errors, 5xx) and fails calls at once for
+  OWM_BREAKER_OPEN_SECONDS, then lets a single probe through to decide
+  whether to close again.
+
+While a breaker is open the forecast cache answers from the last data it
+holds, however old, and the tools say how old it is.
+"""
+
+import math
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+OWM_GEOCODE_BUDGET_SECONDS = float(os.environ.get("OWM_GEOCODE_BUDGET_SECONDS", "3"))
+OWM_FORECAST_BUDGET_SECONDS = float(os.environ.get("OWM_FORECAST_BUDGET_SECONDS", "4"))
+OWM_HEDGE_PERCENTILE = float(os.environ.get("OWM_HEDGE_PERCENTILE", "95"))
+OWM_HEDGE_MIN_SECONDS = float(os.environ.get("OWM_HEDGE_MIN_SECONDS", "0.1"))
+OWM_BREAKER_FAILURES = int(os.environ.get("OWM_BREAKER_FAILURES", "5"))
+OWM_BREAKER_OPEN_SECONDS = float(os.environ.get("OWM_BREAKER_OPEN_SECONDS", "30"))
+
+# Recent latencies kept per endpoint, and how many are needed before hedging starts
+_LATENCY_WINDOW = 256
+_MIN_LATENCY_SAMPLES = 20
+# The percentile is recomputed after this many new samples
+_PERCENTILE_REFRESH = 16
+
+
+class LatencyWindow:
+    """Sliding window of recent call latencies with a cached percentile."""
+
+    def __init__(self, percentile: float, size: int = _LATENCY_WINDOW):
+        self.percentile = percentile
+        self._samples: Deque[float] = deque(maxlen=size)
+        self._value: Optional[float] = None
+        self._since_refresh = 0
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+        self._since_refresh += 1
+        if self._since_refresh >= _PERCENTILE_REFRESH:
+            self._value = None
+
+    def value(self) -> Optional[float]:
+        """The percentile of the window, or None until it holds enough samples."""
+        if len(self._samples) < _MIN_LATENCY_SAMPLES:
+            return None
+        if self._value is None:
+            ordered = sorted(self._samples)
+            self._value = ordered[min(len(ordered) - 1, math.ceil(self.percentile / 100 * len(ordered)) - 1)]
+            self._since_refresh = 0
+        return self._value
+
+
+class CircuitBreaker:
+    """Closed, open after `threshold` consecutive failures, half-open (one probe) after `open_seconds`."""
+
+    def __init__(self, threshold: int = 5, open_seconds: float = 30.0):
+        self.threshold = threshold
+        self.open_seconds = open_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probe_at: Optional[float] = None
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "open" if time.monotonic() - self.opened_at < self.open_seconds else "half_open"
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; in half-open state only the probe may."""
+        if self.opened_at is None or self.threshold <= 0:
+            return True
+        now = time.monotonic()
+        if now - self.opened_at < self.open_seconds:
+            return False
+        # A probe that never reports back (cancelled) frees its slot after another open period
+        if self.probe_at is not None and now - self.probe_at < self.open_seconds:
+            return False
+        self.probe_at = now
+        return True
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker lets a probe through."""
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.open_seconds - time.monotonic())
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.probe_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.probe_at = None
+        if self.threshold <= 0:
+            return
+        if self.opened_at is None and self.failures >= self.threshold:
+            self.times_opened += 1
+            self.opened_at = time.monotonic()
+        elif self.opened_at is not None:
+            # The half-open probe failed: stay open for another period
+            self.opened_at = time.monotonic()
+
+
+class EndpointGuard:
+    """Budget, hedging delay and circuit breaker of one OWM endpoint."""
+
+    def __init__(self, endpoint: str, budget: float, hedge_percentile: float = 95.0, hedge_min: float = 0.1,
+                 breaker_failures: int = 5, breaker_open_seconds: float = 30.0):
+        self.endpoint = endpoint
+        self.budget = budget
+        self.hedge_min = hedge_min
+        self.latency = LatencyWindow(hedge_percentile)
+        self.breaker = CircuitBreaker(breaker_failures, breaker_open_seconds)
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.failures: Dict[str, int] = {}
+
+    def hedge_delay(self) -> Optional[float]:
+        """How long to wait for the first request before hedging, or None to never hedge it."""
+        if self.hedge_min <= 0:
+            return None
+        percentile = self.latency.value()
+        if percentile is None:
+            return None
+        delay = max(self.hedge_min, percentile)
+        # A hedge sent at the end of the budget could not finish inside it
+        return delay if delay < self.budget / 2 else None
+
+    def failed(self, reason: str) -> None:
+        self.failures[reason] = self.failures.get(reason, 0) + 1
+        self.breaker.record_failure()
+
+    def stats(self) -> dict:
+        return {
+            "budget_seconds": self.budget,
+            "hedge_after_seconds": self.hedge_delay(),
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "failures": dict(self.failures),
+            "breaker": self.breaker.state,
+            "breaker_opened": self.breaker.times_opened,
+            "consecutive_failures": self.breaker.failures,
+        }
+
+
+def _guard(endpoint: str, budget: float) -> EndpointGuard:
+    return EndpointGuard(endpoint, budget, OWM_HEDGE_PERCENTILE, OWM_HEDGE_MIN_SECONDS, OWM_BREAKER_FAILURES,
+                         OWM_BREAKER_OPEN_SECONDS)
+
+
+guards: Dict[str, EndpointGuard] = {
+    "geocode": _guard("geocode", OWM_GEOCODE_BUDGET_SECONDS),
+    "forecast": _guard("forecast", OWM_FORECAST_BUDGET_SECONDS),
+}
+
+
+def stats() -> Dict[str, dict]:
+    return {endpoint: guard.stats() for endpoint, guard in guards.items()}
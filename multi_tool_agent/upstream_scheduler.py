@@ -0,0 +1,384 @@
+"""Quota-aware scheduling of OpenWeatherMap requests.
+
+OWM plans cap calls per minute. Every request in `owm_client` first takes
+a token from a bucket refilled at OWM_CALLS_PER_MINUTE, holding at most
+OWM_BURST tokens. When the bucket is empty, requests queue in one of
+three priority lanes and tokens go to the highest lane first:
+
+- "interactive": tool calls made for a user waiting on a chat turn
+  (the default);
+- "batch": turns of /chat/batch;
+- "background": refreshes that nobody is waiting for (the refresher,
+  the warm-up, stale-while-revalidate refills).
+
+The lower lanes also leave OWM_INTERACTIVE_RESERVE tokens untouched, so
+a refresh cycle never spends the quota a user turn is about to need.
+Each lane has a longest wait; a request whose estimated wait is longer
+is shed at once rather than queued, so low-priority work is dropped
+first and interactive calls fail fast instead of hanging when the quota
+is gone. A 429 from OWM empties the bucket and pauses every lane for its
+Retry-After.
+
+The lane is taken from the caller's context (`upstream_priority`), so
+tasks started inside a `with upstream_priority("background"):` block
+inherit it. Work that several callers share (the caches' single-flight
+fetches) is started with `start_shared` instead, in its own copy of the
+starter's lane: a caller that joins it through `join_shared` raises that
+lane to its own, moving requests already queued up with it, so a user turn
+never waits in the lane of the refresh it happened to coalesce onto.
+OWM_CALLS_PER_MINUTE=0 turns the scheduler off.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import math
+import os
+import time
+import weakref
+from collections import deque
+from typing import Awaitable, Deque, Dict, Iterator, List, Optional, Union
+
+from .metrics import OWM_QUEUE_WAIT_SECONDS, OWM_RATE_LIMITED, OWM_REQUESTS_SHED
+
+OWM_CALLS_PER_MINUTE = float(os.environ.get("OWM_CALLS_PER_MINUTE", "60"))
+OWM_BURST = int(os.environ.get("OWM_BURST", "10"))
+OWM_INTERACTIVE_RESERVE = int(os.environ.get("OWM_INTERACTIVE_RESERVE", "2"))
+OWM_INTERACTIVE_MAX_WAIT_SECONDS = float(os.environ.get("OWM_INTERACTIVE_MAX_WAIT_SECONDS", "5"))
+OWM_BATCH_MAX_WAIT_SECONDS = float(os.environ.get("OWM_BATCH_MAX_WAIT_SECONDS", "30"))
+OWM_BACKGROUND_MAX_WAIT_SECONDS = float(os.environ.get("OWM_BACKGROUND_MAX_WAIT_SECONDS", "10"))
+
+# Highest priority first
+LANES = ("interactive", "batch", "background")
+
+# Pause after a 429 that carries no usable Retry-After
+_DEFAULT_RETRY_AFTER_SECONDS = 10.0
+
+class Priority:
+    """The lane of one context, which may be raised while its requests wait for quota."""
+
+    __slots__ = ("lane", "_queued")
+
+    def __init__(self, lane: str):
+        if lane not in LANES:
+            raise ValueError(f"Unknown priority lane '{lane}'")
+        self.lane = lane
+        self._queued: List["_QueuedRequest"] = []
+
+    def raise_to(self, lane: str) -> None:
+        """Moves to `lane` if it is higher, together with the requests already queued."""
+        if LANES.index(lane) >= LANES.index(self.lane):
+            return
+        self.lane = lane
+        for request in list(self._queued):
+            request.scheduler._promote(request, lane)
+
+
+_lane: contextvars.ContextVar[Priority] = contextvars.ContextVar("owm_priority", default=Priority("interactive"))
+# Lane of each task started by `start_shared`
+_shared_priorities: "weakref.WeakKeyDictionary[asyncio.Future, Priority]" = weakref.WeakKeyDictionary()
+
+
+@contextlib.contextmanager
+def upstream_priority(lane: Union[str, Priority]) -> Iterator[None]:
+    """Runs the block, and tasks it starts, with OWM requests in the given lane."""
+    token = _lane.set(lane if isinstance(lane, Priority) else Priority(lane))
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def current_priority() -> str:
+    return _lane.get().lane
+
+
+def start_shared(awaitable: Awaitable) -> asyncio.Future:
+    """Starts work that several callers may wait on, in a copy of the caller's lane.
+
+    Args:
+        awaitable: The shared work, e.g. a cache's upstream fetch.
+
+    Returns:
+        asyncio.Future: The started task. Callers joining it later call `join_shared`.
+    """
+    priority = Priority(current_priority())
+    with upstream_priority(priority):
+        task = asyncio.ensure_future(awaitable)
+    _shared_priorities[task] = priority
+    return task
+
+
+def join_shared(task: asyncio.Future) -> None:
+    """Raises the lane of a task from `start_shared` to the joining caller's, if that is higher."""
+    priority = _shared_priorities.get(task)
+    if priority is not None:
+        priority.raise_to(current_priority())
+
+
+class _QueuedRequest:
+    """A request waiting for a token, and when it gives up."""
+
+    __slots__ = ("scheduler", "future", "lane", "expiry")
+
+    def __init__(self, scheduler: "UpstreamScheduler", future: asyncio.Future, lane: str,
+                 expiry: asyncio.TimerHandle):
+        self.scheduler = scheduler
+        self.future = future
+        self.lane = lane
+        self.expiry = expiry
+
+
+class QuotaExceeded(Exception):
+    """A request was shed instead of waiting for quota.
+
+    Attributes:
+        lane (str): The request's priority lane.
+        reason (str): "quota" when the bucket could not refill in time,
+            "rate_limited" while paused by a 429, "timeout" when the wait ran out.
+        retry_after (int): Suggested seconds before trying again.
+    """
+
+    def __init__(self, lane: str, reason: str, retry_after: float):
+        super().__init__(f"OpenWeatherMap quota exhausted ({lane} lane, {reason})")
+        self.lane = lane
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class UpstreamScheduler:
+    """Token bucket with strict-priority FIFO lanes."""
+
+    def __init__(self, calls_per_minute: float = 60.0, burst: int = 10, reserve: int = 2,
+                 max_wait: Optional[Dict[str, float]] = None):
+        self.rate = calls_per_minute / 60.0
+        self.burst = max(1, burst)
+        # Low lanes must still be able to get a token once the bucket is full
+        self.reserve = max(0, min(reserve, self.burst - 1))
+        self.max_wait = dict(max_wait or {lane: 5.0 for lane in LANES})
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {lane: deque() for lane in LANES}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.granted = dict.fromkeys(LANES, 0)
+        self.shed = dict.fromkeys(LANES, 0)
+        self.wait_seconds = dict.fromkeys(LANES, 0.0)
+        self.rate_limited = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _refill(self, now: float) -> None:
+        # After a 429, `updated` is the end of the pause: nothing accrues before it
+        if now > self.updated:
+            self.tokens = min(float(self.burst), self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def _floor(self, lane: str) -> int:
+        """Tokens the bucket must hold for `lane` to take one."""
+        return 1 if lane == "interactive" else 1 + self.reserve
+
+    def _queued(self, lane: str) -> int:
+        return sum(1 for waiter in self._waiters[lane] if not waiter.done())
+
+    def _ahead(self, lane: str) -> int:
+        """Requests that get a token before a new one in `lane`."""
+        return sum(self._queued(other) for other in LANES[:LANES.index(lane) + 1])
+
+    def estimate_wait(self, lane: str) -> float:
+        """Seconds until a request arriving now in `lane` would get its token, ignoring later arrivals."""
+        now = time.monotonic()
+        self._refill(now)
+        missing = self._ahead(lane) + self._floor(lane) - self.tokens
+        return max(0.0, self.paused_until - now) + max(0.0, missing) / self.rate
+
+    def _reject(self, lane: str, reason: str, retry_after: float) -> QuotaExceeded:
+        self.shed[lane] += 1
+        OWM_REQUESTS_SHED.labels(lane, reason).inc()
+        return QuotaExceeded(lane, reason, retry_after)
+
+    def try_acquire(self, lane: Optional[str] = None) -> bool:
+        """Takes a token if one is free for `lane` right now, without waiting or queueing."""
+        if not self.enabled:
+            return True
+        lane = lane or current_priority()
+        now = time.monotonic()
+        self._refill(now)
+        if now >= self.paused_until and not self._ahead(lane) and self.tokens >= self._floor(lane):
+            self.tokens -= 1
+            self.granted[lane] += 1
+            return True
+        return False
+
+    async def acquire(self, lane: Optional[str] = None) -> float:
+        """Waits for the quota to allow one OWM request.
+
+        Args:
+            lane (str, optional): Priority lane. Defaults to the caller's `upstream_priority`.
+
+        Returns:
+            float: Seconds waited.
+
+        Raises:
+            QuotaExceeded: The wait would be, or was, longer than the lane's limit.
+        """
+        if not self.enabled:
+            return 0.0
+        priority = _lane.get() if lane is None else None
+        lane = lane or priority.lane
+        if self.try_acquire(lane):
+            OWM_QUEUE_WAIT_SECONDS.labels(lane).observe(0.0)
+            return 0.0
+
+        now = time.monotonic()
+        max_wait = self.max_wait[lane]
+        estimate = self.estimate_wait(lane)
+        if estimate > max_wait:
+            raise self._reject(lane, "rate_limited" if now < self.paused_until else "quota", estimate)
+
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        request = _QueuedRequest(self, waiter, lane, loop.call_later(max_wait, self._expire, waiter))
+        self._waiters[lane].append(waiter)
+        # Only a lane below the top one can be raised while it waits
+        if priority is not None and lane != LANES[0]:
+            priority._queued.append(request)
+        self._schedule()
+        try:
+            await waiter
+        except asyncio.TimeoutError:
+            raise self._reject(request.lane, "timeout", self.estimate_wait(request.lane)) from None
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as the caller was cancelled: give the token back
+                self.tokens += 1
+                self._schedule()
+            raise
+        finally:
+            request.expiry.cancel()
+            if priority is not None and request in priority._queued:
+                priority._queued.remove(request)
+        lane = request.lane
+        waited = time.monotonic() - now
+        self.granted[lane] += 1
+        self.wait_seconds[lane] += waited
+        OWM_QUEUE_WAIT_SECONDS.labels(lane).observe(waited)
+        return waited
+
+    @staticmethod
+    def _expire(waiter: asyncio.Future) -> None:
+        if not waiter.done():
+            waiter.set_exception(asyncio.TimeoutError())
+
+    def _promote(self, request: _QueuedRequest, lane: str) -> None:
+        """Moves a queued request to the back of a higher lane, which also shortens its longest wait."""
+        if request.future.done():
+            return
+        self._waiters[request.lane].remove(request.future)
+        self._waiters[lane].append(request.future)
+        request.lane = lane
+        loop = asyncio.get_running_loop()
+        expires = min(request.expiry.when(), loop.time() + self.max_wait[lane])
+        request.expiry.cancel()
+        request.expiry = loop.call_at(expires, self._expire, request.future)
+        self._schedule()
+
+    def _next_grant(self) -> Optional[float]:
+        """Seconds until the head waiter can get a token, or None when nobody waits."""
+        now = time.monotonic()
+        for lane in LANES:
+            if self._queued(lane):
+                missing = self._floor(lane) - self.tokens
+                return max(0.0, self.paused_until - now) + max(0.0, missing) / self.rate
+        return None
+
+    def _schedule(self) -> None:
+        delay = self._next_grant()
+        if delay is None:
+            return
+        loop = asyncio.get_running_loop()
+        when = loop.time() + delay
+        if self._timer is not None and self._timer_loop is loop and not self._timer.cancelled():
+            if self._timer.when() <= when:
+                return
+            self._timer.cancel()
+        self._timer = loop.call_at(when, self._grant)
+        self._timer_loop = loop
+
+    def _grant(self) -> None:
+        """Hands out the tokens that have accrued, highest lane first, then rearms the timer."""
+        self._timer = None
+        now = time.monotonic()
+        if now >= self.paused_until:
+            self._refill(now)
+            for lane in LANES:
+                queue = self._waiters[lane]
+                while queue and (queue[0].done() or self.tokens >= self._floor(lane)):
+                    waiter = queue.popleft()
+                    if not waiter.done():
+                        self.tokens -= 1
+                        waiter.set_result(None)
+                if queue:
+                    # Strict priority: lower lanes wait until this one is empty
+                    break
+        self._schedule()
+
+    def rate_limited_for(self, retry_after: Optional[float]) -> None:
+        """Pauses all lanes after a 429 and empties the bucket.
+
+        Args:
+            retry_after (float, optional): OWM's Retry-After in seconds, if it sent one.
+        """
+        self.rate_limited += 1
+        OWM_RATE_LIMITED.inc()
+        until = time.monotonic() + (_DEFAULT_RETRY_AFTER_SECONDS if retry_after is None else retry_after)
+        if until > self.paused_until:
+            self.paused_until = until
+            self.tokens = 0.0
+            self.updated = until
+        with contextlib.suppress(RuntimeError):
+            self._schedule()
+
+    def paused_for(self) -> float:
+        """Seconds left of the pause after the last 429."""
+        return max(0.0, self.paused_until - time.monotonic())
+
+    def queued(self) -> Dict[str, int]:
+        return {lane: self._queued(lane) for lane in LANES}
+
+    def available(self) -> float:
+        """Tokens in the bucket right now (0 while paused)."""
+        self._refill(time.monotonic())
+        return self.tokens
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "calls_per_minute": self.rate * 60,
+            "burst": self.burst,
+            "interactive_reserve": self.reserve,
+            "tokens": round(self.available(), 2),
+            "paused_for": round(self.paused_for(), 2),
+            "queued": self.queued(),
+            "granted": dict(self.granted),
+            "shed": dict(self.shed),
+            "wait_seconds_mean": {
+                lane: self.wait_seconds[lane] / self.granted[lane] if self.granted[lane] else 0.0 for lane in LANES
+            },
+            "rate_limited": self.rate_limited,
+        }
+
+
+owm_scheduler = UpstreamScheduler(
+    OWM_CALLS_PER_MINUTE,
+    OWM_BURST,
+    OWM_INTERACTIVE_RESERVE,
+    {
+        "interactive": OWM_INTERACTIVE_MAX_WAIT_SECONDS,
+        "batch": OWM_BATCH_MAX_WAIT_SECONDS,
+        "background": OWM_BACKGROUND_MAX_WAIT_SECONDS,
+    },
+)